@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Tuple
+from uuid import UUID
+
+from config import settings
+from generics.invalidation import invalidation_bus
+
+from .schemas import TokenPayload, CurrentUser
+
+
+
+class TokenCache:
+
+	#	verified tokens and a snapshot of their users, bounded by size (least recently used goes first)
+	#	and by age so changes made by other processes are picked up after at most ttl seconds
+	def __init__(self, size: int, ttl: int) -> None:
+		self.size = size
+		self.ttl = ttl
+		self.entries = OrderedDict()
+
+
+	def get(self, token: str) -> Tuple[TokenPayload, CurrentUser] | None:
+		entry = self.entries.get(token)
+		if not entry:
+			return None
+		expires, payload, user = entry
+		if expires < time.monotonic():
+			del self.entries[token]
+			return None
+		self.entries.move_to_end(token)
+		return payload, user
+
+
+	def set(self, token: str, payload: TokenPayload, user: CurrentUser):
+		if self.size <= 0:
+			return
+		self.entries[token] = (time.monotonic() + self.ttl, payload, user)
+		self.entries.move_to_end(token)
+		while len(self.entries) > self.size:
+			self.entries.popitem(last=False)
+
+
+	def evict_user(self, user_id: UUID):
+		for token in [t for t, (_, payload, _) in self.entries.items() if payload.user_id == user_id]:
+			del self.entries[token]
+
+
+	def clear(self):
+		self.entries.clear()
+
+
+	def invalidate(self, user_id: str | None):
+		if user_id:
+			self.evict_user(UUID(user_id))
+		else:
+			self.clear()
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_SECONDS)
+invalidation_bus.subscribe('tokens', token_cache.invalidate)
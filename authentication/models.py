@@ -17,7 +17,8 @@ class Token(Base):
 	user_id = Column(
         UUID(as_uuid=True),
 		ForeignKey('users.id', ondelete='CASCADE'),
-		nullable=False
+		nullable=False,
+		index=True
 	)
 	token = Column(String(255), primary_key=True, nullable=False)
 	valid = Column(Boolean, nullable=False, default=True)
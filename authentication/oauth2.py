@@ -9,10 +9,12 @@ from sqlalchemy.future import select
 from generics.exceptions import UnAuthorizedException
 from config import settings
 from database import get_async_db
-from user.models import User
+from user.models import User, UserDivisions
 
 from .models import Token
-from .schemas import TokenPayload, Login
+from .schemas import TokenPayload, CurrentUser, Login
+from .cache import token_cache
+from generics.invalidation import invalidation_bus
 
 
 
@@ -60,6 +62,9 @@ class TokenHandler:
 
 
 	async def verify(self, token: str):
+		cached = token_cache.get(token)
+		if cached:
+			return cached[0]
 		user_token = await self.db.get(Token, token)
 		if not (user_token and user_token.valid):
 			raise self.credentials_exception
@@ -97,7 +102,7 @@ class TokenHandler:
 		return {"token_type": "bearer", "accessToken": token.token}
 
 
-	async def invalidate(self, user: User):
+	async def invalidate(self, user: CurrentUser):
 		query = await self.db.execute(
 			select(Token).where(Token.user_id==user.id)
 		)
@@ -106,13 +111,40 @@ class TokenHandler:
 			raise self.credentials_exception
 		token.valid = False
 		self.db.add(token)
+		await invalidation_bus.publish(self.db, 'tokens', user.id)
 		await self.db.commit()
 
 
+	async def current_user(self, token: str):
+		#	the user snapshot handlers and permissions need, a cache hit costs no query
+		cached = token_cache.get(token)
+		if cached:
+			return cached[1]
+		payload = await self.verify(token)
+		user = await self.db.get(User, payload.user_id)
+		if not user:
+			raise self.credentials_exception
+		division_ids = []
+		if not user.is_admin:
+			query = await self.db.execute(
+				select(UserDivisions.c.division_id).
+				where(UserDivisions.c.user_id == user.id)
+			)
+			division_ids = query.scalars().all()
+		current_user = CurrentUser(
+			id=user.id,
+			first_name=user.first_name,
+			last_name=user.last_name,
+			email=user.email,
+			is_admin=user.is_admin,
+			division_ids=division_ids,
+		)
+		token_cache.set(token, payload, current_user)
+		return current_user
+
+
 async def get_current_user(
 	token: Annotated[str, Depends(oauth2_scheme)], 
 	token_handler: Annotated[TokenHandler, Depends(TokenHandler)]
 ):
-	token = await token_handler.verify(token)
-	user = await token_handler.db.get(User, token.user_id)
-	return user
+	return await token_handler.current_user(token)
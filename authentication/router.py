@@ -8,7 +8,6 @@ from fastapi import (
 
 from .oauth2 import TokenHandler, get_current_user
 from . import schemas as auth_schemas
-from user.models import User
 
 
 authentication_router = APIRouter()
@@ -36,6 +35,6 @@ async def verify(accessToken: auth_schemas.Verify, token_handler: Annotated[Toke
 
 
 @authentication_router.post('/logout')
-async def logout(user: Annotated[User, Depends(get_current_user)], token_handler: Annotated[TokenHandler, Depends(TokenHandler)]):
+async def logout(user: Annotated[auth_schemas.CurrentUser, Depends(get_current_user)], token_handler: Annotated[TokenHandler, Depends(TokenHandler)]):
 	await token_handler.invalidate(user)
 	return {'detail': 'logged out successfully'}
\ No newline at end of file
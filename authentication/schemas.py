@@ -1,4 +1,5 @@
 from uuid import UUID
+from typing import List
 from pydantic import BaseModel, EmailStr
 
 
@@ -10,6 +11,14 @@ class TokenPayload(BaseModel):
 	user_id: UUID
 	is_admin: bool
 
+class CurrentUser(BaseModel):
+	id: UUID
+	first_name: str
+	last_name: str
+	email: str
+	is_admin: bool
+	division_ids: List[int]
+
 class Login(BaseModel):
 	email: EmailStr
 	password: str
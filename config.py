@@ -44,10 +44,40 @@ class Settings(BaseSettings):
 	TOKEN_ENCODING_ALGORITHM: str = 'HS256'
 	ACCESS_TOKEN_EXPIRE_HOURS: int = 12
 
+	#	verified tokens cache (0 disables it)
+	TOKEN_CACHE_SIZE: int = 1024
+	TOKEN_CACHE_SECONDS: int = 60
+
+	#	serialized student details by student version, in bytes (0 disables the cache)
+	TRANSCRIPT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+	#	how often workers check the cache_versions table for writes made by other workers
+	CACHE_POLL_SECONDS: int = 2
+
 	#	database settings
 	DATABASE_URL: str = 'sqlite+sqlite3:///db.sqlite3'
 	ASYNC_DATABASE_URL: str = 'sqlite+aiosqlite:///db.sqlite3'
 
+	#	list endpoints page size when none is asked for, and its cap
+	DEFAULT_PAGE_SIZE: int = 100
+	MAX_PAGE_SIZE: int = 500
+
+	#	upload parsing pool (0 parses on the default thread pool instead)
+	UPLOAD_PARSE_WORKERS: int = 2
+	#	read result workbooks row by row from the uploaded file instead of loading whole sheets
+	UPLOAD_STREAMING_READER: bool = False
+
+	#	parsed uploads kept on the local disk by content hash (0 disables the ledger)
+	UPLOAD_CACHE_DIR: str = '.upload_cache'
+	UPLOAD_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+	#	upload jobs worker
+	UPLOAD_WORKER_ENABLED: bool = True
+	UPLOAD_MAX_CONCURRENT_JOBS: int = 2
+	UPLOAD_JOB_POLL_SECONDS: int = 5
+	#	running jobs heartbeat, one not seen for this long lost its worker and is queued again
+	UPLOAD_JOB_LEASE_SECONDS: int = 300
+
 	#	installed apps
 	APPS: list = [
 		'user',
@@ -1,12 +1,15 @@
-from typing import List
+from typing import Iterable, List
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, and_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import insert, update, delete, and_
 
 
 from generics.exceptions import CourseNotFoundException
+from generics.pagination import Pagination
+from generics.scope import AccessScope
+from generics.bulk import chunked
+from generics.reference import reference_store
 
 
 from .schemas import CourseCreate
@@ -14,43 +17,41 @@ from .models import Course, CourseDivisions
 
 from division.models import Division
 from enrollment.models import Enrollment
+from student.models import Student
+from student.cache import bump_versions
+from student.recompute import queue_recompute
 from user.models import User
 
 
 
 class CourseHandler:
 
-    def __init__(self, user: User, db: AsyncSession) -> None:
+    def __init__(self, user: User, db: AsyncSession, scope: AccessScope | None = None) -> None:
         self.user = user
         self.db = db
+        self.scope = scope or AccessScope(user)
         self.NotFoundException = CourseNotFoundException()
-        self.retrieve_query = (
-            select(Course).
-            options(
-                selectinload(Course.divisions).
-                options(
-                    selectinload(Division.regulation),
-                    selectinload(Division.department_1),
-                    selectinload(Division.department_2),
-                )
-            )
-        )
+        #   divisions of the rows are hydrated from the reference store, see course_values
+        self.retrieve_query = select(Course)
         if not self.user.is_admin:
             self.retrieve_query = self.retrieve_query.where(
                 Course.id.in_(
                     select(CourseDivisions.columns.course_id).
-                    where(
-                        CourseDivisions.columns.division_id.in_(
-                            select(Division.id).
-                            where(Division.users.any(id=self.user.id))
-                        )
-                    )
+                    where(self.scope.filter(CourseDivisions.columns.division_id))
                 )
             )
 
 
-    async def get_all(self, regulation_id: int | None):
-        courses = await self.db.execute(
+    sort_keys = {
+        'id': [Course.id],
+        'code': [Course.code, Course.id],
+        'name': [Course.name, Course.id],
+        'level': [Course.level, Course.semester, Course.id],
+    }
+
+
+    async def get_all(self, regulation_id: int | None, page: Pagination | None = None):
+        query = (
             self.retrieve_query
             if not regulation_id else
             self.retrieve_query.where(
@@ -65,18 +66,50 @@ class CourseHandler:
                 )
             )
         )
-        return courses.scalars().all()
+        if page:
+            courses = await page.fetch(self.db, query, self.sort_keys, 'id')
+        else:
+            courses = (await self.db.execute(query)).scalars().all()
+        return await self.course_values(courses)
+
+
+    async def course_values(self, courses: List[Course]):
+        division_ids = dict()
+        for chunk in chunked([c.id for c in courses]):
+            query = await self.db.execute(
+                select(CourseDivisions.c.course_id, CourseDivisions.c.division_id).
+                where(CourseDivisions.c.course_id.in_(chunk))
+            )
+            for course_id, division_id in query.all():
+                division_ids.setdefault(course_id, []).append(division_id)
+        data = await reference_store.get(self.db)
+        return [
+            {
+                **{column.key: getattr(course, column.key) for column in Course.__table__.columns},
+                'divisions': data.divisions_of(division_ids.get(course.id, [])),
+            }
+            for course in courses
+        ]
+
+
+    async def set_divisions(self, id: int, division_ids: List[int]):
+        data = await reference_store.get(self.db)
+        rows = [
+            {'course_id': id, 'division_id': division_id}
+            for division_id in dict.fromkeys(division_ids) if data.division(division_id)
+        ]
+        await self.db.execute(delete(CourseDivisions).where(CourseDivisions.c.course_id == id))
+        if rows:
+            await self.db.execute(insert(CourseDivisions), rows)
 
 
     async def create(self, course: CourseCreate):
         new_course = Course(**course.dict(exclude={"divisions"}))
         self.db.add(new_course)
+        await self.db.flush()
         if course.divisions:
-            for d in course.divisions:
-                division = await self.db.get(Division, d)
-                new_course.divisions.append(division)
+            await self.set_divisions(new_course.id, course.divisions)
         await self.db.commit()
-        await self.db.refresh(new_course)
         return await self.get_one(new_course.id)
 
 
@@ -85,71 +118,76 @@ class CourseHandler:
         course = await self.db.execute(query)
         course = course.scalar()
         if course:
-            return course
-        raise self.NotFoundException
-
-
-    async def get_by_code_and_division_or_none(self, code: str, division_id: int):
-        #   try to get by code and division
-        query = await self.db.execute(
-            select(Course).
-            where(
-                and_(
-                    Course.code == code,
-                    Course.divisions.any(id=division_id)
+            return (await self.course_values([course]))[0]
+        raise await self.scope.missing(self.db, Course, id, self.NotFoundException)
+
+
+    async def get_by_codes_and_division(self, codes: Iterable[str], division_id: int):
+        #   courses of a sheet keyed by code, the course of the division when there is one, else the
+        #   first course with that code
+        courses = dict()
+        codes = set(codes)
+        for chunk in chunked(codes):
+            query = await self.db.execute(
+                select(Course).
+                where(
+                    and_(
+                        Course.code.in_(chunk),
+                        Course.divisions.any(id=division_id)
+                    )
                 )
             )
-        )
-        course = query.scalar()
-        #   if not exists try to get by code only
-        if not course:
-            query = await self.db.execute(select(Course).where(Course.code == code))
-            course = query.scalars().first()    
-        #   return if exists
-        if course:
-            return course
+            for course in query.scalars().all():
+                courses.setdefault(course.code, course)
+        for chunk in chunked(codes - courses.keys()):
+            query = await self.db.execute(
+                select(Course).
+                where(Course.code.in_(chunk)).
+                order_by(Course.id)
+            )
+            for course in query.scalars().all():
+                courses.setdefault(course.code, course)
+        return courses
     
 
-    async def check_required_and_not_passed(self, division_id: int, passed_enrollments: List[Enrollment]):
-        passed_course_ids = [e.course_id for e in passed_enrollments]
-        
-        # Query to get required courses for the given division
-        required_courses_query = await self.db.execute(
-            select(Course.id).where(
-                and_(
-                    Course.required == True,
-                    Course.divisions.any(id=division_id)
-                )
-            )
+    async def enrolled(self, id: int):
+        #   ids and groups of the students enrolled in the course
+        query = await self.db.execute(
+            select(Student.id, Student.group_id).
+            where(Student.id.in_(select(Enrollment.student_id).where(Enrollment.course_id == id)))
         )
-        required_course_ids = required_courses_query.scalars().all()
+        return query.all()
 
-        # Find the required courses that are not passed
-        not_passed_courses = [course_id for course_id in required_course_ids if course_id not in passed_course_ids]
 
-        # Check if there are any required courses that are not passed
-        return bool(not_passed_courses)
+    async def changed_for(self, students: list, recompute: bool):
+        #   the cached transcripts show the course, the students' versions move in this transaction.
+        #   a change of what the course counts for (its hours, or its enrollments) also leaves
+        #   their stored aggregates behind, their groups are recomputed
+        await bump_versions(self.db, [s.id for s in students])
+        if recompute and students:
+            queue_recompute(self.db, self.user.id, {s.group_id for s in students})
 
 
     async def update(self, id: int, course: CourseCreate):
-        existing_course = await self.get_one(id)
-        for key, value in course.dict(exclude={"divisions"}).items():
-                setattr(existing_course, key, value)
+        before = await self.get_one(id)
+        await self.db.execute(
+            update(Course).
+            where(Course.id == id).
+            values(**course.dict(exclude={"divisions"}))
+        )
         if course.divisions is not None:
-            existing_course.divisions.clear()
-            for division_id in course.divisions:
-                division = await self.db.get(Division, division_id)
-                if division:
-                    existing_course.divisions.append(division)
+            await self.set_divisions(id, course.divisions)
+        await self.changed_for(await self.enrolled(id), before['credit_hours'] != course.credit_hours)
         await self.db.commit()
-        await self.db.refresh(existing_course)
-        return existing_course
+        return await self.get_one(id)
 
 
     async def delete(self, id: int):
+        students = await self.enrolled(id)
         await self.db.execute(
             delete(Course).
             where(Course.id == id)
         )
+        await self.changed_for(students, True)
         await self.db.commit()
         return
\ No newline at end of file
@@ -40,7 +40,7 @@ class Course(Base):
     __tablename__ = "courses"
 
     id = Column(Integer, primary_key=True, index=True, nullable=False)
-    code = Column(String(10), nullable=False)
+    code = Column(String(10), nullable=False, index=True)
     name = Column(String(60), nullable=False)
     lecture_hours = Column(Integer, nullable=False)
     practical_hours = Column(Integer, nullable=False)
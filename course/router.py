@@ -8,6 +8,7 @@ from fastapi import (
 	Query
 )
 from generics.permissions import CoursePermission
+from generics.pagination import Pagination
 
 from .schemas import CourseCreate, Course
 from .handler import CourseHandler
@@ -23,10 +24,11 @@ course_router = APIRouter()
 )
 async def get_courses(
 	permission_class: Annotated[CoursePermission, Depends(CoursePermission)],
+	page: Annotated[Pagination, Depends(Pagination)],
 	regulation: int = Query(None, title='id of regulation to filter result')
 ):
-	handler = CourseHandler(permission_class.user, permission_class.db)
-	return await handler.get_all(regulation)
+	handler = CourseHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.get_all(regulation, page)
 
 
 #	create course
@@ -39,7 +41,7 @@ async def create_courses(
 	course: CourseCreate,
 	permission_class: Annotated[CoursePermission, Depends(CoursePermission)],
 ):
-	handler = CourseHandler(permission_class.user, permission_class.db)
+	handler = CourseHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.create(course)
 
 
@@ -53,8 +55,7 @@ async def retrieve_courses(
 	id: Annotated[int, Path(..., title='id of course to be retrieved')],
 	permission_class: Annotated[CoursePermission, Depends(CoursePermission)],
 ):
-	await permission_class.check_permission(id)
-	handler = CourseHandler(permission_class.user, permission_class.db)
+	handler = CourseHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.get_one(id)
 
 
@@ -69,7 +70,7 @@ async def update_courses(
 	permission_class: Annotated[CoursePermission, Depends(CoursePermission)],
 ):
 	await permission_class.check_permission(id)
-	handler = CourseHandler(permission_class.user, permission_class.db)
+	handler = CourseHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.update(id, course)
 
 
@@ -83,7 +84,7 @@ async def delete_courses(
 	permission_class: Annotated[CoursePermission, Depends(CoursePermission)],
 ):
 	await permission_class.check_permission(id)
-	handler = CourseHandler(permission_class.user, permission_class.db)
+	handler = CourseHandler(permission_class.user, permission_class.db, permission_class.scope)
 	await handler.get_one(id)
 	return await handler.delete(id)
 	
\ No newline at end of file
@@ -1,5 +1,5 @@
 from .client import engine, get_db
-from .async_client import async_engine, get_async_db
+from .async_client import async_engine, get_async_db, get_session_factory
 from .test_client import test_engine, get_test_db
 
 from sqlalchemy.ext.declarative import declarative_base
@@ -27,3 +27,8 @@ async def get_async_db():
 			raise e
 		finally:
 			await db.close()
+
+
+def get_session_factory():
+	#	for work that outlives the request's session, like a streamed response
+	return AsyncSessionLocal
@@ -5,6 +5,10 @@ from sqlalchemy import insert, update, delete
 
 
 from generics.exceptions import DepartmentNotFoundException
+from generics.pagination import Pagination
+from generics.scope import AccessScope
+from generics.invalidation import invalidation_bus
+from generics.reference import reference_store
 
 
 from .schemas import DepartmentCreate
@@ -16,9 +20,10 @@ from user.models import User
 
 class DepartmentHandler:
 
-    def __init__(self, user: User, db: AsyncSession) -> None:
+    def __init__(self, user: User, db: AsyncSession, scope: AccessScope | None = None) -> None:
         self.user = user
         self.db = db
+        self.scope = scope or AccessScope(user)
         self.NotFoundException = DepartmentNotFoundException()
         self.retrieve_query = select(Department)
         if not self.user.is_admin:
@@ -26,16 +31,25 @@ class DepartmentHandler:
                 or_(
                     Department.id.in_(
                         select(Division.department_1_id).
-                        where(Division.users.any(id=self.user.id))
+                        where(self.scope.filter(Division.id))
                     ),
                     Department.id.in_(
                         select(Division.department_2_id).
-                        where(Division.users.any(id=self.user.id))
+                        where(self.scope.filter(Division.id))
                     )
                 )
             )
 
-    async def get_all(self):
+
+    sort_keys = {
+        'id': [Department.id],
+        'name': [Department.name, Department.id],
+    }
+
+
+    async def get_all(self, page: Pagination | None = None):
+        if page:
+            return await page.fetch(self.db, self.retrieve_query, self.sort_keys, 'id')
         divisions = await self.db.execute(self.retrieve_query)
         return divisions.scalars().all()
 
@@ -47,24 +61,23 @@ class DepartmentHandler:
             returning(Department)
         )
         department = query.scalar_one()
+        await invalidation_bus.publish(self.db, 'departments', department.id)
         await self.db.commit()
         await self.db.refresh(department)
         return department
 
 
     async def get_one(self, id: int):
-        department = await self.db.get(Department, id)
+        data = await reference_store.get(self.db)
+        department = data.departments.get(id)
         if department:
             return department
         raise self.NotFoundException
 
 
     async def get_by_name(self, name: str):
-        query = await self.db.execute(
-            select(Department).
-            where(Department.name==name)
-        )
-        department = query.scalar()
+        data = await reference_store.get(self.db)
+        department = data.department_names.get(name)
         if department:
             return department
         raise self.NotFoundException
@@ -80,6 +93,7 @@ class DepartmentHandler:
         department = department.scalar()
         if not department:
             raise self.NotFoundException
+        await invalidation_bus.publish(self.db, 'departments', id)
         await self.db.commit()
         await self.db.refresh(department)
         return department
@@ -90,5 +104,6 @@ class DepartmentHandler:
             delete(Department).
             where(Department.id == id)
         )
+        await invalidation_bus.publish(self.db, 'departments', id)
         await self.db.commit()
         return
\ No newline at end of file
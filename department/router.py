@@ -9,6 +9,7 @@ from fastapi import (
 )
 
 from generics.permissions import DepartmentPermission
+from generics.pagination import Pagination
 
 from .schemas import DepartmentCreate, Department
 from .handler import DepartmentHandler
@@ -23,10 +24,11 @@ department_router = APIRouter()
     status_code=status.HTTP_200_OK
 )
 async def get_departments(
-	permission_class: Annotated[DepartmentPermission, Depends(DepartmentPermission)]
+	permission_class: Annotated[DepartmentPermission, Depends(DepartmentPermission)],
+	page: Annotated[Pagination, Depends(Pagination)]
 ):
-	handler = DepartmentHandler(permission_class.user, permission_class.db)
-	return await handler.get_all()
+	handler = DepartmentHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.get_all(page)
 
 
 #	create department
@@ -39,7 +41,7 @@ async def create_departments(
 	department: DepartmentCreate,
 	permission_class: Annotated[DepartmentPermission, Depends(DepartmentPermission)]
 ):
-	handler = DepartmentHandler(permission_class.user, permission_class.db)
+	handler = DepartmentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.create(department)
 
 
@@ -54,7 +56,7 @@ async def retrieve_departments(
 	permission_class: Annotated[DepartmentPermission, Depends(DepartmentPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = DepartmentHandler(permission_class.user, permission_class.db)
+	handler = DepartmentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.get_one(id)
 
 
@@ -69,7 +71,7 @@ async def update_departments(
 	permission_class: Annotated[DepartmentPermission, Depends(DepartmentPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = DepartmentHandler(permission_class.user, permission_class.db)
+	handler = DepartmentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.update(id, department)
 
 
@@ -83,6 +85,6 @@ async def delete_departments(
 	permission_class: Annotated[DepartmentPermission, Depends(DepartmentPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = DepartmentHandler(permission_class.user, permission_class.db)
+	handler = DepartmentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	await handler.get_one(id)
 	return await handler.delete(id)
\ No newline at end of file
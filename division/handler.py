@@ -1,9 +1,13 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import insert, update, delete
-from sqlalchemy.orm import selectinload
 
-from generics.exceptions import DivisionNotFoundException
+from generics.exceptions import DivisionNotFoundException, ForbiddenException
+from generics.pagination import Pagination
+from generics.scope import AccessScope
+from generics.invalidation import invalidation_bus
+from generics.names import normalize_name
+from generics.reference import reference_store
 
 from .schemas import DivisionCreate
 from .models import Division
@@ -16,31 +20,37 @@ from user.models import User
 
 class DivisionHandler:
 
-	def __init__(self, user: User, db: AsyncSession) -> None:
+	def __init__(self, user: User, db: AsyncSession, scope: AccessScope | None = None) -> None:
 		self.user = user
 		self.db = db
-		self.regulation_handler = RegulationHandler(user, db)
-		self.department_handler = DepartmentHandler(user, db)
+		self.scope = scope or AccessScope(user)
+		self.regulation_handler = RegulationHandler(user, db, self.scope)
+		self.department_handler = DepartmentHandler(user, db, self.scope)
 		self.NotFoundException = DivisionNotFoundException()
-		self.retrieve_query = (
-			select(Division).
-			options(
-				selectinload(Division.regulation),
-				selectinload(Division.department_1),
-				selectinload(Division.department_2),
-			)
-		)
+		#	regulations and departments of the rows come from the reference store
+		self.retrieve_query = select(Division)
 		if not self.user.is_admin:
-			self.retrieve_query = self.retrieve_query.where(Division.users.any(id=self.user.id))
+			self.retrieve_query = self.retrieve_query.where(self.scope.filter(Division.id))
+
 
+	sort_keys = {
+		'id': [Division.id],
+		'name': [Division.name, Division.id],
+	}
 
-	async def get_all(self, regulation_id: int | None):
-		divisions = await self.db.execute(
+
+	async def get_all(self, regulation_id: int | None, page: Pagination | None = None):
+		query = (
 			self.retrieve_query
 			if not regulation_id else
 			self.retrieve_query.where(Division.regulation_id==regulation_id)
 		)
-		return divisions.scalars().all()
+		if page:
+			divisions = await page.fetch(self.db, query, self.sort_keys, 'id')
+		else:
+			divisions = (await self.db.execute(query)).scalars().all()
+		data = await reference_store.get(self.db)
+		return data.divisions_of([d.id for d in divisions])
 
 	@staticmethod
 	async def re_organize_input_dict(division: DivisionCreate):
@@ -64,33 +74,29 @@ class DivisionHandler:
 		query = await self.db.execute(
 			insert(Division).
 			values(**division).
-			returning(Division).
-			options(
-				selectinload(Division.regulation),
-				selectinload(Division.department_1),
-				selectinload(Division.department_2),
-			)
+			returning(Division.id)
 		)
-		division = query.scalar_one()
+		id = query.scalar_one()
+		await invalidation_bus.publish(self.db, 'divisions', id)
 		await self.db.commit()
-		await self.db.refresh(division)
-		return division
+		data = await reference_store.get(self.db)
+		return data.division(id)
 
 
 	async def get_one(self, id: int):
-		query = self.retrieve_query.where(Division.id == id)
-		query = await self.db.execute(query)
-		division = query.scalar()
-		if division:
-			return division
-		raise self.NotFoundException
+		data = await reference_store.get(self.db)
+		division = data.division(id)
+		if not division:
+			raise self.NotFoundException
+		if not await self.scope.allows(self.db, id):
+			raise ForbiddenException()
+		return division
 
 
 	async def get_by_name(self, name: str):
-		query = self.retrieve_query.where(Division.name == name)
-		query = await self.db.execute(query)
-		division = query.scalar()
-		if division:
+		data = await reference_store.get(self.db)
+		division = data.division_names.get(normalize_name(name))
+		if division and await self.scope.allows(self.db, division.id):
 			return division
 		raise self.NotFoundException
 
@@ -105,21 +111,16 @@ class DivisionHandler:
 		query = (
 			update(Division).
 			where(Division.id == id).
-			values(**division).
-			returning(Division).
-			options(
-				selectinload(Division.regulation),
-				selectinload(Division.department_1),
-				selectinload(Division.department_2),
-			)
+			values(**division, normalized_name=normalize_name(division['name'])).
+			returning(Division.id)
 		)
 		query = await self.db.execute(query)
-		division = query.scalar()
-		if not division:
+		if not query.scalar():
 			raise self.NotFoundException
+		await invalidation_bus.publish(self.db, 'divisions', id)
 		await self.db.commit()
-		await self.db.refresh(division)
-		return division
+		data = await reference_store.get(self.db)
+		return data.division(id)
 
 
 	async def delete(self, id: int):
@@ -127,6 +128,7 @@ class DivisionHandler:
 			delete(Division).
 			where(Division.id == id)
 		)
+		await invalidation_bus.publish(self.db, 'divisions', id)
 		await self.db.commit()
 		return
 
@@ -8,6 +8,7 @@ from sqlalchemy import (
 from sqlalchemy.orm import relationship
 
 from database import Base
+from generics.names import normalized
 from user.models import UserDivisions
 from course.models import CourseDivisions
 
@@ -16,14 +17,16 @@ class Division(Base):
 	__tablename__ = 'divisions'
     
 	id = Column(Integer, primary_key=True, index=True, nullable=False)
-	name = Column(String(250), nullable=False)
+	name = Column(String(250), nullable=False, index=True)
+	normalized_name = Column(String(250), nullable=False, index=True, default=normalized('name'))
 	private = Column(Boolean, nullable=False, default=False)
 	group = Column(Boolean, nullable=False, default=False)
 	hours = Column(Integer, nullable=False, default=0)
 	regulation_id = Column(
 		Integer,
 		ForeignKey("regulations.id", ondelete="CASCADE"),
-		nullable=False
+		nullable=False,
+		index=True
 	)
 	department_1_id = Column(
 		Integer,
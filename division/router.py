@@ -8,6 +8,7 @@ from fastapi import (
 )
 
 from generics.permissions import DivisionPermission
+from generics.pagination import Pagination
 
 from .schemas import DivisionCreate, Division
 from .handler import DivisionHandler
@@ -24,10 +25,11 @@ division_router = APIRouter()
 )
 async def get_divisions(
 	permission_class: Annotated[DivisionPermission, Depends(DivisionPermission)],
+	page: Annotated[Pagination, Depends(Pagination)],
 	regulation: int = Query(None, title='id of regulation to filter result')
 ):
-	handler = DivisionHandler(permission_class.user, permission_class.db)
-	return await handler.get_all(regulation)
+	handler = DivisionHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.get_all(regulation, page)
 
 
 #	create division
@@ -40,7 +42,7 @@ async def create_divisions(
 	division: DivisionCreate,
 	permission_class: Annotated[DivisionPermission, Depends(DivisionPermission)]
 ):
-	handler = DivisionHandler(permission_class.user, permission_class.db)
+	handler = DivisionHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.create(division)
 
 
@@ -54,8 +56,7 @@ async def retrieve_divisions(
 	id: Annotated[int, Path(..., title='id of division to be retrieved')],
 	permission_class: Annotated[DivisionPermission, Depends(DivisionPermission)]
 ):
-	await permission_class.check_permission(id)
-	handler = DivisionHandler(permission_class.user, permission_class.db)
+	handler = DivisionHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.get_one(id)
 
 
@@ -70,7 +71,7 @@ async def update_divisions(
 	permission_class: Annotated[DivisionPermission, Depends(DivisionPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = DivisionHandler(permission_class.user, permission_class.db)
+	handler = DivisionHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.update(id, division)
 
 
@@ -84,6 +85,6 @@ async def delete_divisions(
 	permission_class: Annotated[DivisionPermission, Depends(DivisionPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = DivisionHandler(permission_class.user, permission_class.db)
+	handler = DivisionHandler(permission_class.user, permission_class.db, permission_class.scope)
 	await handler.get_one(id)
 	return await handler.delete(id)
\ No newline at end of file
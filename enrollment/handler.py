@@ -1,4 +1,5 @@
-from typing import Optional
+import uuid
+from typing import List, Optional
 from uuid import UUID
 
 from sqlalchemy import func, and_, or_
@@ -7,28 +8,40 @@ from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 
-from generics.exceptions import EnrollmentNotFoundException, StudentNotFoundException, CourseNotFoundException
+from generics.exceptions import EnrollmentNotFoundException, StudentNotFoundException, CourseNotFoundException, ForbiddenException
+from generics.bulk import chunked, bulk_upsert
+from generics.scope import AccessScope
 
 
 from .schemas import EnrollmentCreate, EnrollmentPartialUpdate
-from .models import Enrollment
+from .models import Enrollment, NATURAL_KEY
 
 from course.models import Course
 from student.models import Student
 from division.models import Division
 from user.models import User
 from course.handler import CourseHandler
+from student.aggregates import AggregateHandler
+from student.semesters import SemesterStatsHandler, term_of
+from student.cache import bump_versions
 
 
 
 class EnrollmentHandler:
 
+	#	what a corrected sheet may change on an enrollment matched by its natural key
+	delta_fields = ['mark', 'grade', 'points', 'full_mark']
 
-	def __init__(self, user: User, db: AsyncSession) -> None:
+	def __init__(self, user: User, db: AsyncSession, scope: AccessScope | None = None) -> None:
 		self.user = user
 		self.db = db
-		self.course_handler = CourseHandler(user, db)
+		self.scope = scope or AccessScope(user)
+		self.course_handler = CourseHandler(user, db, self.scope)
+		#	stored student aggregates and semester stats follow every single enrollment write
+		self.aggregate_handler = AggregateHandler(user, db)
+		self.semester_handler = SemesterStatsHandler(user, db)
 		self.NotFoundException = EnrollmentNotFoundException()
+		self.UniqueConstraintsException = ForbiddenException("enrollment already exists")
 		self.retrieve_query = (
 			select(Enrollment).
 			options(
@@ -39,18 +52,7 @@ class EnrollmentHandler:
 			self.retrieve_query = self.retrieve_query.where(
 				Enrollment.student_id.in_(
 					select(Student.id).
-					where(
-						or_(
-							Student.group_id.in_(
-								select(Division.id).
-								where(Division.users.any(id=self.user.id))
-							),
-							Student.division_id.in_(
-								select(Division.id).
-								where(Division.users.any(id=self.user.id))
-							)
-						)
-					)
+					where(self.scope.filter(Student.group_id, Student.division_id))
 				)
 			)
 
@@ -107,37 +109,19 @@ class EnrollmentHandler:
 		course = await self.db.get(Course, enrollment.course_id)
 		if not course:
 			raise CourseNotFoundException()
-		new_enrollment = Enrollment(**enrollment.dict())
-		self.db.add(new_enrollment)
+		before = await self.aggregate_handler.contribution(student.id, course.id)
+		ids = await self.bulk_create([{'id': uuid.uuid4(), **enrollment.dict()}])
+		if not ids:
+			raise self.UniqueConstraintsException
+		await self.aggregate_handler.apply_delta(
+			student.id, before, await self.aggregate_handler.contribution(student.id, course.id)
+		)
+		await self.semester_handler.refresh([student.id], term_of(enrollment.year, enrollment.semester))
+		await bump_versions(self.db, [student.id])
 		await self.db.commit()
-		await self.db.refresh(new_enrollment)
-		return new_enrollment
+		return await self.get_one(ids[0])
 	
 
-	async def post_create(self, enrollment: Enrollment, student: Student, course: Course):
-		if course.credit_hours == 0: return
-		#   check if research
-		if enrollment.grade == 'بح' and enrollment.mark == 0:
-			student.research_hours += course.credit_hours
-			student.passed_hours += course.credit_hours
-			student.registered_hours += course.credit_hours
-		#   check if passed course
-		elif enrollment.grade in ['A', 'B', 'C', 'D']:
-			enrollments = await self.get_all(student_id=student.id, course_id=course.id, excuse=False)
-			count = len(enrollments)
-			if count > 2:
-				student.excluded_hours += (count - 2) * course.credit_hours
-			student.registered_hours += count * course.credit_hours
-			student.passed_hours += course.credit_hours
-			student.total_points += enrollment.points * course.credit_hours
-			student.total_mark += (enrollments[0].mark + enrollments[-1].mark) / 2 if enrollments else enrollment.mark
-		
-		self.db.add(student)
-		await self.db.commit()
-		
-		return 
-
-
 	async def get_one(self, id: UUID):
 		enrollment = await self.db.get(Enrollment, id)
 		if enrollment:
@@ -145,65 +129,109 @@ class EnrollmentHandler:
 		raise self.NotFoundException
 
 
-	async def get_or_create(
-		self,
+	@staticmethod
+	def header_values(headers: dict):
+		return {
+			'level'   : int(headers['level']) if headers.get('level') else -1,
+			'semester': int(headers['semester']),
+			'year'    : str(headers['year']),
+			'month'   : str(headers['month']),
+		}
+
+
+	@classmethod
+	def enrollment_values(
+		cls,
 		headers: dict, 
 		enrollment: dict, 
 		student_id: UUID, 
 		course_id: int,
 	):
-		#	check if enrollment exists
-		level = int(headers.get('level')) if headers.get('level') else -1
-		query = (
-			select(Enrollment).
-			where(
-				and_(
-					Enrollment.seat_id    == int(enrollment.get('seat_id')),
-					Enrollment.level      == level,
-					Enrollment.semester   == int(headers.get('semester')),
-					Enrollment.year       == str(headers.get('year')),
-					Enrollment.month      == str(headers.get('month')),
-					Enrollment.mark       == float(enrollment.get('mark')),
-					Enrollment.student_id == student_id,
-					Enrollment.course_id  == course_id,
+		return {
+			'id'        : uuid.uuid4(),
+			**cls.header_values(headers),
+			'seat_id'   : int(enrollment['seat_id']),
+			'mark'      : float(enrollment['mark']),
+			'full_mark' : int(enrollment['full_mark']),
+			'grade'     : enrollment['grade'],
+			'points'    : float(enrollment['points']),
+			'student_id': student_id,
+			'course_id' : course_id,
+		}
+
+
+	async def get_stored(self, headers: dict, student_ids: List[UUID]):
+		#	the enrollments already stored for this sheet's term by natural key (seat_id, student_id, course_id)
+		values = self.header_values(headers)
+		stored = dict()
+		for chunk in chunked(student_ids):
+			result = await self.db.execute(
+				select(
+					Enrollment.id,
+					Enrollment.seat_id,
+					Enrollment.student_id,
+					Enrollment.course_id,
+					*[getattr(Enrollment, field) for field in self.delta_fields],
+				).
+				where(
+					and_(
+						Enrollment.semester   == values['semester'],
+						Enrollment.year       == values['year'],
+						Enrollment.month      == values['month'],
+						Enrollment.student_id.in_(chunk),
+					)
 				)
 			)
+			for row in result.mappings().all():
+				stored[(row['seat_id'], row['student_id'], row['course_id'])] = row
+		return stored
+
+
+	@classmethod
+	def changed(cls, stored: dict, values: dict) -> bool:
+		return any(stored[field] != values[field] for field in cls.delta_fields)
+
+
+	async def bulk_create(self, enrollments: List[dict], update: bool = False, keyed: bool = False):
+		#	rows already stored under their natural key are skipped, or updated with update,
+		#	so concurrent uploads of the same sheet cannot duplicate enrollments
+		return await bulk_upsert(
+			self.db, Enrollment, enrollments, NATURAL_KEY, self.delta_fields if update else None, keyed
 		)
-		result = await self.db.execute(query)
-		existing_enrollment = result.scalar()
-		if existing_enrollment:
-			return None
-		#	if not, create one
-		new_enrollment = Enrollment(
-			**{
-				'seat_id'   : int(enrollment['seat_id']),
-				'level'     : int(headers['level']) if headers.get('level') else -1,
-				'semester'  :  int(headers['semester']),
-				'year'      : headers['year'],
-				'month'     : headers['month'],
-				'mark'      : float(enrollment['mark']),
-				'full_mark' : int(enrollment['full_mark']),
-				'grade'     :  enrollment['grade'],
-				'points'    : float(enrollment['points']),
-				'student_id': student_id,
-				'course_id' : course_id,
-			}
-		)
-		return new_enrollment
 
 
 	async def update(self, id: UUID, enrollment: EnrollmentPartialUpdate):
 		existing_enrollment = await self.get_one(id)
+		student_id, course_id = existing_enrollment.student_id, existing_enrollment.course_id
+		term = term_of(existing_enrollment.year, existing_enrollment.semester)
+		before = await self.aggregate_handler.contribution(student_id, course_id)
 		for key, val in enrollment.dict().items():
 			setattr(existing_enrollment, key, val)
+		await self.db.flush()
+		await self.aggregate_handler.apply_delta(
+			student_id, before, await self.aggregate_handler.contribution(student_id, course_id)
+		)
+		await self.semester_handler.refresh([student_id], term)
+		await bump_versions(self.db, [student_id])
 		await self.db.commit()
+		#	the response nests the course, an async session cannot lazy load it
 		await self.db.refresh(existing_enrollment)
+		await self.db.refresh(existing_enrollment, ['course'])
 		return existing_enrollment
 
 
 	async def delete(self, id: UUID):
 		enrollment = await self.get_one(id)
+		student_id, course_id = enrollment.student_id, enrollment.course_id
+		term = term_of(enrollment.year, enrollment.semester)
+		before = await self.aggregate_handler.contribution(student_id, course_id)
 		await self.db.delete(enrollment)
+		await self.db.flush()
+		await self.aggregate_handler.apply_delta(
+			student_id, before, await self.aggregate_handler.contribution(student_id, course_id)
+		)
+		await self.semester_handler.refresh([student_id], term)
+		await bump_versions(self.db, [student_id])
 		await self.db.commit()
 		return
 
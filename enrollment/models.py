@@ -5,6 +5,7 @@ from sqlalchemy import (
 	Float,
 	String,
 	ForeignKey,
+	Index,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -12,8 +13,15 @@ from sqlalchemy.orm import relationship
 from database import Base
 
 
+#	one enrollment per student, course and exam term
+NATURAL_KEY = ['student_id', 'course_id', 'year', 'month', 'semester', 'seat_id']
+
+
 class Enrollment(Base):
 	__tablename__ = 'enrollments'
+	__table_args__ = (
+		Index('ix_enrollments_natural_key', *NATURAL_KEY, unique=True),
+	)
 		
 	id = Column(
 	    UUID(as_uuid=True),
@@ -39,7 +47,8 @@ class Enrollment(Base):
 	course_id = Column(
 		Integer,
 		ForeignKey("courses.id", ondelete="CASCADE"),
-		nullable=False
+		nullable=False,
+		index=True
 	)
 	
 	student = relationship("Student", back_populates="enrollments")
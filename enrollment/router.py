@@ -27,7 +27,7 @@ async def partial_update_enrollments(
 	enrollment: EnrollmentPartialUpdate, 
 	permission_class: Annotated[EnrollmentPermission, Depends(EnrollmentPermission)]
 ):
-	handler = EnrollmentHandler(permission_class.user, permission_class.db)
+	handler = EnrollmentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.update(id, enrollment)
 
 
@@ -40,5 +40,5 @@ async def update_enrollments(
 	id: UUID, 
 	permission_class: Annotated[EnrollmentPermission, Depends(EnrollmentPermission)]
 ):
-    handler = EnrollmentHandler(permission_class.user, permission_class.db)
+    handler = EnrollmentHandler(permission_class.user, permission_class.db, permission_class.scope)
     return await handler.delete(id)
\ No newline at end of file
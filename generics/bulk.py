@@ -0,0 +1,51 @@
+from typing import Any, Iterable, List
+
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+
+#	keep IN lists and multi-row statements under the drivers' bind parameter limits
+CHUNK_SIZE = 500
+
+
+def chunked(items: Iterable[Any], size: int = CHUNK_SIZE):
+	items = list(items)
+	for i in range(0, len(items), size):
+		yield items[i: i + size]
+
+
+async def bulk_upsert(
+	db: AsyncSession,
+	model,
+	rows: List[dict],
+	keys: List[str],
+	update: List[str] | None = None,
+	keyed: bool = False
+):
+	#	INSERT .. ON CONFLICT on the unique index over keys: conflicting rows are skipped, or with
+	#	update get those fields overwritten when they differ. returns the ids of the rows written,
+	#	with keyed by their keys (an updated row keeps the id it was stored with)
+	if not rows:
+		return {} if keyed else []
+	table = model.__table__
+	dialect = (await db.connection()).dialect.name
+	insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+	query = insert(table)
+	if update:
+		query = query.on_conflict_do_update(
+			index_elements=keys,
+			set_={field: query.excluded[field] for field in update},
+			where=or_(*[table.c[field].is_distinct_from(query.excluded[field]) for field in update]),
+		)
+	else:
+		query = query.on_conflict_do_nothing(index_elements=keys)
+	columns = [table.c.id, *[table.c[key] for key in keys]] if keyed else [table.c.id]
+	written = []
+	for chunk in chunked(rows):
+		result = await db.execute(query.returning(*columns), chunk)
+		written += result.all()
+	if keyed:
+		return {tuple(row[1:]): row[0] for row in written}
+	return [row[0] for row in written]
@@ -18,6 +18,29 @@ class UnAuthorizedException(HTTPException):
 
 
 
+class BadRequestException(HTTPException):
+
+    def __init__(self, detail: Any = None) -> None:
+        super().__init__(status.HTTP_400_BAD_REQUEST, detail)
+
+
+
+class InvalidCursorException(BadRequestException):
+
+    def __init__(self) -> None:
+        detail = 'Invalid pagination cursor'
+        super().__init__(detail)
+
+
+
+class InvalidSortException(BadRequestException):
+
+    def __init__(self, choices) -> None:
+        detail = f'Invalid sort key, choose one of: {", ".join(choices)}'
+        super().__init__(detail)
+
+
+
 class NotFoundException(HTTPException):
 
     def __init__(self, detail: Any = None) -> None:
@@ -77,4 +100,12 @@ class StudentNotFoundException(NotFoundException):
 
     def __init__(self) -> None:
         detail = 'Student not found'
+        super().__init__(detail)
+
+
+
+class UploadJobNotFoundException(NotFoundException):
+
+    def __init__(self) -> None:
+        detail = 'Upload job not found'
         super().__init__(detail)
\ No newline at end of file
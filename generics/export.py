@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+from typing import Callable, List
+
+from fastapi.responses import StreamingResponse
+
+from database.async_client import AsyncSessionLocal
+
+
+
+#	rows fetched per round trip of the server side cursor, and written out together
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+	'ndjson': 'application/x-ndjson',
+	'csv': 'text/csv; charset=utf-8',
+}
+
+
+def encode_rows(rows: List[dict], columns: List[str], format: str) -> bytes:
+	if format == 'csv':
+		buffer = io.StringIO()
+		csv.writer(buffer).writerows([[row[column] for column in columns] for row in rows])
+		return buffer.getvalue().encode()
+	return ''.join(
+		json.dumps({column: row[column] for column in columns}, ensure_ascii=False, default=str) + '\n'
+		for row in rows
+	).encode()
+
+
+async def stream_rows(
+	query,
+	columns: List[str],
+	format: str = 'ndjson',
+	values: Callable | None = None,
+	session_factory=AsyncSessionLocal,
+):
+	#	the export runs in its own session, the request's is closed before a streamed body is sent.
+	#	values(db) may return a function completing each row, it gets the session for lookups
+	async with session_factory() as db:
+		complete = await values(db) if values else None
+		if format == 'csv':
+			#	the byte order mark lets spreadsheets read the arabic names as utf-8
+			yield '\ufeff'.encode() + encode_rows([dict(zip(columns, columns))], columns, format)
+		result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+		async for partition in result.mappings().partitions():
+			rows = [complete(row) for row in partition] if complete else partition
+			yield encode_rows(rows, columns, format)
+
+
+def export_response(rows, name: str, format: str = 'ndjson'):
+	return StreamingResponse(
+		rows,
+		media_type=MEDIA_TYPES[format],
+		headers={'Content-Disposition': f'attachment; filename="{name}.{format}"'}
+	)
@@ -0,0 +1,132 @@
+import asyncio
+from typing import Callable, Dict, List
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+from sqlalchemy import event, text
+
+from config import settings, logging
+from database.async_client import AsyncSessionLocal, async_engine
+
+from .models import CacheVersion
+
+
+
+CHANNEL = 'cache_invalidation'
+
+
+class InvalidationBus:
+
+	#	keeps the in-process caches of every worker coherent. a write bumps the version of what it
+	#	changed inside its own transaction, the other workers notice the new version when they poll
+	#	the cache_versions table and on postgres right away through LISTEN/NOTIFY
+	def __init__(self, session_factory=AsyncSessionLocal, engine=async_engine) -> None:
+		self.session_factory = session_factory
+		self.engine = engine
+		self.handlers: Dict[str, List[Callable]] = dict()
+		self.versions: Dict[str, int] = dict()
+		self.task = None
+		self.listener = None
+
+
+	def subscribe(self, name: str, handler: Callable):
+		#	handler(key) gets the key the writer published, or None when everything under name is stale
+		self.handlers.setdefault(name, []).append(handler)
+
+
+	def dispatch(self, name: str, key: str | None = None):
+		for handler in self.handlers.get(name, []):
+			try:
+				handler(key)
+			except Exception as e:
+				logging.warning(f'cache invalidation handler of {name} failed: {e}')
+
+
+	async def publish(self, db: AsyncSession, name: str, key: str | None = None):
+		#	runs in the writer's transaction, nothing is announced if it rolls back and this
+		#	worker's own subscribers are called once it commits
+		dialect = (await db.connection()).dialect.name
+		insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+		query = insert(CacheVersion).values(name=name, version=1)
+		query = query.on_conflict_do_update(
+			index_elements=[CacheVersion.name],
+			set_={'version': CacheVersion.version + 1}
+		).returning(CacheVersion.version)
+		version = (await db.execute(query)).scalar()
+		if self.versions.get(name, 0) == version - 1:
+			self.versions[name] = version
+		if dialect == 'postgresql':
+			await db.execute(
+				text('SELECT pg_notify(:channel, :payload)'),
+				{'channel': CHANNEL, 'payload': f'{name}:{key or ""}'}
+			)
+		db.info.setdefault('invalidations', []).append((self, name, str(key) if key is not None else None))
+
+
+	async def poll(self, dispatch: bool = True):
+		#	a worker that just started has nothing cached yet, its first poll only records the versions
+		async with self.session_factory() as db:
+			result = await db.execute(select(CacheVersion.name, CacheVersion.version))
+			versions = dict(result.all())
+		for name, version in versions.items():
+			if self.versions.get(name) != version:
+				if dispatch:
+					self.dispatch(name)
+				self.versions[name] = version
+
+
+	def notified(self, connection, pid, channel, payload):
+		name, _, key = payload.partition(':')
+		self.dispatch(name, key or None)
+
+
+	async def listen(self):
+		if self.engine.dialect.name != 'postgresql':
+			return
+		self.listener = await self.engine.connect()
+		raw_connection = await self.listener.get_raw_connection()
+		await raw_connection.driver_connection.add_listener(CHANNEL, self.notified)
+
+
+	async def start(self):
+		try:
+			await self.poll(dispatch=False)
+			await self.listen()
+		except Exception as e:
+			logging.warning(f'cache invalidation bus failed to start: {e}')
+		self.task = asyncio.create_task(self.loop())
+
+
+	async def stop(self):
+		if self.task:
+			self.task.cancel()
+			await asyncio.gather(self.task, return_exceptions=True)
+			self.task = None
+		if self.listener:
+			await self.listener.close()
+			self.listener = None
+
+
+	async def loop(self):
+		while True:
+			await asyncio.sleep(settings.CACHE_POLL_SECONDS)
+			try:
+				await self.poll()
+			except Exception as e:
+				logging.warning(f'cache invalidation bus failed to poll: {e}')
+
+
+@event.listens_for(Session, 'after_commit')
+def dispatch_committed(session: Session):
+	for bus, name, key in session.info.pop('invalidations', []):
+		bus.dispatch(name, key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_rolled_back(session: Session):
+	session.info.pop('invalidations', None)
+
+
+invalidation_bus = InvalidationBus()
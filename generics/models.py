@@ -0,0 +1,14 @@
+from sqlalchemy import (
+	Column,
+	Integer,
+	String,
+)
+
+from database import Base
+
+
+class CacheVersion(Base):
+	__tablename__ = 'cache_versions'
+
+	name = Column(String(50), primary_key=True, nullable=False)
+	version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,43 @@
+import re
+
+from sqlalchemy import and_
+
+
+
+#	spelling variants sheets mix freely: hamza forms of alef, alef maqsura for ya, ha for
+#	ta marbuta, tatweel and harakat, and spaces or separators dropped or doubled
+FOLDING = str.maketrans({
+	'أ': 'ا',
+	'إ': 'ا',
+	'آ': 'ا',
+	'ٱ': 'ا',
+	'ى': 'ي',
+	'ة': 'ه',
+	'ـ': None,
+})
+
+IGNORED = re.compile(r'[\s/\-\u064b-\u0652\u0670]+')
+
+
+def normalize_name(name: str | None) -> str | None:
+	#	the key names are matched on, two spellings of one name normalize the same
+	if name is None:
+		return None
+	return IGNORED.sub('', name.translate(FOLDING))
+
+
+def normalized(column: str):
+	#	column default keeping a normalized_name column in step with the inserted name
+	def default(context):
+		return normalize_name(context.get_current_parameters().get(column))
+	return default
+
+
+def prefix_filter(column, prefix: str, dialect: str):
+	#	names starting with prefix, using the column's index. postgres does it for LIKE with the
+	#	varchar_pattern_ops index, sqlite folds case in LIKE and never does, it also gets the range of
+	#	strings starting with prefix in its binary order
+	condition = column.startswith(prefix, autoescape=True)
+	if dialect == 'sqlite' and prefix:
+		condition = and_(condition, column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+	return condition
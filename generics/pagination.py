@@ -0,0 +1,94 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Dict, List
+
+from fastapi import Query, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Column, bindparam, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from .exceptions import InvalidCursorException, InvalidSortException
+
+
+
+def encode_cursor(sort: str, values: list) -> str:
+	payload = json.dumps({'sort': sort, 'values': jsonable_encoder(values)}, separators=(',', ':'))
+	return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+	try:
+		payload = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+		assert isinstance(payload['sort'], str) and isinstance(payload['values'], list)
+	except Exception:
+		raise InvalidCursorException()
+	return payload
+
+
+def cursor_value(column: Column, value):
+	#	json turns uuids and dates into strings, give the driver back the column's python type
+	try:
+		python_type = column.type.python_type
+	except NotImplementedError:
+		return value
+	if value is None or isinstance(value, python_type):
+		return value
+	try:
+		return python_type(value)
+	except (TypeError, ValueError):
+		raise InvalidCursorException()
+
+
+
+class Pagination:
+
+	#	keyset pagination for list endpoints, the page continues after the last row of the previous one
+	#	so its cost depends on the page size only. without a limit a page of DEFAULT_PAGE_SIZE rows is returned
+	def __init__(
+		self,
+		response: Response,
+		limit: int = Query(None, ge=1, title='maximum number of rows to return'),
+		cursor: str = Query(None, title='X-Next-Cursor header of the previous page'),
+		sort: str = Query(None, title='sort key, prefix it with - for descending order'),
+	) -> None:
+		self.response = response
+		self.limit = min(limit or settings.DEFAULT_PAGE_SIZE, settings.MAX_PAGE_SIZE)
+		self.cursor = cursor
+		self.sort = sort
+
+
+	def sort_columns(self, sort_keys: Dict[str, List[Column]], default: str):
+		sort = self.sort or default
+		descending = sort.startswith('-')
+		if sort.lstrip('-') not in sort_keys:
+			raise InvalidSortException(sort_keys.keys())
+		return sort, sort_keys[sort.lstrip('-')], descending
+
+
+	def apply(self, query, sort_keys: Dict[str, List[Column]], default: str):
+		#	every sort key ends with the primary key so the order is total and the cursor unique
+		sort, columns, descending = self.sort_columns(sort_keys, default)
+		if self.cursor:
+			payload = decode_cursor(self.cursor)
+			if payload['sort'] != sort or len(payload['values']) != len(columns):
+				raise InvalidCursorException()
+			values = tuple_(*[
+				bindparam(None, cursor_value(column, value), type_=column.type)
+				for column, value in zip(columns, payload['values'])
+			])
+			query = query.where(tuple_(*columns) < values if descending else tuple_(*columns) > values)
+		query = query.order_by(*[column.desc() if descending else column for column in columns])
+		query = query.limit(self.limit + 1)
+		return query, sort, columns
+
+
+	async def fetch(self, db: AsyncSession, query, sort_keys: Dict[str, List[Column]], default: str = 'id'):
+		query, sort, columns = self.apply(query, sort_keys, default)
+		result = await db.execute(query)
+		rows = result.scalars().all()
+		if len(rows) > self.limit:
+			rows = rows[:self.limit]
+			last = rows[-1]
+			self.response.headers['X-Next-Cursor'] = encode_cursor(sort, [getattr(last, c.key) for c in columns])
+		return rows
@@ -5,10 +5,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from authentication.oauth2 import get_current_user
+from authentication.schemas import CurrentUser
 from database import get_async_db
 from .exceptions import ForbiddenException, UnAuthorizedException
+from .scope import AccessScope, get_access_scope
 
-from user.models import User, UserDivisions
 from division.models import Division
 from student.models import Student
 from course.models import CourseDivisions
@@ -18,7 +19,7 @@ from enrollment.models import Enrollment
 
 class AdminPermission:
 
-	def __init__(self, user: User = Depends(get_current_user)) -> None:
+	def __init__(self, user: CurrentUser = Depends(get_current_user)) -> None:
 		if not user.is_admin:
 			raise UnAuthorizedException()
 		self.user = user
@@ -27,9 +28,15 @@ class AdminPermission:
 
 class Permission:
 
-	def __init__(self, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> None:
+	def __init__(
+		self,
+		user: CurrentUser = Depends(get_current_user),
+		db: AsyncSession = Depends(get_async_db),
+		scope: AccessScope = Depends(get_access_scope)
+	) -> None:
 		self.user = user
 		self.db = db
+		self.scope = scope
 		self.ForbiddenException = ForbiddenException()
 
 	async def has_object_permission(self, id: Any) -> bool:
@@ -46,11 +53,13 @@ class RegulationPermission(Permission):
 
 	async def has_object_permission(self, id: Any) -> bool:
 		query = await self.db.execute(
-			select(exists(Division)).
-			where(
-				and_(
-					Division.regulation_id==id,
-					Division.users.any(id=self.user.id)
+			select(
+				exists().
+				where(
+					and_(
+						Division.regulation_id==id,
+						self.scope.filter(Division.id)
+					)
 				)
 			)
 		)
@@ -61,14 +70,16 @@ class DepartmentPermission(Permission):
 
 	async def has_object_permission(self, id: Any) -> bool:
 		query = await self.db.execute(
-			select(exists(Division)).
-			where(
-				and_(
-					or_(
-						Division.department_1_id==id,
-						Division.department_2_id==id
-					),
-					Division.users.any(id=self.user.id)
+			select(
+				exists().
+				where(
+					and_(
+						or_(
+							Division.department_1_id==id,
+							Division.department_2_id==id
+						),
+						self.scope.filter(Division.id)
+					)
 				)
 			)
 		)
@@ -78,36 +89,20 @@ class DepartmentPermission(Permission):
 class DivisionPermission(Permission):
 
 	async def has_object_permission(self, id: Any) -> bool:
-		query = await self.db.execute(
-			select(exists(Division)).
-			where(
-				and_(
-					Division.id==id,
-					Division.users.any(id=self.user.id)
-				)
-			)
-		)
-		return query.scalar()
+		return id in self.scope.division_ids
 
 
 class StudentPermission(Permission):
 
 	async def has_object_permission(self, id: Any) -> bool:
 		query = await self.db.execute(
-			select(exists(Division)).
-			where(
-				and_(
-					or_(
-						Division.id==(
-							select(Student.group_id).
-							where(Student.id==id)
-						),
-						Division.id==(
-							select(Student.group_id).
-							where(Student.id==id)
-						)
-					),
-					Division.users.any(id=self.user.id)
+			select(
+				exists().
+				where(
+					and_(
+						Student.id==id,
+						self.scope.filter(Student.group_id, Student.division_id)
+					)
 				)
 			)
 		)
@@ -118,11 +113,13 @@ class CoursePermission(Permission):
 
 	async def has_object_permission(self, id: Any) -> bool:
 		query = await self.db.execute(
-			select(exists(Division)).
-			where(
-				and_(
-					Division.courses.any(id=id),
-					Division.users.any(id=self.user.id)
+			select(
+				exists().
+				where(
+					and_(
+						CourseDivisions.c.course_id==id,
+						self.scope.filter(CourseDivisions.c.division_id)
+					)
 				)
 			)
 		)
@@ -133,5 +130,18 @@ class CoursePermission(Permission):
 class EnrollmentPermission(Permission):
 
 	async def has_object_permission(self, id: Any) -> bool:
-		enrollment = await self.db.get(Enrollment, id)
-		return await CoursePermission().has_object_permission(enrollment.course_id)
\ No newline at end of file
+		query = await self.db.execute(
+			select(
+				exists().
+				where(
+					and_(
+						Enrollment.id==id,
+						Enrollment.course_id.in_(
+							select(CourseDivisions.c.course_id).
+							where(self.scope.filter(CourseDivisions.c.division_id))
+						)
+					)
+				)
+			)
+		)
+		return query.scalar()
@@ -0,0 +1,102 @@
+from typing import Dict, Iterable, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .invalidation import invalidation_bus
+from .names import normalize_name
+
+from regulation.models import Regulation
+from department.models import Department
+from division.models import Division
+from regulation import schemas as regulation_schemas
+from department import schemas as department_schemas
+from division import schemas as division_schemas
+
+
+
+class ReferenceData:
+
+	#	one consistent snapshot of the reference tables, as response schemas indexed by id and name
+	def __init__(
+		self,
+		regulations: List[regulation_schemas.Regulation],
+		departments: List[department_schemas.Department],
+		divisions: List[division_schemas.Division],
+	) -> None:
+		self.regulations = {r.id: r for r in regulations}
+		self.departments = {d.id: d for d in departments}
+		self.divisions = {d.id: d for d in divisions}
+		#	first row wins on duplicate names, like the scalar() lookups it replaces
+		self.regulation_names = dict()
+		for r in sorted(regulations, key=lambda r: r.id):
+			self.regulation_names.setdefault(r.name, r)
+		self.department_names = dict()
+		for d in sorted(departments, key=lambda d: d.id):
+			self.department_names.setdefault(d.name, d)
+		#	divisions are looked up by their normalized names, sheets spell them every which way
+		self.division_names = dict()
+		for d in sorted(divisions, key=lambda d: d.id):
+			self.division_names.setdefault(normalize_name(d.name), d)
+
+
+	def division(self, id: int | None):
+		return self.divisions.get(id) if id is not None else None
+
+
+	def divisions_of(self, ids: Iterable[int]):
+		return [self.divisions[id] for id in ids if id in self.divisions]
+
+
+
+class ReferenceStore:
+
+	#	regulations, departments and divisions change a few times a year, they are read once and
+	#	served from memory until a write through their handlers (in any worker) invalidates them
+	def __init__(self) -> None:
+		self.data = None
+		self.generation = 0
+
+
+	async def load(self, db: AsyncSession) -> ReferenceData:
+		generation = self.generation
+		regulations = await db.execute(select(Regulation))
+		departments = await db.execute(select(Department))
+		divisions = await db.execute(select(Division))
+		regulations = {r.id: regulation_schemas.Regulation.model_validate(r) for r in regulations.scalars().all()}
+		departments = {d.id: department_schemas.Department.model_validate(d) for d in departments.scalars().all()}
+		data = ReferenceData(
+			list(regulations.values()),
+			list(departments.values()),
+			[
+				division_schemas.Division(
+					id=d.id,
+					name=d.name,
+					hours=d.hours,
+					private=d.private,
+					group=d.group,
+					regulation=regulations[d.regulation_id],
+					department_1=departments.get(d.department_1_id),
+					department_2=departments.get(d.department_2_id),
+				)
+				for d in divisions.scalars().all()
+			]
+		)
+		#	an invalidation that arrived while loading means these rows may already be stale
+		if generation == self.generation:
+			self.data = data
+		return data
+
+
+	async def get(self, db: AsyncSession) -> ReferenceData:
+		return self.data or await self.load(db)
+
+
+	def invalidate(self, key: str | None = None):
+		self.generation += 1
+		self.data = None
+
+
+reference_store = ReferenceStore()
+for name in ['regulations', 'departments', 'divisions']:
+	invalidation_bus.subscribe(name, reference_store.invalidate)
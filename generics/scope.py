@@ -0,0 +1,74 @@
+from typing import Any, List
+
+from fastapi import Depends
+from sqlalchemy import and_, or_, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from authentication.oauth2 import get_current_user
+from authentication.schemas import CurrentUser
+from .exceptions import ForbiddenException
+
+from user.models import User, UserDivisions
+
+
+
+class AccessScope:
+
+	#	the divisions a user can reach. handlers filter on them with a plain IN list once the ids
+	#	are resolved, otherwise (scopes built outside a request) with an uncorrelated subquery
+	def __init__(self, user: User, division_ids: List[int] | None = None) -> None:
+		self.user = user
+		self.division_ids = division_ids
+
+
+	@property
+	def unrestricted(self) -> bool:
+		return self.user.is_admin
+
+
+	def divisions(self):
+		if self.division_ids is not None:
+			return self.division_ids
+		return (
+			select(UserDivisions.c.division_id).
+			where(UserDivisions.c.user_id == self.user.id)
+		)
+
+
+	def filter(self, *columns):
+		#	rows whose division (any of the given columns) is one of the user's
+		return or_(*[column.in_(self.divisions()) for column in columns])
+
+
+	async def allows(self, db: AsyncSession, division_id: int) -> bool:
+		if self.unrestricted:
+			return True
+		if self.division_ids is not None:
+			return division_id in self.division_ids
+		query = await db.execute(
+			select(
+				exists().
+				where(
+					and_(
+						UserDivisions.c.user_id == self.user.id,
+						UserDivisions.c.division_id == division_id
+					)
+				)
+			)
+		)
+		return query.scalar()
+
+
+	async def missing(self, db: AsyncSession, model, id: Any, not_found: Exception) -> Exception:
+		#	a scoped lookup came back empty, tell an object out of reach from one that does not exist
+		if self.unrestricted:
+			return not_found
+		query = await db.execute(select(exists().where(model.id == id)))
+		return ForbiddenException() if query.scalar() else not_found
+
+
+
+async def get_access_scope(user: CurrentUser = Depends(get_current_user)) -> AccessScope:
+	#	the division ids come with the (cached) current user
+	return AccessScope(user, user.division_ids)
@@ -56,6 +56,24 @@ app.add_middleware(
 
 from config import settings
 from importlib import import_module
+from upload.executor import shutdown_executor
+from upload.jobs import upload_worker
+from generics.invalidation import invalidation_bus
+
+
+@app.on_event('startup')
+async def startup_event():
+	await invalidation_bus.start()
+	if settings.UPLOAD_WORKER_ENABLED:
+		await upload_worker.start()
+
+
+@app.on_event('shutdown')
+async def shutdown_event():
+	await upload_worker.stop()
+	await invalidation_bus.stop()
+	shutdown_executor()
+
 
 
 for app_name in settings.APPS:
@@ -7,6 +7,7 @@ from sqlalchemy import MetaData
 from alembic import context
 
 from config import settings, Base
+import generics.models  # models that do not belong to an app
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,46 @@
+"""normalized names
+
+Revision ID: 2af5c672c23e
+Revises: b0d85a8ec20f
+Create Date: 2026-10-18 14:46:03.451745
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from generics.names import normalize_name
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2af5c672c23e'
+down_revision: Union[str, None] = 'b0d85a8ec20f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = {'students': 60, 'divisions': 250}
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    for table, length in TABLES.items():
+        op.add_column(table, sa.Column('normalized_name', sa.String(length=length), nullable=True))
+        rows = sa.table(table, sa.column('id'), sa.column('name'), sa.column('normalized_name'))
+        names = connection.execute(sa.select(rows.c.id, rows.c.name)).all()
+        if names:
+            connection.execute(
+                rows.update().where(rows.c.id == sa.bindparam('row_id')).values(normalized_name=sa.bindparam('key')),
+                [{'row_id': id, 'key': normalize_name(name)} for id, name in names]
+            )
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('normalized_name', existing_type=sa.String(length=length), nullable=False)
+        op.create_index(op.f(f'ix_{table}_normalized_name'), table, ['normalized_name'], unique=False)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_index(op.f(f'ix_{table}_normalized_name'), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('normalized_name')
@@ -0,0 +1,32 @@
+"""student name pattern index
+
+Revision ID: 6cce33cae4eb
+Revises: 71fb20b42cea
+Create Date: 2026-10-18 15:35:04.587819
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6cce33cae4eb'
+down_revision: Union[str, None] = '71fb20b42cea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    #   varchar_pattern_ops serves LIKE 'prefix%' on postgres whatever the collation, sqlite ignores it
+    op.drop_index('ix_students_normalized_name', table_name='students')
+    op.create_index(
+        'ix_students_normalized_name', 'students', ['normalized_name'], unique=False,
+        postgresql_ops={'normalized_name': 'varchar_pattern_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_students_normalized_name', table_name='students')
+    op.create_index('ix_students_normalized_name', 'students', ['normalized_name'], unique=False)
@@ -0,0 +1,93 @@
+"""enrollment natural key
+
+Revision ID: 6e0af9dcd001
+Revises: 652ef2bfc297
+Create Date: 2026-10-18 14:41:31.069222
+
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e0af9dcd001'
+down_revision: Union[str, None] = '652ef2bfc297'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DUPLICATES = """
+    SELECT id, student_id FROM (
+        SELECT
+            id,
+            student_id,
+            row_number() OVER (
+                PARTITION BY student_id, course_id, year, month, semester, seat_id
+                ORDER BY mark DESC, points DESC, id
+            ) AS position
+        FROM enrollments
+    ) ranked
+    WHERE position > 1
+"""
+
+
+def queue_recompute(connection, group_ids):
+    #   aggregates and semester stats are derived by the aggregate engine, not in sql. a recompute
+    #   job of the groups is queued for the upload worker, it runs once the application starts
+    #   (python -m student.recompute --division <id> does the same at once)
+    users = sa.table('users', sa.column('id', sa.Uuid()), sa.column('is_admin', sa.Boolean()))
+    user = connection.execute(
+        sa.select(users.c.id).order_by(users.c.is_admin.desc()).limit(1)
+    ).scalar()
+    if user is None:
+        #   a job needs a user to belong to
+        divisions = ' '.join(f'--division {id}' for id in sorted(group_ids))
+        logging.getLogger('alembic.runtime.migration').warning(
+            f'no user to queue the recompute job for, run python -m student.recompute {divisions}'
+        )
+        return
+    jobs = sa.table(
+        'upload_jobs',
+        sa.column('id', sa.Uuid()),
+        sa.column('kind', sa.String()),
+        sa.column('status', sa.String()),
+        sa.column('params', sa.JSON()),
+        sa.column('processed_rows', sa.Integer()),
+        sa.column('user_id', sa.Uuid()),
+        sa.column('created_at', sa.DateTime()),
+        sa.column('updated_at', sa.DateTime()),
+    )
+    now = datetime.utcnow()
+    connection.execute(jobs.insert().values(
+        id=uuid.uuid4(),
+        kind='recompute',
+        status='pending',
+        params={'division_ids': sorted(group_ids), 'dry_run': False},
+        processed_rows=0,
+        user_id=user,
+        created_at=now,
+        updated_at=now,
+    ))
+
+
+def upgrade() -> None:
+    #   corrected sheets used to be inserted next to the rows they corrected. rows carry no
+    #   timestamp to tell the latest one, keep the best result of every natural key
+    connection = op.get_bind()
+    group_ids = connection.execute(sa.text(
+        f'SELECT DISTINCT group_id FROM students WHERE id IN (SELECT student_id FROM ({DUPLICATES}) duplicates)'
+    )).scalars().all()
+    op.execute(f'DELETE FROM enrollments WHERE id IN (SELECT id FROM ({DUPLICATES}) duplicates)')
+    #   the students the deleted rows counted for are recomputed
+    if group_ids:
+        queue_recompute(connection, group_ids)
+    op.create_index('ix_enrollments_natural_key', 'enrollments', ['student_id', 'course_id', 'year', 'month', 'semester', 'seat_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_enrollments_natural_key', table_name='enrollments')
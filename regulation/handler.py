@@ -4,6 +4,10 @@ from sqlalchemy import insert, update, delete
 
 
 from generics.exceptions import RegulationNotFoundException
+from generics.pagination import Pagination
+from generics.scope import AccessScope
+from generics.invalidation import invalidation_bus
+from generics.reference import reference_store
 
 from .schemas import RegulationCreate
 from .models import Regulation
@@ -15,20 +19,30 @@ from division.models import Division
 class RegulationHandler:
 
 
-    def __init__(self, user: User, db: AsyncSession) -> None:
+    def __init__(self, user: User, db: AsyncSession, scope: AccessScope | None = None) -> None:
         self.user = user
         self.db = db
+        self.scope = scope or AccessScope(user)
         self.NotFoundException = RegulationNotFoundException()
         self.retrieve_query = select(Regulation)
         if not self.user.is_admin:
             self.retrieve_query = self.retrieve_query.where(
                 Regulation.id.in_(
                     select(Division.regulation_id).
-                    where(Division.users.any(id=self.user.id))
+                    where(self.scope.filter(Division.id))
                 )
             )
 
-    async def get_all(self):
+
+    sort_keys = {
+        'id': [Regulation.id],
+        'name': [Regulation.name, Regulation.id],
+    }
+
+
+    async def get_all(self, page: Pagination | None = None):
+        if page:
+            return await page.fetch(self.db, self.retrieve_query, self.sort_keys, 'id')
         regulations = await self.db.execute(self.retrieve_query)
         return regulations.scalars().all()
 
@@ -40,23 +54,23 @@ class RegulationHandler:
             returning(Regulation)
         )
         regulation = query.scalar_one()
+        await invalidation_bus.publish(self.db, 'regulations', regulation.id)
         await self.db.commit()
         await self.db.refresh(regulation)
         return regulation
 
 
     async def get_one(self, id: int):
-        regulation = await self.db.get(Regulation, id)
+        data = await reference_store.get(self.db)
+        regulation = data.regulations.get(id)
         if regulation:
             return regulation
         raise self.NotFoundException
     
 
     async def get_by_name(self, name: str):
-        regulation = await self.db.execute(
-            select(Regulation).where(Regulation.name==name)
-        )
-        return regulation.scalar()
+        data = await reference_store.get(self.db)
+        return data.regulation_names.get(name)
 
 
     async def update(self, id: int, regulation: RegulationCreate):
@@ -70,6 +84,7 @@ class RegulationHandler:
         regulation = result.scalar()
         if not regulation:
             raise self.NotFoundException
+        await invalidation_bus.publish(self.db, 'regulations', id)
         await self.db.commit()
         await self.db.refresh(regulation)
         return regulation
@@ -80,5 +95,6 @@ class RegulationHandler:
             delete(Regulation).
             where(Regulation.id == id)
         )
+        await invalidation_bus.publish(self.db, 'regulations', id)
         await self.db.commit()
         return
\ No newline at end of file
@@ -9,6 +9,7 @@ from fastapi import (
 )
 
 from generics.permissions import RegulationPermission
+from generics.pagination import Pagination
 
 from .schemas import RegulationCreate, Regulation
 from .handler import RegulationHandler
@@ -24,10 +25,11 @@ regulation_router = APIRouter()
     status_code=status.HTTP_200_OK
 )
 async def get_regulations(
-	permission_class: Annotated[RegulationPermission, Depends(RegulationPermission)]
+	permission_class: Annotated[RegulationPermission, Depends(RegulationPermission)],
+	page: Annotated[Pagination, Depends(Pagination)]
 ):
-	handler = RegulationHandler(permission_class.user, permission_class.db)
-	return await handler.get_all()
+	handler = RegulationHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.get_all(page)
 
 
 #	create regulation
@@ -40,7 +42,7 @@ async def create_regulations(
 	regulation: RegulationCreate,
 	permission_class: Annotated[RegulationPermission, Depends(RegulationPermission)]
 ):
-	handler = RegulationHandler(permission_class.user, permission_class.db)
+	handler = RegulationHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.create(regulation)
 
 
@@ -55,7 +57,7 @@ async def retrieve_regulations(
 	permission_class: Annotated[RegulationPermission, Depends(RegulationPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = RegulationHandler(permission_class.user, permission_class.db)
+	handler = RegulationHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.get_one(id)
 
 
@@ -70,7 +72,7 @@ async def update_regulations(
 	permission_class: Annotated[RegulationPermission, Depends(RegulationPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = RegulationHandler(permission_class.user, permission_class.db)
+	handler = RegulationHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.update(id, regulation)
 
 
@@ -84,6 +86,6 @@ async def delete_regulations(
 	permission_class: Annotated[RegulationPermission, Depends(RegulationPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = RegulationHandler(permission_class.user, permission_class.db)
+	handler = RegulationHandler(permission_class.user, permission_class.db, permission_class.scope)
 	await handler.get_one(id)
 	return await handler.delete(id)
\ No newline at end of file
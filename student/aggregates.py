@@ -0,0 +1,248 @@
+from typing import Iterable, List
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, case, literal, update
+from sqlalchemy.future import select
+
+from generics.bulk import chunked
+from generics.reference import reference_store
+
+from student.models import Student
+from course.models import Course
+from enrollment.models import Enrollment
+from user.models import User
+from .graduation import GraduationHandler, PASSED_GRADES, RESEARCH_GRADE, GRADUATION_LEVEL
+
+
+
+EXCUSE_GRADE = 'عذر'
+AGGREGATE_FIELDS = [
+	'registered_hours',
+	'passed_hours',
+	'excluded_hours',
+	'research_hours',
+	'total_points',
+	'total_mark',
+]
+RECOMPUTED_FIELDS = [*AGGREGATE_FIELDS, 'level', 'gpa', 'graduate']
+
+
+def level_for(passed_hours: int, base_level: int = 1):
+	#	the level the passed hours reach, never below the level of the student's earliest enrollments
+	#	(a cohort whose first years were never uploaded starts above the first level)
+	if passed_hours > 98:
+		level = 4
+	elif passed_hours > 62:
+		level = 3
+	elif passed_hours > 28:
+		level = 2
+	else:
+		level = 1
+	return max(level, base_level)
+
+
+def gpa_for(values: dict):
+	denominator = values['registered_hours'] - values['excluded_hours'] - values['research_hours']
+	return values['total_points'] / denominator if denominator else 0
+
+
+
+class AggregateHandler:
+
+	#	derives the student aggregates from enrollments with grouped statements: research hours, the
+	#	hours, points and marks of passed courses (attempts past the second excluded), and the level,
+	#	gpa and graduation that follow from them
+	def __init__(self, user: User, db: AsyncSession) -> None:
+		self.user = user
+		self.db = db
+
+
+	def course_groups(self, student_ids: List[UUID], *conditions):
+		#	one row per (student, course) with the counts the hour rules need
+		not_excuse = Enrollment.grade != EXCUSE_GRADE
+		attempts = (
+			select(
+				Enrollment.student_id,
+				Enrollment.course_id,
+				Enrollment.grade,
+				Enrollment.mark,
+				Enrollment.points,
+				func.row_number().over(
+					partition_by=(Enrollment.student_id, Enrollment.course_id, not_excuse),
+					order_by=(Enrollment.year, Enrollment.semester),
+				).label('first_attempt'),
+				func.row_number().over(
+					partition_by=(Enrollment.student_id, Enrollment.course_id, not_excuse),
+					order_by=(Enrollment.year.desc(), Enrollment.semester.desc()),
+				).label('last_attempt'),
+			).
+			where(and_(Enrollment.student_id.in_(student_ids), *conditions)).
+			subquery()
+		)
+		not_excuse = attempts.c.grade != EXCUSE_GRADE
+		return (
+			select(
+				attempts.c.student_id,
+				attempts.c.course_id,
+				func.sum(case((not_excuse, 1), else_=0)).label('attempts'),
+				func.sum(case((attempts.c.grade.in_(PASSED_GRADES), 1), else_=0)).label('passed'),
+				func.sum(case((and_(attempts.c.grade == RESEARCH_GRADE, attempts.c.mark == 0), 1), else_=0)).label('research'),
+				func.sum(case((attempts.c.grade.in_(PASSED_GRADES), attempts.c.points), else_=0)).label('points'),
+				func.sum(case((and_(not_excuse, attempts.c.first_attempt == 1), attempts.c.mark), else_=0)).label('first_mark'),
+				func.sum(case((and_(not_excuse, attempts.c.last_attempt == 1), attempts.c.mark), else_=0)).label('last_mark'),
+			).
+			group_by(attempts.c.student_id, attempts.c.course_id).
+			subquery()
+		)
+
+
+	def aggregates_query(self, student_ids: List[UUID], *conditions):
+		groups = self.course_groups(student_ids, *conditions)
+		hours = Course.credit_hours
+		extra_attempts = case((groups.c.attempts > 2, groups.c.attempts - 2), else_=0)
+		return (
+			select(
+				groups.c.student_id,
+				func.sum((groups.c.research + groups.c.passed * groups.c.attempts) * hours).label('registered_hours'),
+				func.sum((groups.c.research + groups.c.passed) * hours).label('passed_hours'),
+				func.sum(groups.c.passed * extra_attempts * hours).label('excluded_hours'),
+				func.sum(groups.c.research * hours).label('research_hours'),
+				func.sum(groups.c.points * hours).label('total_points'),
+				func.sum(groups.c.passed * (groups.c.first_mark + groups.c.last_mark) / literal(2.0)).label('total_mark'),
+			).
+			join(Course, Course.id == groups.c.course_id).
+			where(hours > 0).
+			group_by(groups.c.student_id)
+		)
+
+
+	def base_levels_query(self, students):
+		#	enrollments of unknown level are stored with -1
+		return (
+			select(Enrollment.student_id, func.min(Enrollment.level).label('base_level')).
+			where(and_(Enrollment.student_id.in_(students), Enrollment.level > 0)).
+			group_by(Enrollment.student_id)
+		)
+
+
+	async def collect(self, computed: dict, students, stored: dict | None = None):
+		#	students are a list of ids or a select of them, stored gets the values they have now
+		rows = await self.db.execute(
+			select(
+				Student.id,
+				Student.group_id,
+				Student.division_id,
+				*[getattr(Student, field) for field in RECOMPUTED_FIELDS]
+			).
+			where(Student.id.in_(students))
+		)
+		for s in rows.mappings().all():
+			computed[s['id']] = {
+				'id': s['id'],
+				**{field: 0 for field in AGGREGATE_FIELDS},
+				'base_level': 1,
+				'graduate': s['graduate'],
+				'group_id': s['group_id'],
+				'division_id': s['division_id'],
+			}
+			if stored is not None:
+				stored[s['id']] = {field: s[field] for field in RECOMPUTED_FIELDS}
+		result = await self.db.execute(self.aggregates_query(students))
+		for row in result.mappings().all():
+			computed[row['student_id']].update({field: row[field] or 0 for field in AGGREGATE_FIELDS})
+		result = await self.db.execute(self.base_levels_query(students))
+		for student_id, base_level in result.all():
+			computed[student_id]['base_level'] = base_level
+
+
+	async def finish(self, computed: dict):
+		for values in computed.values():
+			values['level'] = level_for(values['passed_hours'], values.get('base_level', 1))
+			values['gpa'] = gpa_for(values)
+		await self.check_graduation(computed)
+		return computed
+
+
+	async def compute(self, student_ids: Iterable[UUID]):
+		computed = dict()
+		for chunk in chunked(set(student_ids)):
+			await self.collect(computed, chunk)
+		return await self.finish(computed)
+
+
+	async def compute_group(self, group_id: int, stored: dict | None = None):
+		#	every student of a group in one pass, their ids never leave the database
+		computed = dict()
+		await self.collect(computed, select(Student.id).where(Student.group_id == group_id), stored)
+		return await self.finish(computed)
+
+
+	async def check_graduation(self, computed: dict):
+		#	graduation eligibility of every fourth level student at once.
+		#	students short of hours (or without a division) keep their flag
+		candidates = [v for v in computed.values() if v['level'] == GRADUATION_LEVEL]
+		if not candidates:
+			return
+		audit = GraduationHandler(self.user, self.db)
+		checks = await audit.evaluate(
+			candidates,
+			await audit.passed_courses([v['id'] for v in candidates]),
+			await reference_store.get(self.db)
+		)
+		decided = checks['division'] & checks['hours']
+		graduate = checks['required courses'] & checks['gpa']
+		for i, values in enumerate(candidates):
+			if decided[i]:
+				values['graduate'] = bool(graduate[i])
+
+
+	async def contribution(self, student_id: UUID, course_id: int):
+		#	what one student's attempts at one course add to the aggregates. the hour rules only
+		#	ever look at the attempts of a course, an edit changes this contribution and no other
+		result = await self.db.execute(self.aggregates_query([student_id], Enrollment.course_id == course_id))
+		row = result.mappings().first()
+		return {field: (row[field] or 0) if row else 0 for field in AGGREGATE_FIELDS}
+
+
+	async def apply_delta(self, student_id: UUID, before: dict, after: dict):
+		#	moves the stored aggregates by the change of a contribution, in the caller's transaction
+		#	level, gpa and graduation are derived again even when the aggregates did not move, a write
+		#	can change the student's base level alone
+		deltas = {field: after[field] - before[field] for field in AGGREGATE_FIELDS}
+		result = await self.db.execute(
+			update(Student).
+			where(Student.id == student_id).
+			values({field: getattr(Student, field) + delta for field, delta in deltas.items()}).
+			returning(
+				Student.id,
+				Student.group_id,
+				Student.division_id,
+				*[getattr(Student, field) for field in RECOMPUTED_FIELDS]
+			)
+		)
+		row = result.mappings().first()
+		if not row:
+			return
+		base_level = (await self.db.execute(self.base_levels_query([student_id]))).first()
+		computed = {row['id']: {**row, 'base_level': base_level.base_level if base_level else 1}}
+		await self.finish(computed)
+		await self.db.execute(
+			update(Student).
+			where(Student.id == student_id).
+			values({field: computed[row['id']][field] for field in ['level', 'gpa', 'graduate']})
+		)
+
+
+	async def write(self, computed: Iterable[dict]):
+		for chunk in chunked(computed):
+			await self.db.execute(
+				update(Student),
+				[{'id': values['id'], **{field: values[field] for field in RECOMPUTED_FIELDS}} for values in chunk]
+			)
+
+
+	async def recompute(self, student_ids: Iterable[UUID]):
+		computed = await self.compute(student_ids)
+		await self.write(computed.values())
+		return computed
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from typing import Hashable, Iterable
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update
+
+from config import settings
+from generics.bulk import chunked
+from generics.invalidation import invalidation_bus
+
+from student.models import Student
+
+
+
+class TranscriptCache:
+
+	#	serialized student details keyed by (student id, filters) and tagged with the student's version,
+	#	an entry is only served while the stored version matches. least recently used entries go first
+	#	once the cached bytes pass max_bytes
+	def __init__(self, max_bytes: int) -> None:
+		self.max_bytes = max_bytes
+		self.entries = OrderedDict()
+		self.size = 0
+
+
+	def get(self, key: Hashable, version: int) -> bytes | None:
+		entry = self.entries.get(key)
+		if not entry:
+			return None
+		if entry[0] != version:
+			self.discard(key)
+			return None
+		self.entries.move_to_end(key)
+		return entry[1]
+
+
+	def set(self, key: Hashable, version: int, content: bytes):
+		if len(content) > self.max_bytes:
+			return
+		self.discard(key)
+		self.entries[key] = (version, content)
+		self.size += len(content)
+		while self.size > self.max_bytes:
+			_, (_, evicted) = self.entries.popitem(last=False)
+			self.size -= len(evicted)
+
+
+	def discard(self, key: Hashable):
+		entry = self.entries.pop(key, None)
+		if entry:
+			self.size -= len(entry[1])
+
+
+	def clear(self):
+		self.entries.clear()
+		self.size = 0
+
+
+	def invalidate(self, key: str | None):
+		#	details embed regulation, department and division names
+		self.clear()
+
+
+
+async def bump_versions(db: AsyncSession, student_ids: Iterable[UUID]):
+	#	in the writer's transaction, other workers see the new version as soon as it commits
+	for chunk in chunked(set(student_ids)):
+		await db.execute(
+			update(Student).
+			where(Student.id.in_(chunk)).
+			values(version=Student.version + 1)
+		)
+
+
+transcript_cache = TranscriptCache(settings.TRANSCRIPT_CACHE_MAX_BYTES)
+
+for name in ['regulations', 'departments', 'divisions']:
+	invalidation_bus.subscribe(name, transcript_cache.invalidate)
@@ -0,0 +1,224 @@
+from typing import Dict, Iterable, List
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, update
+from sqlalchemy.future import select
+
+from generics.bulk import chunked
+from generics.scope import AccessScope
+from generics.reference import reference_store, ReferenceData
+
+from student.models import Student
+from student.cache import bump_versions
+from course.models import Course, CourseDivisions
+from enrollment.models import Enrollment
+from user.models import User
+
+
+
+PASSED_GRADES = ['A', 'B', 'C', 'D']
+RESEARCH_GRADE = 'بح'
+GRADUATION_LEVEL = 4
+MIN_GPA = 1
+
+
+def passed_condition():
+	#	a course counts as passed on a passing grade or a research graded with no mark
+	return or_(
+		Enrollment.grade.in_(PASSED_GRADES),
+		and_(
+			Enrollment.grade == RESEARCH_GRADE,
+			Enrollment.mark == 0
+		)
+	)
+
+
+
+class RequiredCourses:
+
+	#	the required courses of some divisions as bitsets over one shared course axis, a row of
+	#	packed bits per division. the extra last row is empty and stands for "no division"
+	def __init__(self, rows: Iterable[tuple]) -> None:
+		rows = list(rows)
+		codes = {course_id: code for _, course_id, code in rows}
+		self.course_ids = np.array(sorted(codes), dtype=np.int64)
+		self.codes = np.array([codes[id] for id in self.course_ids.tolist()], dtype=object)
+		self.rows = {id: i for i, id in enumerate(sorted({division_id for division_id, _, _ in rows}))}
+		matrix = np.zeros((len(self.rows) + 1, len(self.course_ids)), dtype=bool)
+		if rows:
+			matrix[
+				[self.rows[division_id] for division_id, _, _ in rows],
+				self.columns(np.array([course_id for _, course_id, _ in rows]))
+			] = True
+		self.bits = np.packbits(matrix, axis=1)
+
+
+	def row(self, division_id: int | None) -> int:
+		return self.rows.get(division_id, len(self.rows))
+
+
+	def columns(self, course_ids: np.ndarray) -> np.ndarray:
+		return np.searchsorted(self.course_ids, course_ids)
+
+
+	def passed_bits(self, count: int, students: np.ndarray, course_ids: np.ndarray) -> np.ndarray:
+		#	(student row, course id) pairs to one packed row per student, courses nobody requires dropped
+		passed = np.zeros((count, len(self.course_ids)), dtype=bool)
+		if len(course_ids) and len(self.course_ids):
+			columns = self.columns(course_ids)
+			known = columns < len(self.course_ids)
+			known[known] = self.course_ids[columns[known]] == course_ids[known]
+			passed[students[known], columns[known]] = True
+		return np.packbits(passed, axis=1)
+
+
+	def missing_codes(self, bits: np.ndarray) -> List[str]:
+		return self.codes[np.unpackbits(bits, count=len(self.course_ids)).astype(bool)].tolist()
+
+
+
+class GraduationHandler:
+
+	#	graduation eligibility of whole cohorts at once, evaluated over arrays: enough hours for the
+	#	group (or division), a passing gpa and required courses as division bitsets against the passed courses
+	#	of every student, loaded with one query
+	def __init__(self, user: User, db: AsyncSession, scope: AccessScope | None = None) -> None:
+		self.user = user
+		self.db = db
+		self.scope = scope or AccessScope(user)
+
+
+	async def required_courses(self, division_ids: Iterable[int]) -> RequiredCourses:
+		query = await self.db.execute(
+			select(CourseDivisions.c.division_id, Course.id, Course.code).
+			join(Course, Course.id == CourseDivisions.c.course_id).
+			where(
+				and_(
+					Course.required == True,
+					CourseDivisions.c.division_id.in_(list(division_ids))
+				)
+			)
+		)
+		return RequiredCourses(query.all())
+
+
+	def passed_query(self, *conditions):
+		#	only required courses can block a graduation, the others are not loaded
+		return (
+			select(Enrollment.student_id, Enrollment.course_id).
+			join(Student, Student.id == Enrollment.student_id).
+			join(Course, Course.id == Enrollment.course_id).
+			where(and_(Course.required == True, passed_condition(), *conditions)).
+			distinct()
+		)
+
+
+	async def passed_courses(self, student_ids: Iterable[UUID]) -> List[tuple]:
+		passed = []
+		for chunk in chunked(set(student_ids)):
+			query = await self.db.execute(self.passed_query(Student.id.in_(chunk)))
+			passed += query.all()
+		return passed
+
+
+	async def evaluate(self, students: List[dict], passed: List[tuple], reference: ReferenceData) -> Dict[str, np.ndarray]:
+		#	students carry id, level, passed_hours, gpa, group_id and division_id. every check
+		#	comes back as one boolean per student, missing holds the packed missing courses
+		division_ids = {s['group_id'] for s in students} | {s['division_id'] for s in students if s['division_id']}
+		required = await self.required_courses(division_ids)
+		index = {s['id']: i for i, s in enumerate(students)}
+		pairs = [(index[student_id], course_id) for student_id, course_id in passed if student_id in index]
+		passed_bits = required.passed_bits(
+			len(students),
+			np.array([i for i, _ in pairs], dtype=np.int64),
+			np.array([course_id for _, course_id in pairs], dtype=np.int64)
+		)
+		groups = [reference.division(s['group_id']) for s in students]
+		divisions = [reference.division(s['division_id']) for s in students]
+		hours = np.array([s['passed_hours'] for s in students], dtype=float)
+		group_private = np.array([g.private for g in groups], dtype=bool)
+		group_hours = np.array([g.hours for g in groups], dtype=float)
+		has_division = np.array([d is not None for d in divisions], dtype=bool)
+		division_hours = np.array([d.hours if d else 0 for d in divisions], dtype=float)
+		required_bits = (
+			required.bits[[required.row(s['group_id']) for s in students]] |
+			required.bits[[required.row(s['division_id']) for s in students]]
+		)
+		missing = required_bits & ~passed_bits
+		return {
+			'level': np.array([s['level'] for s in students]) == GRADUATION_LEVEL,
+			'hours': (~group_private | (hours >= group_hours)) & (hours >= division_hours),
+			'division': has_division,
+			'required courses': ~missing.any(axis=1),
+			'gpa': np.array([s['gpa'] for s in students], dtype=float) >= MIN_GPA,
+			'missing': missing,
+			'required': required,
+		}
+
+
+	async def candidates(self, division_ids: List[int]):
+		conditions = [
+			Student.level == GRADUATION_LEVEL,
+			or_(
+				Student.group_id.in_(division_ids),
+				Student.division_id.in_(division_ids)
+			)
+		]
+		if not self.user.is_admin:
+			conditions.append(self.scope.filter(Student.division_id, Student.group_id))
+		query = await self.db.execute(
+			select(
+				Student.id,
+				Student.name,
+				Student.level,
+				Student.passed_hours,
+				Student.gpa,
+				Student.graduate,
+				Student.group_id,
+				Student.division_id,
+			).
+			where(and_(*conditions)).
+			order_by(Student.name, Student.id)
+		)
+		students = [dict(s) for s in query.mappings().all()]
+		if not students:
+			return students, []
+		passed = await self.db.execute(self.passed_query(*conditions))
+		return students, passed.all()
+
+
+	async def run(self, regulation_id: int | None = None, division_id: int | None = None, apply: bool = False):
+		#	the fourth level students of a regulation or a division (of every one in scope otherwise),
+		#	apply writes the graduate flags that disagree with the audit
+		reference = await reference_store.get(self.db)
+		division_ids = [
+			d.id for d in reference.divisions.values()
+			if (regulation_id is None or d.regulation.id == regulation_id)
+			and (division_id is None or d.id == division_id)
+		]
+		students, passed = await self.candidates(division_ids) if division_ids else ([], [])
+		result = {'eligible': [], 'blocked': [], 'changed': 0, 'applied': apply}
+		if not students:
+			return result
+		checks = await self.evaluate(students, passed, reference)
+		names = ['level', 'division', 'hours', 'required courses', 'gpa']
+		eligible = np.logical_and.reduce([checks[name] for name in names])
+		changed = []
+		for i, student in enumerate(students):
+			audited = {
+				**student,
+				'blocked_by': [name for name in names if not checks[name][i]],
+				'missing_courses': checks['required'].missing_codes(checks['missing'][i]),
+			}
+			result['eligible' if eligible[i] else 'blocked'].append(audited)
+			if student['graduate'] != bool(eligible[i]):
+				changed.append({'id': student['id'], 'graduate': bool(eligible[i])})
+		result['changed'] = len(changed)
+		if apply and changed:
+			for chunk in chunked(changed):
+				await self.db.execute(update(Student), chunk)
+			await bump_versions(self.db, [student['id'] for student in changed])
+			await self.db.commit()
+		return result
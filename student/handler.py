@@ -1,19 +1,28 @@
-from typing import Optional
+from typing import Iterable, Optional
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import or_, and_, func, desc
+from sqlalchemy import or_, and_, func, desc, exists
 from sqlalchemy.future import select
 from sqlalchemy import insert, update, delete
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, contains_eager
 
 
+from database.async_client import AsyncSessionLocal
 from generics.exceptions import StudentNotFoundException
+from generics.bulk import chunked
+from generics.export import stream_rows
+from generics.names import normalize_name, prefix_filter
+from generics.pagination import Pagination
+from generics.scope import AccessScope
+from generics.reference import reference_store, ReferenceData
 
 
-from .schemas import StudentCreate
+from .schemas import StudentCreate, StudentDetail
+from .cache import transcript_cache, bump_versions
+from .semesters import SemesterStatsHandler
 
-from student.models import Student
+from student.models import Student, StudentSemesterStats
 from division.models import Division
 from course.models import Course
 from enrollment.models import Enrollment
@@ -27,46 +36,66 @@ from course.handler import CourseHandler
 class StudentHandler:
 
 
-	def __init__(self, user: User, db: AsyncSession) -> None:
+	def __init__(self, user: User, db: AsyncSession, scope: AccessScope | None = None) -> None:
 		self.user = user
 		self.db = db
+		self.scope = scope or AccessScope(user)
 		self.NotFoundException = StudentNotFoundException()
-		self.division_handler = DivisionHandler(user, db)
-		self.enrollment_handler = EnrollmentHandler(user, db)
-		self.course_handler = CourseHandler(user, db)
-		self.retrieve_query = (
-			select(Student).
-			options(
-				selectinload(Student.group).
-				options(
-					selectinload(Division.regulation),
-					selectinload(Division.department_1),
-					selectinload(Division.department_2),
-				),
-				selectinload(Student.division).
-				options(
-					selectinload(Division.regulation),
-					selectinload(Division.department_1),
-					selectinload(Division.department_2),
-				)
-			)
-		)
+		self.division_handler = DivisionHandler(user, db, self.scope)
+		self.enrollment_handler = EnrollmentHandler(user, db, self.scope)
+		self.course_handler = CourseHandler(user, db, self.scope)
+		#	nested divisions are hydrated from the reference store, see student_values
+		self.retrieve_query = select(Student)
 		if not self.user.is_admin:
 			self.retrieve_query = self.retrieve_query.where(
-				or_(
-					Student.division_id.in_(
-						select(Division.id).
-						where(Division.users.any(id=self.user.id))
-					),
-					Student.group_id.in_(
-						select(Division.id).
-						where(Division.users.any(id=self.user.id))
-					)
-				)
+				self.scope.filter(Student.division_id, Student.group_id)
 			)
 
 
-	async def get_all(self, regulation_id: int | None, graduate: bool = False):
+	sort_keys = {
+		'id': [Student.id],
+		'name': [Student.name, Student.id],
+		'level': [Student.level, Student.id],
+		'gpa': [Student.gpa, Student.id],
+		'passed_hours': [Student.passed_hours, Student.id],
+	}
+
+
+	async def get_all(
+		self,
+		regulation_id: int | None,
+		graduate: bool = False,
+		division_id: int | None = None,
+		level: int | None = None,
+		name: str | None = None,
+		page: Pagination | None = None,
+	):
+		query = self.list_query(regulation_id, graduate, division_id, level, name)
+		if page:
+			students = await page.fetch(self.db, query, self.sort_keys, 'name')
+		else:
+			students = (await self.db.execute(query)).scalars().all()
+		data = await reference_store.get(self.db)
+		return [self.student_values(s, data) for s in students]
+
+
+	@staticmethod
+	def student_values(student: Student, data: ReferenceData):
+		return {
+			**{column.key: getattr(student, column.key) for column in Student.__table__.columns},
+			'group': data.division(student.group_id),
+			'division': data.division(student.division_id),
+		}
+
+
+	def list_query(
+		self,
+		regulation_id: int | None,
+		graduate: bool = False,
+		division_id: int | None = None,
+		level: int | None = None,
+		name: str | None = None,
+	):
 		query = self.retrieve_query
 		if regulation_id:
 			query = query.where(
@@ -83,9 +112,151 @@ class StudentHandler:
 			)
 		if graduate:
 			query = query.where(Student.graduate == True)
-		students = await self.db.execute(query)
-		return students.scalars().all()
-		
+		if division_id:
+			query = query.where(
+				or_(
+					Student.group_id == division_id,
+					Student.division_id == division_id
+				)
+			)
+		if level:
+			query = query.where(Student.level == level)
+		if name:
+			query = query.where(prefix_filter(Student.normalized_name, normalize_name(name), self.db.bind.dialect.name))
+		return query
+
+
+	export_fields = [
+		'id', 'name', 'level', 'registered_hours', 'passed_hours', 'excluded_hours', 'research_hours',
+		'total_points', 'gpa', 'total_mark', 'graduate', 'group_id', 'division_id',
+	]
+
+
+	def export_students(
+		self,
+		regulation_id: int | None,
+		division_id: int | None = None,
+		year: str | None = None,
+		level: int | None = None,
+		format: str = 'ndjson',
+		session_factory=AsyncSessionLocal,
+	):
+		#	plain rows off a server side cursor, with regulation and division names from the reference store
+		query = self.list_query(regulation_id, division_id=division_id, level=level)
+		if year:
+			query = query.where(
+				exists().where(and_(Enrollment.student_id == Student.id, Enrollment.year == year))
+			)
+		query = (
+			query.
+			with_only_columns(*[Student.__table__.c[field] for field in self.export_fields]).
+			order_by(Student.id)
+		)
+
+		async def values(db: AsyncSession):
+			data = await reference_store.get(db)
+
+			def complete(row):
+				group = data.division(row['group_id'])
+				division = data.division(row['division_id'])
+				return {
+					**row,
+					'regulation': (division or group).regulation.name,
+					'group': group.name,
+					'division': division.name if division else None,
+				}
+			return complete
+
+		columns = [*self.export_fields, 'regulation', 'group', 'division']
+		return stream_rows(query, columns, format, values, session_factory)
+
+
+	def export_enrollments(
+		self,
+		regulation_id: int | None,
+		division_id: int | None = None,
+		year: str | None = None,
+		level: int | None = None,
+		format: str = 'ndjson',
+		session_factory=AsyncSessionLocal,
+	):
+		#	the enrollments of the students list_query selects, year and level are those of the enrollment
+		students = self.list_query(regulation_id, division_id=division_id)
+		query = (
+			select(
+				Enrollment.id,
+				Enrollment.student_id,
+				Student.name.label('student'),
+				Course.code.label('course_code'),
+				Course.name.label('course'),
+				Enrollment.seat_id,
+				Enrollment.year,
+				Enrollment.month,
+				Enrollment.semester,
+				Enrollment.level,
+				Enrollment.mark,
+				Enrollment.full_mark,
+				Enrollment.grade,
+				Enrollment.points,
+			).
+			select_from(Enrollment).
+			join(Student, Student.id == Enrollment.student_id).
+			join(Course, Course.id == Enrollment.course_id).
+			order_by(Enrollment.student_id)
+		)
+		if students.whereclause is not None:
+			query = query.where(students.whereclause)
+		if year:
+			query = query.where(Enrollment.year == year)
+		if level:
+			query = query.where(Enrollment.level == level)
+		return stream_rows(query, list(query.selected_columns.keys()), format, session_factory=session_factory)
+
+
+	async def get_graduates(self, regulation_id: int | None, year: str | None = None):
+		#	the last (year, semester) of every student is picked by a window over its semester stats
+		last_terms = (
+			select(
+				StudentSemesterStats.student_id,
+				StudentSemesterStats.year,
+				StudentSemesterStats.semester,
+				func.row_number().over(
+					partition_by=StudentSemesterStats.student_id,
+					order_by=(desc(StudentSemesterStats.year), desc(StudentSemesterStats.semester))
+				).label('rank')
+			).
+			subquery()
+		)
+		#	students without stats rows (not recomputed since the table was added) fall back to
+		#	the last term of their enrollments
+		years = aliased(Enrollment)
+		last_year = (
+			select(func.max(years.year)).
+			where(years.student_id == Student.id).
+			correlate(Student).
+			scalar_subquery()
+		)
+		last_semester = (
+			select(func.max(Enrollment.semester)).
+			where(Enrollment.student_id == Student.id, Enrollment.year == last_year).
+			correlate(Student).
+			scalar_subquery()
+		)
+		year_column = func.coalesce(last_terms.c.year, last_year)
+		query = (
+			self.list_query(regulation_id, graduate=True).
+			outerjoin(last_terms, and_(last_terms.c.student_id == Student.id, last_terms.c.rank == 1)).
+			add_columns(year_column, func.coalesce(last_terms.c.semester, last_semester))
+		)
+		if year:
+			query = query.where(year_column == year)
+		result = await self.db.execute(query)
+		data = await reference_store.get(self.db)
+		return [
+			{**self.student_values(student, data), 'year': year, 'semester': semester}
+			for student, year, semester in result.all()
+		]
+
 
 
 	async def create(self, student: StudentCreate):
@@ -95,26 +266,11 @@ class StudentHandler:
 		query = await self.db.execute(
 			insert(Student).
 			values(**student.dict()).
-			returning(Student).
-			options(
-				selectinload(Student.group).
-				options(
-					selectinload(Division.regulation),
-					selectinload(Division.department_1),
-					selectinload(Division.department_2),
-				),
-				selectinload(Student.division).
-				options(
-					selectinload(Division.regulation),
-					selectinload(Division.department_1),
-					selectinload(Division.department_2),
-				)
-			)
+			returning(Student)
 		)
 		student = query.scalar_one()
 		await self.db.commit()
-		await self.db.refresh(student)
-		return student
+		return self.student_values(student, await reference_store.get(self.db))
 
 
 	async def get_one(self, id: UUID):
@@ -123,38 +279,64 @@ class StudentHandler:
 		student = query.scalar()
 		if student:
 			return student
-		raise self.NotFoundException
+		raise await self.scope.missing(self.db, Student, id, self.NotFoundException)
 
 
 	async def get_by_name(self, name: str):
-		query = self.retrieve_query.where(Student.name==name)
+		query = self.retrieve_query.where(Student.normalized_name==normalize_name(name))
 		query = await self.db.execute(query)
 		student = query.scalar()
 		return student
 
 
-	async def get_by_name_and_division(self, name: str, division: Division):
-		student = await self.get_by_name(name)
-		if student:
-			if division.group or division.private:
-				return student
-			student.division = division
+	async def get_by_names(self, names: Iterable[str]):
+		#	keyed by the names as given, spelling variants of one name get the same student
+		keys = {name: normalize_name(name) for name in names}
+		found = dict()
+		for chunk in chunked(set(keys.values())):
+			query = await self.db.execute(self.retrieve_query.where(Student.normalized_name.in_(chunk)))
+			for student in query.scalars().all():
+				found.setdefault(student.normalized_name, student)
+		return {name: found[key] for name, key in keys.items() if key in found}
+
+
+	async def get_or_create_by_names(self, names: Iterable[str], division: Division):
+		#	the students of a sheet, missing ones are created when the sheet is of a group (or a private
+		#	division), students found on a division's sheet are moved to that division
+		names = list(dict.fromkeys(names))
+		students = await self.get_by_names(names)
+		if division.group or division.private:
+			new_students = dict()
+			for name in names:
+				if name in students:
+					continue
+				#	the first spelling of a new name is the one stored
+				key = normalize_name(name)
+				if key not in new_students:
+					new_students[key] = Student(
+						name=name, 
+						normalized_name=key,
+						group_id=division.id, 
+						excluded_hours=0, 
+						passed_hours=0, 
+						registered_hours=0, 
+						research_hours=0,
+						total_points=0,
+						total_mark=0
+					)
+				students[name] = new_students[key]
+			self.db.add_all(new_students.values())
+			await self.db.flush()
 		else:
-			if division.group or division.private:
-				student = Student(
-					name=name, 
-					group_id=division.id, 
-					excluded_hours=0, 
-					passed_hours=0, 
-					registered_hours=0, 
-					research_hours=0,
-					total_points=0,
-					total_mark=0
-				)
-				self.db.add(student)
-				await self.db.commit()
-				await self.db.refresh(student)
-		return student
+			#	a move changes what the cached transcript shows, the student's version moves with it
+			moved = set()
+			for student in students.values():
+				if student.division_id != division.id:
+					student.division_id = division.id
+					moved.add(student.id)
+			await self.db.flush()
+			await bump_versions(self.db, moved)
+		return students
 
 
 	async def update(self, id: UUID, student: StudentCreate):
@@ -164,30 +346,15 @@ class StudentHandler:
 		query = (
 			update(Student).
 			where(Student.id == id).
-			values({**student.dict()}).
-			returning(Student).
-			options(
-				selectinload(Student.group).
-				options(
-					selectinload(Division.regulation),
-					selectinload(Division.department_1),
-					selectinload(Division.department_2),
-				),
-				selectinload(Student.division).
-				options(
-					selectinload(Division.regulation),
-					selectinload(Division.department_1),
-					selectinload(Division.department_2),
-				)
-			)
+			values({**student.dict(), 'normalized_name': normalize_name(student.name), 'version': Student.version + 1}).
+			returning(Student)
 		)
 		query = await self.db.execute(query)
 		student = query.scalar()
 		if not student:
 			raise self.NotFoundException
 		await self.db.commit()
-		await self.db.refresh(student)
-		return student
+		return self.student_values(student, await reference_store.get(self.db))
 
 
 	async def delete(self, id: UUID):
@@ -198,122 +365,95 @@ class StudentHandler:
 		await self.db.commit()
 		return
 
-	async def get_graduation_year(self, id: UUID):
-		query = await self.db.execute(
-		    select(Enrollment.year).
-			where(Enrollment.student_id == id).
-			order_by(desc(Enrollment.year), desc(Enrollment.semester))
+	async def get_transcript(
+		self,
+		student_id: UUID,
+		level: Optional[int] = None,
+		semester: Optional[int] = None,
+	):
+		#	every enrollment of the student with its course in one query, grouped by term here
+		query = (
+			select(Enrollment).
+			join(Course, Course.id == Enrollment.course_id).
+			options(contains_eager(Enrollment.course)).
+			where(Enrollment.student_id == student_id).
+			order_by(Enrollment.year, Enrollment.semester)
 		)
-		return query.first()[0]
+		if level:
+			query = query.where(Course.level == level)
+		if semester:
+			query = query.where(Course.semester == semester)
+		result = await self.db.execute(query)
+		terms = {
+			(l, s): {'level': l, 'semester': s, 'points': None, 'enrollments': []}
+			for l in ([level] if level else range(1, 5))
+			for s in ([semester] if semester else range(1, 4))
+		}
+		for enrollment in result.scalars().all():
+			term = terms.get((enrollment.course.level, enrollment.course.semester))
+			if not term:
+				continue
+			term['enrollments'].append(enrollment)
+			if enrollment.grade in ['A', 'B', 'C', 'D']:
+				term['points'] = (term['points'] or 0) + enrollment.points * enrollment.course.credit_hours
+		return list(terms.values())
+
+
+	async def get_semesters(self, id: UUID):
+		await self.get_one(id)
+		return await SemesterStatsHandler(self.user, self.db).get_all(id)
+
 
-	async def get_graduation_semester(self, id: UUID):
+	async def get_version(self, id: UUID):
 		query = await self.db.execute(
-		    select(Enrollment.semester).
-			where(Enrollment.student_id == id).
-			order_by(desc(Enrollment.year), desc(Enrollment.semester))
+			self.retrieve_query.with_only_columns(Student.version).where(Student.id == id)
 		)
-		return query.first()[0]
+		version = query.scalar()
+		if version is None:
+			raise await self.scope.missing(self.db, Student, id, self.NotFoundException)
+		return version
 
-	async def get_semester_detail(
-		self,
-		student_id: Optional[UUID], 
-		level: Optional[int], 
-		semester: Optional[int],
-	):
-		enrollments = await self.enrollment_handler.get_all(student_id, level, semester, None)
-		total_points_query = (
-			select(func.sum(Enrollment.points * Course.credit_hours)).
-			join(Course).
-			where(
-				and_(
-					Enrollment.grade.in_(['A', 'B', 'C', 'D']),
-					Enrollment.student_id==student_id,
-					Enrollment.course_id.in_(
-						select(Course.id).
-						where(
-							and_(
-								Course.level==level,
-								Course.semester==semester
-							)
-						)
-					)
-				)
-			)
-		)
-		result = await self.db.execute(total_points_query)
-		points = result.scalar()
-		return {'level': level, 'semester': semester, 'points': points, 'enrollments': enrollments}
+
+	async def get_student_detail_content(self, id: UUID, level: Optional[int] = None, semester: Optional[int] = None):
+		#	the serialized detail, rebuilt only when the student's version moved since it was cached
+		version = await self.get_version(id)
+		key = (id, level, semester)
+		content = transcript_cache.get(key, version)
+		if content is None:
+			detail = await self.get_student_detail(id, level, semester)
+			content = StudentDetail.model_validate(detail, from_attributes=True).model_dump_json().encode()
+			transcript_cache.set(key, version, content)
+		return content
 
 
-	async def get_student_detail(self, id: UUID):
+	async def get_student_detail(self, id: UUID, level: Optional[int] = None, semester: Optional[int] = None):
 		student = await self.get_one(id)
-		details = [await self.get_semester_detail(id, l, s) for l in range(1, 5) for s in range(1, 4)]
+		details = await self.get_transcript(id, level, semester)
+		data = await reference_store.get(self.db)
+		group = data.division(student.group_id)
+		division = data.division(student.division_id)
 		return {
-			'regulation': student.division.regulation.name if student.division else student.group.regulation.name,
+			'regulation': division.regulation.name if division else group.regulation.name,
 			'department_1': (
-				student.division.department_1.name 
-				if student.division and student.division.department_1
+				division.department_1.name 
+				if division and division.department_1
 				else (
-					student.group.department_1.name
-					if student.group.department_1
+					group.department_1.name
+					if group.department_1
 					else None
 				)
 			),
 			'department_2': (
-				student.division.department_2.name 
-				if student.division and student.division.department_2
+				division.department_2.name 
+				if division and division.department_2
 				else (
-					student.group.department_2.name
-					if student.group.department_2
+					group.department_2.name
+					if group.department_2
 					else None
 				)
 			),
-			'group': student.group.name,
-			'division': student.division.name if student.division else None,
-			**{key: val for key, val in student.__dict__.items() if key not in ['group', 'division']}, 
+			'group': group.name,
+			'division': division.name if division else None,
+			**{column.key: getattr(student, column.key) for column in Student.__table__.columns}, 
 			'details': details
 		}
-	
-
-	async def check_graduation(self, student: Student):
-		group = await self.db.get(Division, student.group_id)
-		division = await self.db.get(Division, student.division_id)
-		if group.group and not division:
-			return False
-		passed_enrollments = await self.enrollment_handler.get_all(student.id, None, None, None, True, False)
-		if await self.course_handler.check_required_and_not_passed(group.id, passed_enrollments):
-			return False
-		elif division:
-			if await self.course_handler.check_required_and_not_passed(division.id, passed_enrollments):
-				return False
-		if student.gpa < 1:
-			return False
-		return True
-	
-
-	async def post_add_enrollment(self, student: Student):
-		#	check level
-		if student.passed_hours > 98:
-			student.level = 4
-		elif student.passed_hours > 62:
-			student.level = 3
-		elif student.passed_hours > 28:
-			student.level = 2
-		#	check graduation
-		if student.level == 4:
-			group = await self.db.get(Division, student.group_id)
-			division = await self.db.get(Division, student.division_id)
-			if group.private and (student.passed_hours < group.hours):
-				return
-			elif (not student.division) or (student.passed_hours < division.hours):
-				return
-			student.graduate = await self.check_graduation(student)
-		student.gpa = await self.calculate_gpa(student)
-		self.db.add(student)
-		await self.db.commit()
-		return
-	
-
-	async def calculate_gpa(self, student: Student):
-		denominator = student.registered_hours - student.excluded_hours - student.research_hours
-		return student.total_points / denominator if denominator else 0
\ No newline at end of file
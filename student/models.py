@@ -6,15 +6,25 @@ from sqlalchemy import (
 	String,
 	Boolean,
 	ForeignKey,
+	Index,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
 from database import Base
+from generics.names import normalized
 
 
 class Student(Base):
 	__tablename__ = 'students'
+	__table_args__ = (
+		#	varchar_pattern_ops lets postgres use it for the name prefix filter as well as equality
+		Index(
+			'ix_students_normalized_name',
+			'normalized_name',
+			postgresql_ops={'normalized_name': 'varchar_pattern_ops'}
+		),
+	)
 		
 	id = Column(
 	    UUID(as_uuid=True),
@@ -23,8 +33,9 @@ class Student(Base):
 		nullable=False,
 		default=uuid.uuid4
 	)
-	name = Column(String(60), nullable=False)
-	level = Column(Integer, nullable=False, default=1)
+	name = Column(String(60), nullable=False, index=True)
+	normalized_name = Column(String(60), nullable=False, default=normalized('name'))
+	level = Column(Integer, nullable=False, default=1, index=True)
 	registered_hours = Column(Integer, nullable=False, default=0)
 	passed_hours = Column(Integer, nullable=False, default=0)
 	excluded_hours = Column(Integer, nullable=False, default=0)
@@ -32,18 +43,40 @@ class Student(Base):
 	total_points = Column(Float, nullable=False, default=0)
 	gpa = Column(Float, nullable=False, default=0)
 	total_mark = Column(Float, nullable=False, default=0)
-	graduate = Column(Boolean, nullable=False, default=False)
+	graduate = Column(Boolean, nullable=False, default=False, index=True)
+	#	bumped by every write a student's detail depends on, see student.cache
+	version = Column(Integer, nullable=False, default=0, server_default='0')
 	group_id = Column(
 		Integer, 
 		ForeignKey("divisions.id", ondelete="CASCADE"),
-		nullable=False
+		nullable=False,
+		index=True
 	)
 	division_id = Column(
 		Integer, 
 		ForeignKey("divisions.id", ondelete="CASCADE"),
-		nullable=True
+		nullable=True,
+		index=True
 	)
 	
 	group = relationship('Division', foreign_keys=[group_id])
 	division = relationship('Division', foreign_keys=[division_id])
-	enrollments = relationship('Enrollment', back_populates='student')
\ No newline at end of file
+	enrollments = relationship('Enrollment', back_populates='student')
+
+
+class StudentSemesterStats(Base):
+	__tablename__ = 'student_semester_stats'
+
+	#	one row per student and term, derived from the enrollments by student.semesters
+	student_id = Column(
+		UUID(as_uuid=True),
+		ForeignKey("students.id", ondelete="CASCADE"),
+		primary_key=True
+	)
+	year = Column(String(4), primary_key=True)
+	semester = Column(Integer, primary_key=True)
+	level = Column(Integer, primary_key=True)
+	hours = Column(Integer, nullable=False, default=0)
+	points = Column(Float, nullable=False, default=0)
+	gpa = Column(Float, nullable=False, default=0)
+	cumulative_gpa = Column(Float, nullable=False, default=0)
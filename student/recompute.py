@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import logging
+from database.async_client import AsyncSessionLocal, async_engine
+
+from student.models import Student
+from upload.models import UploadJob
+from .aggregates import AggregateHandler, RECOMPUTED_FIELDS
+from .semesters import SemesterStatsHandler
+from .cache import bump_versions
+
+
+
+FLOAT_FIELDS = {'total_points', 'total_mark', 'gpa'}
+TOLERANCE = 1e-6
+
+
+def diff(stored: dict, computed: dict):
+	#	stored against recomputed values a field at a time, as arrays over every student of a partition.
+	#	returns the ids of the students that differ and the number of differences per field
+	ids = list(computed)
+	changed = np.zeros(len(ids), dtype=bool)
+	fields = dict()
+	for field in RECOMPUTED_FIELDS:
+		before = np.array([stored[id][field] for id in ids], dtype=float)
+		after = np.array([computed[id][field] for id in ids], dtype=float)
+		if field in FLOAT_FIELDS:
+			differs = ~np.isclose(before, after, rtol=0, atol=TOLERANCE)
+		else:
+			differs = before != after
+		fields[field] = int(differs.sum())
+		changed |= differs
+	return [id for id, differs in zip(ids, changed) if differs], fields
+
+
+async def recompute_group(group_id: int, dry_run: bool = False, session_factory=AsyncSessionLocal):
+	#	a partition runs in its own session and transaction
+	async with session_factory() as db:
+		handler = AggregateHandler(None, db)
+		stored = dict()
+		computed = await handler.compute_group(group_id, stored)
+		changed, fields = diff(stored, computed)
+		if not dry_run:
+			await handler.write([computed[id] for id in changed])
+			await bump_versions(db, changed)
+			#	semester stats are rebuilt whole, they are derived the same way
+			await SemesterStatsHandler(None, db).refresh(computed)
+			await db.commit()
+	return {'division_id': group_id, 'students': len(computed), 'changed': len(changed), 'fields': fields}
+
+
+def queue_recompute(db: AsyncSession, user_id, division_ids):
+	#	a recompute job of the groups for the upload worker, in the caller's transaction.
+	#	the worker picks it up at its next poll
+	db.add(UploadJob(
+		kind='recompute',
+		params={'division_ids': sorted(division_ids), 'dry_run': False},
+		user_id=user_id
+	))
+
+
+async def recompute_all(
+	division_ids: List[int] | None = None,
+	dry_run: bool = False,
+	workers: int = 4,
+	session_factory=AsyncSessionLocal
+):
+	#	student aggregates from scratch, partitioned by the students' groups (every student has exactly one)
+	#	with workers partitions in flight. division_ids limits the run to the groups of their students
+	started = time.monotonic()
+	async with session_factory() as db:
+		query = select(Student.group_id).distinct().order_by(Student.group_id)
+		if division_ids:
+			query = query.where(
+				or_(
+					Student.group_id.in_(division_ids),
+					Student.division_id.in_(division_ids)
+				)
+			)
+		groups = (await db.execute(query)).scalars().all()
+		if (await db.connection()).dialect.name == 'sqlite':
+			#	sqlite takes one writer at a time, concurrent partitions fail with "database is locked"
+			workers = 1
+	semaphore = asyncio.Semaphore(max(workers, 1))
+
+	async def run(group_id: int):
+		async with semaphore:
+			partition = await recompute_group(group_id, dry_run, session_factory)
+			logging.info(f'recomputed division {group_id}: {partition["changed"]} of {partition["students"]} students changed')
+			return partition
+
+	partitions = await asyncio.gather(*[run(group_id) for group_id in groups])
+	return {
+		'dry_run': dry_run,
+		'workers': max(workers, 1),
+		'students': sum(p['students'] for p in partitions),
+		'changed': sum(p['changed'] for p in partitions),
+		'fields': {field: sum(p['fields'][field] for p in partitions) for field in RECOMPUTED_FIELDS},
+		'divisions': partitions,
+		'seconds': round(time.monotonic() - started, 3),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description='recompute student aggregates from their enrollments')
+	parser.add_argument('--dry-run', action='store_true', help='only report the differences with the stored values')
+	parser.add_argument('--division', type=int, action='append', help='only the students of this group or division, repeatable')
+	parser.add_argument('--workers', type=int, default=4, help='divisions recomputed at the same time')
+	args = parser.parse_args()
+
+	async def run():
+		try:
+			return await recompute_all(args.division, args.dry_run, args.workers)
+		finally:
+			await async_engine.dispose()
+
+	print(json.dumps(asyncio.run(run()), indent=2, default=str))
+
+
+if __name__ == '__main__':
+	main()
@@ -1,17 +1,27 @@
 from uuid import UUID
-from typing import Annotated, List
+from typing import Annotated, List, Literal
 from fastapi import (
 	APIRouter,
 	status,
 	Depends,
 	Path,
-	Query
+	Query,
+	Response
 )
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from generics.permissions import StudentPermission
+from database import get_async_db, get_session_factory
+from generics.permissions import StudentPermission, AdminPermission
+from generics.pagination import Pagination
+from generics.export import export_response
+from upload.jobs import JobHandler
+from upload.schemas import UploadJob
 
-from .schemas import StudentCreate, StudentDetail, Student, GrduateStudent
+from .schemas import StudentCreate, StudentDetail, Student, GrduateStudent, GraduationAudit, SemesterStats
 from .handler import StudentHandler
+from .graduation import GraduationHandler
 
 student_router = APIRouter()
 
@@ -23,10 +33,15 @@ student_router = APIRouter()
 )
 async def get_students(
 	permission_class: Annotated[StudentPermission, Depends(StudentPermission)],
-	regulation: int = Query(None, title='id of regulation to filter result')
+	page: Annotated[Pagination, Depends(Pagination)],
+	regulation: int = Query(None, title='id of regulation to filter result'),
+	division: int = Query(None, title='id of group or division to filter result'),
+	level: int = Query(None, title='level to filter result'),
+	graduate: bool = Query(False, title='only return graduate students'),
+	name: str = Query(None, title='prefix of student name to filter result')
 ):
-	handler = StudentHandler(permission_class.user, permission_class.db)
-	return await handler.get_all(regulation)
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.get_all(regulation, graduate, division, level, name, page)
 
 #	get all graduate students
 @student_router.get(
@@ -36,11 +51,99 @@ async def get_students(
 )
 async def get_graduate_students(
 	permission_class: Annotated[StudentPermission, Depends(StudentPermission)],
-	regulation: int = Query(None, title='id of regulation to filter result')
+	regulation: int = Query(None, title='id of regulation to filter result'),
+	year: str = Query(None, title='graduation year to filter result')
 ):
-	handler = StudentHandler(permission_class.user, permission_class.db)
-	students = await handler.get_all(regulation_id=regulation, graduate=True)
-	return [{**s.__dict__, 'semester': await handler.get_graduation_semester(s.id), 'year': await handler.get_graduation_year(s.id)} for s in students]
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.get_graduates(regulation, year)
+
+
+#	audit graduation eligibility
+@student_router.get(
+	'/graduation-audit',
+    response_model=GraduationAudit,
+    status_code=status.HTTP_200_OK
+)
+async def audit_graduation(
+	permission_class: Annotated[StudentPermission, Depends(StudentPermission)],
+	regulation: int = Query(None, title='id of regulation to audit'),
+	division: int = Query(None, title='id of group or division to audit')
+):
+	handler = GraduationHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.run(regulation, division)
+
+
+#	update graduate flags from the audit, a bulk repair like the recompute so admins only
+@student_router.post(
+	'/graduation-audit',
+    response_model=GraduationAudit,
+    status_code=status.HTTP_200_OK
+)
+async def apply_graduation_audit(
+	permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
+	db: Annotated[AsyncSession, Depends(get_async_db)],
+	regulation: int = Query(None, title='id of regulation to audit'),
+	division: int = Query(None, title='id of group or division to audit')
+):
+	handler = GraduationHandler(permission_class.user, db)
+	return await handler.run(regulation, division, apply=True)
+
+
+#	recompute student aggregates from enrollments, queued on the upload worker.
+#	the report is on the job, GET /data/jobs/{id}
+@student_router.post(
+	'/recompute',
+    response_model=UploadJob,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def recompute_students(
+	permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
+	db: Annotated[AsyncSession, Depends(get_async_db)],
+	division: int = Query(None, title='only recompute the students of this group or division'),
+	dry_run: bool = Query(False, title='only report the differences with the stored values')
+):
+	handler = JobHandler(permission_class.user, db)
+	return await handler.create('recompute', params={'division_ids': [division] if division else None, 'dry_run': dry_run})
+
+
+#	stream students as ndjson or csv
+@student_router.get(
+	'/export',
+	response_class=StreamingResponse,
+	status_code=status.HTTP_200_OK
+)
+async def export_students(
+	permission_class: Annotated[StudentPermission, Depends(StudentPermission)],
+	session_factory: Annotated[sessionmaker, Depends(get_session_factory)],
+	regulation: int = Query(None, title='id of regulation to filter result'),
+	division: int = Query(None, title='id of group or division to filter result'),
+	year: str = Query(None, title='only students with enrollments in this year'),
+	level: int = Query(None, title='level to filter result'),
+	format: Literal['ndjson', 'csv'] = Query('ndjson', title='ndjson or csv')
+):
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
+	rows = handler.export_students(regulation, division, year, level, format, session_factory)
+	return export_response(rows, 'students', format)
+
+
+#	stream the enrollments of students as ndjson or csv
+@student_router.get(
+	'/export/enrollments',
+	response_class=StreamingResponse,
+	status_code=status.HTTP_200_OK
+)
+async def export_enrollments(
+	permission_class: Annotated[StudentPermission, Depends(StudentPermission)],
+	session_factory: Annotated[sessionmaker, Depends(get_session_factory)],
+	regulation: int = Query(None, title='id of regulation to filter result'),
+	division: int = Query(None, title='id of group or division to filter result'),
+	year: str = Query(None, title='year of the enrollments'),
+	level: int = Query(None, title='level of the enrollments'),
+	format: Literal['ndjson', 'csv'] = Query('ndjson', title='ndjson or csv')
+):
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
+	rows = handler.export_enrollments(regulation, division, year, level, format, session_factory)
+	return export_response(rows, 'enrollments', format)
 
 
 #	create student
@@ -53,7 +156,7 @@ async def create_students(
 	student: StudentCreate,
 	permission_class: Annotated[StudentPermission, Depends(StudentPermission)]
 ):
-	handler = StudentHandler(permission_class.user, permission_class.db)
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.create(student)
 
 
@@ -64,12 +167,28 @@ async def create_students(
     status_code=status.HTTP_200_OK
 )
 async def retrieve_students(
+	id: Annotated[UUID, Path(..., title='id of student to be retrieved')],
+	permission_class: Annotated[StudentPermission, Depends(StudentPermission)],
+	level: int = Query(None, title='only show courses of this level'),
+	semester: int = Query(None, title='only show courses of this semester')
+):
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
+	content = await handler.get_student_detail_content(id, level, semester)
+	return Response(content, media_type='application/json')
+
+
+#	get the semester history of one student
+@student_router.get(
+	'/{id}/semesters',
+    response_model=List[SemesterStats],
+    status_code=status.HTTP_200_OK
+)
+async def retrieve_student_semesters(
 	id: Annotated[UUID, Path(..., title='id of student to be retrieved')],
 	permission_class: Annotated[StudentPermission, Depends(StudentPermission)]
 ):
-	await permission_class.check_permission(id)
-	handler = StudentHandler(permission_class.user, permission_class.db)
-	return await handler.get_student_detail(id)
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
+	return await handler.get_semesters(id)
 
 
 #	update student
@@ -83,7 +202,7 @@ async def update_students(
 	permission_class: Annotated[StudentPermission, Depends(StudentPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = StudentHandler(permission_class.user, permission_class.db)
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	return await handler.update(id, student)
 
 
@@ -97,6 +216,6 @@ async def delete_students(
 	permission_class: Annotated[StudentPermission, Depends(StudentPermission)]
 ):
 	await permission_class.check_permission(id)
-	handler = StudentHandler(permission_class.user, permission_class.db)
+	handler = StudentHandler(permission_class.user, permission_class.db, permission_class.scope)
 	await handler.get_one(id)
 	return await handler.delete(id)
\ No newline at end of file
@@ -44,6 +44,38 @@ class GrduateStudent(Student):
     year: str
 
 
+class AuditedStudent(BaseModel):
+    id: UUID
+    name: str
+    level: int
+    passed_hours: int
+    gpa: float
+    graduate: bool
+    group_id: int
+    division_id: int | None
+    blocked_by: List[str]
+    missing_courses: List[str]
+
+class GraduationAudit(BaseModel):
+    eligible: List[AuditedStudent]
+    blocked: List[AuditedStudent]
+    changed: int
+    applied: bool
+
+
+class SemesterStats(BaseModel):
+    year: str
+    semester: int
+    level: int
+    hours: int
+    points: float
+    gpa: float
+    cumulative_gpa: float
+
+    class Config:
+        from_attributes = True
+
+
 class StudentDetail(StudentBase):
     regulation: str | None
     department_1: str | None
@@ -51,4 +83,4 @@ class StudentDetail(StudentBase):
     group: str
     division: str | None
     id: UUID
-    details: List[Semester]
\ No newline at end of file
+    details: List[Semester]
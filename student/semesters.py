@@ -0,0 +1,126 @@
+from typing import Iterable, List, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, case, insert, delete
+from sqlalchemy.future import select
+
+from generics.bulk import chunked
+
+from student.models import StudentSemesterStats
+from course.models import Course
+from enrollment.models import Enrollment
+from user.models import User
+from .aggregates import AggregateHandler, AGGREGATE_FIELDS, EXCUSE_GRADE, gpa_for
+from .graduation import PASSED_GRADES, RESEARCH_GRADE
+
+
+
+def term_of(year, semester):
+	#	enrollments without a level or semester are kept under -1 and 0
+	return str(year), int(semester) if semester is not None else 0
+
+
+def from_term(year_column, semester_column, term: Tuple[str, int]):
+	year, semester = term
+	return or_(year_column > year, and_(year_column == year, semester_column >= semester))
+
+
+def until_term(year_column, semester_column, term: Tuple[str, int]):
+	year, semester = term
+	return or_(year_column < year, and_(year_column == year, semester_column <= semester))
+
+
+
+class SemesterStatsHandler:
+
+	#	student_semester_stats keeps per term the hours a student sat (excuses and research aside), the
+	#	points earned, their gpa and the cumulative gpa at the end of the term, by the rules of the stored
+	#	aggregates. writes refresh the terms of their students from the earliest one they changed
+	def __init__(self, user: User, db: AsyncSession) -> None:
+		self.user = user
+		self.db = db
+		self.aggregate_handler = AggregateHandler(user, db)
+
+
+	def terms_query(self, student_ids: List[UUID], *conditions):
+		level = func.coalesce(Enrollment.level, -1)
+		semester = func.coalesce(Enrollment.semester, 0)
+		sat = and_(
+			Enrollment.grade != EXCUSE_GRADE,
+			or_(Enrollment.grade != RESEARCH_GRADE, Enrollment.mark != 0)
+		)
+		return (
+			select(
+				Enrollment.student_id,
+				Enrollment.year,
+				semester.label('semester'),
+				level.label('level'),
+				func.sum(case((sat, Course.credit_hours), else_=0)).label('hours'),
+				func.sum(
+					case((Enrollment.grade.in_(PASSED_GRADES), Enrollment.points * Course.credit_hours), else_=0)
+				).label('points'),
+			).
+			join(Course, Course.id == Enrollment.course_id).
+			where(and_(Enrollment.student_id.in_(student_ids), *conditions)).
+			group_by(Enrollment.student_id, Enrollment.year, semester, level)
+		)
+
+
+	async def cumulative(self, terms: list):
+		#	one aggregates query per distinct term, over the students that have it
+		semester = func.coalesce(Enrollment.semester, 0)
+		students = dict()
+		for t in terms:
+			students.setdefault((t['year'], t['semester']), set()).add(t['student_id'])
+		gpas = dict()
+		for term, student_ids in students.items():
+			result = await self.db.execute(
+				self.aggregate_handler.aggregates_query(
+					list(student_ids), until_term(Enrollment.year, semester, term)
+				)
+			)
+			for row in result.mappings().all():
+				gpas[(row['student_id'], *term)] = gpa_for({field: row[field] or 0 for field in AGGREGATE_FIELDS})
+		return gpas
+
+
+	async def refresh(self, student_ids: Iterable[UUID], since: Tuple[str, int] | None = None):
+		#	since is the earliest term a write changed, the cumulative gpa of every later term moves with it
+		for chunk in chunked(set(student_ids)):
+			stored = [StudentSemesterStats.student_id.in_(chunk)]
+			conditions = []
+			if since:
+				stored.append(from_term(StudentSemesterStats.year, StudentSemesterStats.semester, since))
+				conditions.append(from_term(Enrollment.year, func.coalesce(Enrollment.semester, 0), since))
+			await self.db.execute(delete(StudentSemesterStats).where(and_(*stored)))
+			result = await self.db.execute(self.terms_query(chunk, *conditions))
+			terms = result.mappings().all()
+			if not terms:
+				continue
+			gpas = await self.cumulative(terms)
+			await self.db.execute(
+				insert(StudentSemesterStats),
+				[
+					{
+						'student_id': t['student_id'],
+						'year': t['year'],
+						'semester': t['semester'],
+						'level': t['level'],
+						'hours': t['hours'] or 0,
+						'points': t['points'] or 0,
+						'gpa': (t['points'] or 0) / t['hours'] if t['hours'] else 0,
+						'cumulative_gpa': gpas.get((t['student_id'], t['year'], t['semester']), 0),
+					}
+					for t in terms
+				]
+			)
+
+
+	async def get_all(self, student_id: UUID):
+		result = await self.db.execute(
+			select(StudentSemesterStats).
+			where(StudentSemesterStats.student_id == student_id).
+			order_by(StudentSemesterStats.year, StudentSemesterStats.semester, StudentSemesterStats.level)
+		)
+		return result.scalars().all()
@@ -1,17 +1,41 @@
+import uuid
+import asyncio
+from io import BytesIO
+
+import pandas as pd
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.future import select
 
 
 from main import app
+from authentication.models import Token
 from authentication.oauth2 import create_access_token
+from authentication.cache import token_cache
+from course.models import Course, CourseDivisions
+from division.models import Division
+from enrollment.models import Enrollment
+from generics.reference import reference_store
+from regulation.models import Regulation
+from student.cache import transcript_cache
+from student.models import Student
+from upload.models import UploadJob
+from user.models import User
 from config import Base
-from database import test_engine, get_test_db, get_async_db
+from database import test_engine, get_test_db, get_async_db, get_session_factory
 
 
 @pytest.fixture(scope='function')
 def client():
 	Base.metadata.drop_all(bind=test_engine)
 	Base.metadata.create_all(bind=test_engine)
+	token_cache.clear()
+	reference_store.invalidate()
 	
 	app.dependency_overrides[get_async_db] = get_test_db
 	with TestClient(app) as client:
@@ -47,3 +71,134 @@ def authorized_client(client, token):
 		'Authorization': f'Bearer {token}'
 	}
 	return client
+
+
+
+#	handler and endpoint tests below run on a throwaway database per test instead of test_db.sqlite3
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+	engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path}/test.sqlite3', poolclass=NullPool)
+	async with engine.begin() as conn:
+		await conn.run_sync(Base.metadata.create_all)
+	reference_store.invalidate()
+	transcript_cache.clear()
+	yield engine
+	reference_store.invalidate()
+	transcript_cache.clear()
+	await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+	return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture
+async def db(session_factory):
+	async with session_factory() as db:
+		yield db
+
+
+class Seed:
+
+	#	the rows most tests start from, flushed so their ids are set
+	def __init__(self, db: AsyncSession) -> None:
+		self.db = db
+
+
+	async def add(self, *objects):
+		self.db.add_all(objects)
+		await self.db.flush()
+		return list(objects)
+
+
+	async def regulation(self, name: str = 'لائحة 2020', max_gpa: int = 4):
+		return (await self.add(Regulation(name=name, max_gpa=max_gpa)))[0]
+
+
+	async def division(self, regulation: Regulation, name: str = 'الكيمياء', hours: int = 140, group: bool = True, **values):
+		return (await self.add(Division(name=name, hours=hours, group=group, regulation_id=regulation.id, **values)))[0]
+
+
+	async def courses(self, *codes: str, divisions: list = (), **values):
+		values = {'lecture_hours': 2, 'practical_hours': 1, 'credit_hours': 3, 'level': 1, 'semester': 1, 'required': True, **values}
+		courses = await self.add(*[Course(code=code, name=code, **values) for code in codes])
+		if divisions:
+			await self.db.execute(
+				insert(CourseDivisions),
+				[{'course_id': c.id, 'division_id': d.id} for c in courses for d in divisions]
+			)
+		return courses
+
+
+	async def students(self, group: Division, *names: str, **values):
+		return await self.add(*[Student(name=name, group_id=group.id, **values) for name in names])
+
+
+	@staticmethod
+	def enrollment(student: Student, course: Course, year: str = '2023', grade: str = 'B', mark: float = 75.0, **values):
+		return {
+			'id': uuid.uuid4(), 'seat_id': 1, 'level': 1, 'semester': 1, 'year': year, 'month': 'يناير',
+			'points': 3.0, 'mark': mark, 'full_mark': 100, 'grade': grade,
+			'student_id': student.id, 'course_id': course.id, **values,
+		}
+
+
+	async def enroll(self, rows: list):
+		await self.db.execute(insert(Enrollment), rows)
+		return rows
+
+
+def courses_file(division: str):
+	#	a courses workbook of two courses of division, laid out as the upload reads it
+	buffer = BytesIO()
+	pd.DataFrame({
+		'level': [1, 2], 'semester': [1, 1], 'division': [division, division], 'code': ['CHM1', 'CHM2'], 'x': [0, 0],
+		'required': [1, 0], 'name': ['كيمياء 1', 'كيمياء 2'], 'lecture': [2, 2], 'practical': [1, 1], 'credit': [3, 3],
+	}).to_excel(buffer, index=False, sheet_name='ساعات معتمدة')
+	return buffer.getvalue()
+
+
+@pytest.fixture
+def seed(db):
+	return Seed(db)
+
+
+def token_for(user: User):
+	return create_access_token({'user_id': str(user.id), 'is_admin': user.is_admin})
+
+
+@pytest_asyncio.fixture
+async def admin(db):
+	user = User(first_name='a', last_name='b', email='admin@example.com', password='password', is_admin=True)
+	db.add(user)
+	await db.flush()
+	db.add(Token(user_id=user.id, token=token_for(user)))
+	await db.commit()
+	return user
+
+
+@pytest.fixture
+def api(session_factory, admin):
+	#	the app on the throwaway database, signed in as admin. startup events (upload worker,
+	#	invalidation bus) do not run outside a with block
+	async def get_db():
+		async with session_factory() as db:
+			yield db
+	app.dependency_overrides[get_async_db] = get_db
+	app.dependency_overrides[get_session_factory] = lambda: session_factory
+	token_cache.clear()
+	yield TestClient(app, headers={'Authorization': f'Bearer {token_for(admin)}'})
+	app.dependency_overrides.clear()
+	token_cache.clear()
+
+
+async def wait_for(session_factory, job_id, *statuses):
+	#	polls a queued job until the worker moves it to one of statuses
+	for _ in range(200):
+		async with session_factory() as db:
+			status = (await db.execute(select(UploadJob.status).where(UploadJob.id == job_id))).scalar()
+		if status in statuses:
+			return status
+		await asyncio.sleep(0.05)
+	raise AssertionError(f'upload job {job_id} is still {status}')
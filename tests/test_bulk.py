@@ -0,0 +1,92 @@
+import uuid
+from io import BytesIO
+
+import pytest
+from fastapi import BackgroundTasks, UploadFile
+from sqlalchemy.future import select
+
+from generics.bulk import bulk_upsert
+from enrollment.handler import EnrollmentHandler
+from enrollment.models import Enrollment, NATURAL_KEY
+from student.models import Student
+from upload import executor
+from upload.handler import UploadHandler
+from upload.ledger import upload_ledger
+
+
+STUDENT = uuid.uuid4()
+
+
+def enrollment(mark, seat_id=1):
+    return {
+        'id': uuid.uuid4(),
+        'seat_id': seat_id,
+        'level': 1,
+        'semester': 1,
+        'year': '2023',
+        'month': 'يناير',
+        'points': 3.0,
+        'mark': mark,
+        'full_mark': 100,
+        'grade': 'B',
+        'student_id': STUDENT,
+        'course_id': 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_upsert_on_natural_key(db):
+    first, second = enrollment(70.0), enrollment(75.0, seat_id=2)
+    written = await bulk_upsert(db, Enrollment, [first, second], NATURAL_KEY)
+    assert set(written) == {first['id'], second['id']}
+    #   the same key again is skipped, or updated only where it differs
+    assert await bulk_upsert(db, Enrollment, [enrollment(80.0)], NATURAL_KEY) == []
+    assert await bulk_upsert(db, Enrollment, [enrollment(80.0)], NATURAL_KEY, ['mark']) == [first['id']]
+    assert await bulk_upsert(db, Enrollment, [enrollment(80.0)], NATURAL_KEY, ['mark']) == []
+    marks = await db.execute(select(Enrollment.seat_id, Enrollment.mark).order_by(Enrollment.seat_id))
+    assert marks.all() == [(1, 80.0), (2, 75.0)]
+    #   keyed, the ids written by their natural key, an updated row keeps its stored id
+    third = enrollment(60.0, seat_id=3)
+    written = await bulk_upsert(db, Enrollment, [enrollment(85.0), third], NATURAL_KEY, ['mark'], keyed=True)
+    assert written == {
+        tuple(first[key] for key in NATURAL_KEY): first['id'],
+        tuple(third[key] for key in NATURAL_KEY): third['id'],
+    }
+
+
+@pytest.mark.asyncio
+async def test_upload_statuses_follow_what_was_written(db, seed, admin, monkeypatch):
+    division = await seed.division(await seed.regulation())
+    [course] = await seed.courses('CHM1', divisions=[division])
+    student, other = await seed.students(division, 'طالب', 'طالب آخر')
+    await seed.enroll([seed.enrollment(student, course, '2023', 'C', 65.0, points=2.0)])
+    await db.commit()
+
+    async def parsed(content):
+        record = {'student': 'طالب', 'course': 'CHM1', 'code': 'CHM1', 'hours': 3, 'full_mark': 100}
+        return {
+            'headers': {'division': division.name, 'level': 1, 'semester': 1, 'year': '2023', 'month': 'يناير'},
+            'content': [
+                {**record, 'seat_id': 1, 'grade': 'A', 'points': 4.0, 'mark': 90.0},
+                {**record, 'student': 'طالب آخر', 'seat_id': 2, 'grade': 'B', 'points': 3.0, 'mark': 75.0},
+            ],
+        }
+
+    async def stored_before(self, headers, student_ids):
+        #   read before a concurrent upload stored the first row
+        return {}
+
+    monkeypatch.setattr(upload_ledger, 'max_bytes', 0)
+    monkeypatch.setattr(executor, 'final_dict', parsed)
+    monkeypatch.setattr(EnrollmentHandler, 'get_stored', stored_before)
+
+    async def upload():
+        file = UploadFile(BytesIO(b'results'), filename='results.xlsx')
+        return [row['status'] for row in await UploadHandler(admin, db, file, BackgroundTasks()).enrollment_upload(delta=True)]
+
+    assert await upload() == ['successfully updated', 'successfully added']
+    assert await upload() == ['enrollment already exists', 'enrollment already exists']
+    marks = await db.execute(select(Enrollment.seat_id, Enrollment.mark).order_by(Enrollment.seat_id))
+    assert marks.all() == [(1, 90.0), (2, 75.0)]
+    #   the updated row's student is recomputed too
+    assert (await db.execute(select(Student.total_points).where(Student.id == student.id))).scalar() == 12.0
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy.future import select
+
+from enrollment.handler import EnrollmentHandler
+from enrollment.schemas import EnrollmentCreate, EnrollmentPartialUpdate
+from student.aggregates import AggregateHandler, RECOMPUTED_FIELDS
+from student.models import Student
+
+
+async def stored_and_recomputed(db, student):
+    stored = await db.execute(select(*[getattr(Student, field) for field in RECOMPUTED_FIELDS]).where(Student.id == student.id))
+    stored = dict(stored.mappings().one())
+    computed = (await AggregateHandler(None, db).compute([student.id]))[student.id]
+    return stored, {field: computed[field] for field in RECOMPUTED_FIELDS}
+
+
+def attempt(seed, student, course, year, grade, mark):
+    return seed.enrollment(student, course, year, grade, mark, points=3.0 if grade in 'AB' else 1.0)
+
+
+@pytest.mark.asyncio
+async def test_enrollment_writes_keep_aggregates_exact(db, seed, admin):
+    division = await seed.division(await seed.regulation())
+    chemistry, physics = await seed.courses('CHM1', 'PHY1')
+    [student] = await seed.students(division, 'طالب')
+    #   two failed attempts, a retake that passed, an excuse and a research
+    rows = await seed.enroll([
+        attempt(seed, student, chemistry, '2020', 'F', 30.0),
+        attempt(seed, student, chemistry, '2021', 'F', 40.0),
+        attempt(seed, student, chemistry, '2022', 'عذر', 0.0),
+        attempt(seed, student, chemistry, '2023', 'B', 75.0),
+        attempt(seed, student, physics, '2020', 'بح', 0.0),
+    ])
+    await AggregateHandler(None, db).recompute([student.id])
+    await db.commit()
+    handler = EnrollmentHandler(admin, db)
+
+    await handler.update(rows[1]['id'], EnrollmentPartialUpdate(mark=65.0, grade='C', points=2.0))
+    stored, recomputed = await stored_and_recomputed(db, student)
+    assert stored == recomputed and stored['excluded_hours'] == 6
+
+    await handler.update(rows[4]['id'], EnrollmentPartialUpdate(mark=10.0, grade='بح', points=0.0))
+    stored, recomputed = await stored_and_recomputed(db, student)
+    assert stored == recomputed and stored['research_hours'] == 0
+
+    await handler.delete(rows[0]['id'])
+    stored, recomputed = await stored_and_recomputed(db, student)
+    assert stored == recomputed and stored['excluded_hours'] == 0
+
+    await handler.create(EnrollmentCreate(**{**attempt(seed, student, physics, '2024', 'A', 90.0), 'year': 2024}))
+    stored, recomputed = await stored_and_recomputed(db, student)
+    assert stored == recomputed and stored['passed_hours'] == 9
+
+
+@pytest.mark.asyncio
+async def test_downgrades_and_deletes_lower_the_level(db, seed, admin):
+    division = await seed.division(await seed.regulation())
+    courses = await seed.courses(*[f'CHM{i}' for i in range(10)])
+    [student] = await seed.students(division, 'طالب')
+    #   thirty passed hours reach the second level, one course less falls back to the first
+    rows = await seed.enroll([seed.enrollment(student, c) for c in courses])
+    await AggregateHandler(None, db).recompute([student.id])
+    await db.commit()
+    handler = EnrollmentHandler(admin, db)
+    stored, _ = await stored_and_recomputed(db, student)
+    assert stored['level'] == 2
+
+    await handler.update(rows[0]['id'], EnrollmentPartialUpdate(mark=20.0, grade='F', points=0.0))
+    stored, recomputed = await stored_and_recomputed(db, student)
+    assert stored == recomputed and stored['level'] == 1
+
+    await handler.update(rows[0]['id'], EnrollmentPartialUpdate(mark=75.0, grade='B', points=3.0))
+    stored, _ = await stored_and_recomputed(db, student)
+    assert stored['level'] == 2
+    await handler.delete(rows[1]['id'])
+    stored, recomputed = await stored_and_recomputed(db, student)
+    assert stored == recomputed and stored['level'] == 1
+
+    #   a student enrolled from the second level on stays there whatever the hours
+    [transferred] = await seed.students(division, 'طالب منقول')
+    [row] = await seed.enroll([seed.enrollment(transferred, courses[0], level=2)])
+    await AggregateHandler(None, db).recompute([transferred.id])
+    await db.commit()
+    await handler.update(row['id'], EnrollmentPartialUpdate(mark=20.0, grade='F', points=0.0))
+    stored, recomputed = await stored_and_recomputed(db, transferred)
+    assert stored == recomputed and stored['level'] == 2
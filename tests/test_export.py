@@ -0,0 +1,39 @@
+import csv
+import io
+import json
+import pytest
+
+from generics import export
+
+
+def lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_exports_stream_filtered_rows(db, seed, api, monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_BATCH_SIZE', 2)
+    regulations = [await seed.regulation(f'لائحة {i}') for i in range(2)]
+    groups = [await seed.division(r, name=f'شعبة {i}') for i, r in enumerate(regulations)]
+    [course] = await seed.courses('CHM1')
+    students = [(await seed.students(groups[i % 2], f'طالب {i}', level=1 + i % 3))[0] for i in range(9)]
+    await seed.enroll([
+        seed.enrollment(s, course, year, seat_id=i, level=1 + i % 3)
+        for i, s in enumerate(students) for year in (['2022', '2023'] if i < 4 else ['2022'])
+    ])
+    await db.commit()
+
+    response = api.get('/students/export', params={'regulation': regulations[0].id})
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    rows = lines(response)
+    assert len(rows) == 5
+    assert {row['regulation'] for row in rows} == {'لائحة 0'} and rows[0]['group'] == 'شعبة 0'
+
+    response = api.get('/students/export', params={'year': '2023', 'level': 1, 'format': 'csv'})
+    assert response.headers['content-disposition'] == 'attachment; filename="students.csv"'
+    table = list(csv.reader(io.StringIO(response.content.decode('utf-8-sig'))))
+    assert table[0][:2] == ['id', 'name'] and sorted(row[1] for row in table[1:]) == ['طالب 0', 'طالب 3']
+
+    rows = lines(api.get('/students/export/enrollments', params={'division': groups[1].id, 'year': '2022'}))
+    assert len(rows) == 4 and {row['course_code'] for row in rows} == {'CHM1'}
+    assert api.get('/students/export', params={'format': 'xml'}).status_code == 422
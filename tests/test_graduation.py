@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from authentication.models import Token
+from student.models import Student
+from user.models import User, UserDivisions
+from tests.conftest import token_for
+from student.semesters import SemesterStatsHandler
+
+
+async def seed_cohort(db, seed):
+    regulation = await seed.regulation()
+    group = await seed.division(regulation, name='العلوم', hours=0)
+    division = await seed.division(regulation, group=False)
+    [general] = await seed.courses('GEN1', level=4, divisions=[group])
+    [major] = await seed.courses('CHM1', level=4, divisions=[division])
+    [elective] = await seed.courses('CHM2', level=4, required=False, divisions=[division])
+    students = {
+        #   name: (passed hours, gpa, graduate flag, has a division, passed courses)
+        'eligible': (150, 2.5, False, True, [general, major, elective]),
+        'missing': (150, 2.5, True, True, [general, elective]),
+        'gpa': (150, 0.5, False, True, [general, major]),
+        'hours': (120, 2.5, False, True, [general, major]),
+        'undivided': (150, 2.5, False, False, [general]),
+    }
+    rows = []
+    for name, (hours, gpa, graduate, divided, passed) in students.items():
+        [student] = await seed.students(
+            group, name, level=4, passed_hours=hours, gpa=gpa, graduate=graduate,
+            division_id=division.id if divided else None
+        )
+        rows += [
+            seed.enrollment(student, c, seat_id=seat_id, level=4, grade='B' if c in passed else 'F', mark=70.0 if c in passed else 20.0)
+            for seat_id, c in enumerate([general, major, elective])
+        ]
+    await seed.enroll(rows)
+    await db.commit()
+    return regulation, division
+
+
+@pytest.mark.asyncio
+async def test_audit_reports_and_applies_graduation(db, seed, api):
+    regulation, division = await seed_cohort(db, seed)
+    audit = api.get('/students/graduation-audit', params={'regulation': regulation.id}).json()
+    assert [s['name'] for s in audit['eligible']] == ['eligible']
+    blocked = {s['name']: (s['blocked_by'], s['missing_courses']) for s in audit['blocked']}
+    assert blocked == {
+        'missing': (['required courses'], ['CHM1']),
+        'gpa': (['gpa'], []),
+        'hours': (['hours'], []),
+        'undivided': (['division'], []),
+    }
+    assert (audit['changed'], audit['applied']) == (2, False)
+    assert api.post('/students/graduation-audit', params={'division': division.id}).json()['changed'] == 2
+    flags = await db.execute(select(Student.name).where(Student.graduate == True))
+    assert flags.scalars().all() == ['eligible']
+    assert api.get('/students/graduation-audit', params={'regulation': regulation.id}).json()['changed'] == 0
+
+
+@pytest.mark.asyncio
+async def test_graduates_without_semester_stats_are_listed(db, seed, api):
+    division = await seed.division(await seed.regulation())
+    [course] = await seed.courses('CHM1')
+    with_stats, without_stats = await seed.students(division, 'with stats', 'without stats', graduate=True)
+    await seed.enroll([
+        seed.enrollment(with_stats, course, '2022', semester=2),
+        seed.enrollment(without_stats, course, '2021', seat_id=2),
+        seed.enrollment(without_stats, course, '2023', seat_id=3, semester=2),
+    ])
+    #   stats rows exist for students written since the table was added
+    await SemesterStatsHandler(None, db).refresh([with_stats.id])
+    await db.commit()
+    graduates = api.get('/students/graduates').json()
+    assert sorted((s['name'], s['year'], s['semester']) for s in graduates) == [
+        ('with stats', '2022', 2), ('without stats', '2023', 2)
+    ]
+    assert [s['name'] for s in api.get('/students/graduates', params={'year': '2023'}).json()] == ['without stats']
+
+
+@pytest.mark.asyncio
+async def test_only_admins_apply_the_audit(db, seed, api):
+    regulation, division = await seed_cohort(db, seed)
+    [user] = await seed.add(User(first_name='a', last_name='b', email='staff@example.com', password='password', is_admin=False))
+    await db.execute(insert(UserDivisions), [{'user_id': user.id, 'division_id': division.id}])
+    db.add(Token(user_id=user.id, token=token_for(user)))
+    await db.commit()
+    headers = {'Authorization': f'Bearer {token_for(user)}'}
+    assert api.get('/students/graduation-audit', params={'division': division.id}, headers=headers).status_code == 200
+    assert api.post('/students/graduation-audit', params={'division': division.id}, headers=headers).status_code == 401
+    flags = await db.execute(select(Student.name).where(Student.graduate == True))
+    assert flags.scalars().all() == ['missing']
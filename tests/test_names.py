@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy.future import select
+
+from generics.names import normalize_name
+from student.handler import StudentHandler
+from student.models import Student
+
+
+def test_normalize_name_folds_spelling_variants():
+    assert normalize_name('الاحصاء') == normalize_name('الإحصاء')
+    assert normalize_name('الكيمياءعلم الحيوان') == normalize_name('الكيمياء / علم الحيوان')
+    assert normalize_name('الكيمياء-النبات') == normalize_name('الكيمياء/النبات')
+    assert normalize_name('ميكروبيولوجى') == normalize_name('ميكروبيولوجي')
+    assert normalize_name('فاطمه محمـد') == normalize_name('فاطمة  مُحمد')
+    assert normalize_name('محمد علي') != normalize_name('محمد على عمر')
+
+
+@pytest.mark.asyncio
+async def test_spelling_variants_resolve_to_one_student(db, seed, admin):
+    division = await seed.division(await seed.regulation(), name='الإحصاء')
+    await seed.students(division, 'أحمد علي')
+    await db.commit()
+    handler = StudentHandler(admin, db)
+    students = await handler.get_or_create_by_names(['احمد على', 'أحمد علي', 'منى حسن', 'منى  حسن'], division)
+    assert students['احمد على'] is students['أحمد علي']
+    assert students['منى حسن'] is students['منى  حسن']
+    await db.commit()
+    stored = await db.execute(select(Student.name, Student.normalized_name).order_by(Student.name))
+    assert stored.all() == [('أحمد علي', 'احمدعلي'), ('منى حسن', 'منيحسن')]
+    assert (await handler.get_by_name('احمد علي')).name == 'أحمد علي'
@@ -0,0 +1,29 @@
+import pytest
+
+from config import settings
+
+
+@pytest.mark.asyncio
+async def test_paginate_students(db, seed, api, monkeypatch):
+    division = await seed.division(await seed.regulation())
+    await seed.students(division, 'test student', 'other student', 'third student')
+    await db.commit()
+
+    res = api.get('/students', params={'limit': 1, 'sort': 'name'})
+    assert res.status_code == 200
+    assert [s["name"] for s in res.json()] == ["other student"]
+    cursor = res.headers["X-Next-Cursor"]
+    res = api.get('/students', params={'limit': 2, 'sort': 'name', 'cursor': cursor})
+    assert [s["name"] for s in res.json()] == ["test student", "third student"]
+    assert "X-Next-Cursor" not in res.headers
+    res = api.get('/students', params={'name': 'test'})
+    assert [s["name"] for s in res.json()] == ["test student"]
+    res = api.get('/students', params={'limit': 1, 'sort': 'level', 'cursor': cursor})
+    assert res.status_code == 400
+
+    #   without a limit the list is still a page
+    monkeypatch.setattr(settings, 'DEFAULT_PAGE_SIZE', 2)
+    res = api.get('/students', params={'sort': 'name'})
+    assert len(res.json()) == 2 and "X-Next-Cursor" in res.headers
+    monkeypatch.setattr(settings, 'MAX_PAGE_SIZE', 1)
+    assert len(api.get('/students', params={'limit': 50}).json()) == 1
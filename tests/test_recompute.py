@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+from student.aggregates import AggregateHandler
+from student.models import Student
+from student.recompute import recompute_all
+from upload.jobs import UploadWorker
+from tests.conftest import wait_for
+
+
+async def seed_students(db, seed):
+    regulation = await seed.regulation()
+    groups = [await seed.division(regulation, name=f'شعبة {i}') for i in range(3)]
+    courses = await seed.courses(*[f'CHM{i}' for i in range(4)])
+    students = [(await seed.students(groups[i % 3], f'طالب {i}'))[0] for i in range(12)]
+    await seed.enroll([
+        seed.enrollment(s, c, seat_id=i, mark=60.0 + i, grade='ABCF'[(i + j) % 4])
+        for i, s in enumerate(students) for j, c in enumerate(courses)
+    ])
+    await AggregateHandler(None, db).recompute([s.id for s in students])
+    await db.commit()
+    return students
+
+
+@pytest.mark.asyncio
+async def test_recompute_reports_and_repairs_drift(db, seed, session_factory):
+    students = await seed_students(db, seed)
+    expected = (await db.execute(select(Student.id, Student.passed_hours, Student.gpa))).all()
+    report = await recompute_all(session_factory=session_factory)
+    assert (report['students'], report['changed'], len(report['divisions']), report['workers']) == (12, 0, 3, 1)
+    #   drift as enrollment edits leave it behind
+    await db.execute(update(Student).where(Student.id == students[0].id).values(passed_hours=99, gpa=3.5))
+    await db.execute(update(Student).where(Student.id == students[1].id).values(total_mark=0))
+    await db.commit()
+    report = await recompute_all(dry_run=True, workers=2, session_factory=session_factory)
+    assert report['changed'] == 2
+    assert {field: count for field, count in report['fields'].items() if count} == {'passed_hours': 1, 'gpa': 1, 'total_mark': 1}
+    report = await recompute_all([students[0].group_id], session_factory=session_factory)
+    assert (report['students'], report['changed']) == (4, 1)
+    report = await recompute_all(session_factory=session_factory)
+    assert report['changed'] == 1
+    assert (await db.execute(select(Student.id, Student.passed_hours, Student.gpa))).all() == expected
+    assert (await recompute_all(dry_run=True, session_factory=session_factory))['changed'] == 0
+
+
+@pytest.mark.asyncio
+async def test_recompute_lowers_a_drifted_level(db, seed, session_factory):
+    division = await seed.division(await seed.regulation())
+    courses = await seed.courses('CHM1', 'CHM2')
+    #   the same six passed hours, one student has first enrollments on the second level
+    drifted, transferred = await seed.students(division, 'طالب 1', 'طالب 2', level=3)
+    await seed.enroll([
+        *[seed.enrollment(drifted, c) for c in courses],
+        *[seed.enrollment(transferred, c, level=2) for c in courses],
+    ])
+    await db.commit()
+    report = await recompute_all(dry_run=True, session_factory=session_factory)
+    assert report['fields']['level'] == 2
+    await recompute_all(session_factory=session_factory)
+    levels = await db.execute(select(Student.name, Student.level).order_by(Student.name))
+    assert levels.all() == [('طالب 1', 1), ('طالب 2', 2)]
+
+
+@pytest.mark.asyncio
+async def test_recompute_endpoint_queues_a_job(db, seed, api, session_factory):
+    students = await seed_students(db, seed)
+    await db.execute(update(Student).where(Student.id == students[0].id).values(passed_hours=99))
+    await db.commit()
+    response = api.post('/students/recompute', params={'dry_run': True})
+    assert response.status_code == 202 and response.json()['kind'] == 'recompute'
+    job_id = uuid.UUID(response.json()['id'])
+    worker = UploadWorker(session_factory)
+    await worker.start()
+    try:
+        assert await wait_for(session_factory, job_id, 'finished', 'failed') == 'finished'
+    finally:
+        await worker.stop()
+    job = api.get(f'/data/jobs/{job_id}').json()
+    assert (job['processed_rows'], job['report']['changed'], job['report']['dry_run']) == (12, 1, True)
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy.future import select
+
+from student.aggregates import AggregateHandler
+from student.models import Student, StudentSemesterStats
+from student.semesters import SemesterStatsHandler
+
+
+async def stats(db):
+    result = await db.execute(
+        select(
+            StudentSemesterStats.year, StudentSemesterStats.semester, StudentSemesterStats.level,
+            StudentSemesterStats.hours, StudentSemesterStats.points, StudentSemesterStats.gpa,
+            StudentSemesterStats.cumulative_gpa,
+        ).
+        order_by(StudentSemesterStats.year, StudentSemesterStats.semester)
+    )
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in result.all()]
+
+
+@pytest.mark.asyncio
+async def test_semester_stats_follow_enrollment_edits(db, seed, api):
+    division = await seed.division(await seed.regulation())
+    [math] = await seed.courses('MTH1', credit_hours=2)
+    [chemistry] = await seed.courses('CHM1')
+    [student] = await seed.students(division, 'طالب')
+    rows = await seed.enroll([
+        seed.enrollment(student, math, '2021', 'B', 80.0),
+        seed.enrollment(student, chemistry, '2021', 'F', 80.0, points=0.0),
+        seed.enrollment(student, chemistry, '2021', 'A', 80.0, semester=2, points=4.0),
+    ])
+    await AggregateHandler(None, db).recompute([student.id])
+    await SemesterStatsHandler(None, db).refresh([student.id])
+    await db.commit()
+    #   the failed attempt only counts once the course is passed
+    assert await stats(db) == [
+        ('2021', 1, 1, 5, 6.0, 1.2, 3.0),
+        ('2021', 2, 1, 3, 12.0, 4.0, 2.25),
+    ]
+    stored = await db.execute(select(Student.gpa).where(Student.id == student.id))
+    assert round(stored.scalar(), 6) == 2.25
+
+    response = api.patch(f'/enrollments/{rows[0]["id"]}', json={'mark': 95.0, 'grade': 'A', 'points': 4.0})
+    assert response.status_code == 200
+    incremental = await stats(db)
+    await SemesterStatsHandler(None, db).refresh([student.id])
+    assert incremental == await stats(db)
+    assert incremental[0][4:] == (8.0, 1.6, 4.0)
+    semesters = api.get(f'/students/{student.id}/semesters').json()
+    assert [(s['year'], s['semester'], s['cumulative_gpa']) for s in semesters] == [('2021', 1, 4.0), ('2021', 2, 2.5)]
@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy.future import select
+
+from student.cache import TranscriptCache, transcript_cache
+from student.handler import StudentHandler
+from student.models import Student
+from upload.models import UploadJob
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TranscriptCache(max_bytes=10)
+    cache.set('a', 0, b'aaaa')
+    cache.set('b', 0, b'bbbb')
+    assert cache.get('a', 0) == b'aaaa'
+    cache.set('c', 0, b'cccc')
+    assert (cache.get('a', 0), cache.get('b', 0), cache.get('c', 0)) == (b'aaaa', None, b'cccc')
+    assert cache.get('a', 1) is None and cache.size == 4
+    cache.set('d', 0, b'd' * 11)
+    assert cache.get('d', 0) is None and cache.size == 4
+
+
+@pytest.mark.asyncio
+async def test_detail_follows_student_version(db, seed, api):
+    division = await seed.division(await seed.regulation())
+    [course] = await seed.courses('CHM1')
+    [student] = await seed.students(division, 'طالب')
+    [enrollment] = await seed.enroll([seed.enrollment(student, course, '2021', 'B', 75.0)])
+    await db.commit()
+
+    first = api.get(f'/students/{student.id}')
+    assert first.status_code == 200 and first.json()['details'][0]['enrollments'][0]['grade'] == 'B'
+    [(key, (version, content))] = transcript_cache.entries.items()
+    assert api.get(f'/students/{student.id}').content == content == first.content
+
+    api.patch(f'/enrollments/{enrollment["id"]}', json={'mark': 95.0, 'grade': 'A', 'points': 4.0})
+    second = api.get(f'/students/{student.id}')
+    assert second.json()['details'][0]['enrollments'][0]['grade'] == 'A'
+    assert transcript_cache.entries[key][0] == version + 1
+
+
+@pytest.mark.asyncio
+async def test_moving_a_student_to_a_division_bumps_its_version(db, seed, admin):
+    regulation = await seed.regulation()
+    group = await seed.division(regulation)
+    division = await seed.division(regulation, name='الكيمياء النبات', group=False)
+    [student] = await seed.students(group, 'طالب')
+    await db.commit()
+    handler = StudentHandler(admin, db)
+    before = student.version
+
+    async def version():
+        await handler.get_or_create_by_names(['طالب'], division)
+        await db.commit()
+        return (await db.execute(select(Student.division_id, Student.version).where(Student.id == student.id))).one()
+
+    assert await version() == (division.id, before + 1)
+    #   a sheet of the division it is in already changes nothing
+    assert await version() == (division.id, before + 1)
+
+
+@pytest.mark.asyncio
+async def test_course_edits_refresh_the_detail(db, seed, api):
+    division = await seed.division(await seed.regulation())
+    [course] = await seed.courses('CHM1', divisions=[division])
+    [student] = await seed.students(division, 'طالب')
+    await seed.enroll([seed.enrollment(student, course, '2021', 'B', 75.0)])
+    await db.commit()
+    assert api.get(f'/students/{student.id}').json()['details'][0]['enrollments'][0]['course']['name'] == 'CHM1'
+
+    values = {
+        'code': 'CHM1', 'name': 'كيمياء عامة', 'lecture_hours': 2, 'practical_hours': 1, 'credit_hours': 3,
+        'level': 1, 'semester': 1, 'required': True, 'divisions': [division.id],
+    }
+    assert api.put(f'/courses/{course.id}', json=values).status_code == 200
+    detail = api.get(f'/students/{student.id}').json()
+    assert detail['details'][0]['enrollments'][0]['course']['name'] == 'كيمياء عامة'
+    assert (await db.execute(select(UploadJob))).scalars().all() == []
+    #   new hours change what the course counts for, the group is recomputed
+    assert api.put(f'/courses/{course.id}', json={**values, 'credit_hours': 4}).status_code == 200
+    assert api.get(f'/students/{student.id}').json()['details'][0]['enrollments'][0]['course']['credit_hours'] == 4
+    [job] = (await db.execute(select(UploadJob))).scalars().all()
+    assert (job.kind, job.params) == ('recompute', {'division_ids': [division.id], 'dry_run': False})
@@ -0,0 +1,84 @@
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import settings
+from upload.handler import UploadHandler
+from upload.jobs import UploadWorker
+from upload.models import UploadJob
+from tests.conftest import courses_file, wait_for
+
+
+def queue(api, content):
+    response = api.post('/data/jobs/upload_courses', files={'file': ('courses.xlsx', content)})
+    assert response.status_code == 202 and response.json()['status'] == 'pending'
+    return uuid.UUID(response.json()['id'])
+
+
+@pytest.mark.asyncio
+async def test_queued_uploads_finish_or_fail(db, seed, api, session_factory):
+    await seed.division(await seed.regulation())
+    await db.commit()
+    finished = queue(api, courses_file('الكيمياء'))
+    failed = queue(api, b'not a workbook')
+    worker = UploadWorker(session_factory)
+    await worker.start()
+    try:
+        assert await wait_for(session_factory, finished, 'finished', 'failed') == 'finished'
+        assert await wait_for(session_factory, failed, 'finished', 'failed') == 'failed'
+    finally:
+        await worker.stop()
+    job = api.get(f'/data/jobs/{finished}').json()
+    assert [row['code'] for row in job['report']] == ['CHM1', 'CHM2'] and job['processed_rows'] == 2
+    job = api.get(f'/data/jobs/{failed}').json()
+    assert job['error'] and job['report'] is None
+
+
+@pytest.mark.asyncio
+async def test_claim_keeps_the_cap_until_stale_jobs_are_recovered(db, admin, session_factory):
+    stale = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_JOB_LEASE_SECONDS + 1)
+    running = [
+        UploadJob(kind='courses', status='running', user_id=admin.id, content=b'', created_at=stale, updated_at=stale)
+        for _ in range(settings.UPLOAD_MAX_CONCURRENT_JOBS)
+    ]
+    pending = UploadJob(kind='courses', user_id=admin.id, content=b'')
+    db.add_all([*running, pending])
+    await db.commit()
+    worker = UploadWorker(session_factory)
+    #   every slot is taken by jobs whose process died
+    assert await worker.claim() is None
+    assert sorted(await worker.recover()) == sorted(job.id for job in running)
+    assert await worker.recover() == []
+    #   the recovered jobs are older, they run first
+    assert await worker.claim() in {job.id for job in running}
+
+
+@pytest.mark.asyncio
+async def test_jobs_stopped_on_shutdown_run_again_after_restart(db, seed, api, session_factory, monkeypatch):
+    await seed.division(await seed.regulation())
+    await db.commit()
+    course_upload = UploadHandler.course_upload
+
+    async def hang(self, force=False):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(UploadHandler, 'course_upload', hang)
+    job_id = queue(api, courses_file('الكيمياء'))
+    worker = UploadWorker(session_factory)
+    await worker.start()
+    try:
+        await wait_for(session_factory, job_id, 'running')
+    finally:
+        await worker.stop()
+    job = api.get(f'/data/jobs/{job_id}').json()
+    assert (job['status'], job['started_at']) == ('pending', None)
+
+    monkeypatch.setattr(UploadHandler, 'course_upload', course_upload)
+    worker = UploadWorker(session_factory)
+    await worker.start()
+    try:
+        assert await wait_for(session_factory, job_id, 'finished', 'failed') == 'finished'
+    finally:
+        await worker.stop()
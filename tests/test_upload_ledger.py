@@ -0,0 +1,61 @@
+import asyncio
+import os
+from io import BytesIO
+
+import pytest
+from sqlalchemy import delete, func
+from sqlalchemy.future import select
+
+from course.models import Course, CourseDivisions
+from upload.ledger import UploadLedger, upload_ledger
+from tests.conftest import courses_file
+
+
+def test_ledger_round_trip(tmp_path):
+    ledger = UploadLedger(str(tmp_path), 1024 * 1024)
+    digest = asyncio.run(ledger.digest(BytesIO(b'workbook')))
+    assert asyncio.run(ledger.get('enrollments', digest)) is None
+    data = {'headers': {'level': 1}, 'records': {'mark': [55.0, -1.0]}}
+    asyncio.run(ledger.put('enrollments', digest, data, {'successfully added': 2}))
+    entry = asyncio.run(ledger.get('enrollments', digest))
+    assert entry == {'data': data, 'outcome': {'successfully added': 2}, 'ids': None}
+    assert asyncio.run(ledger.get('courses', digest)) is None
+
+
+def test_ledger_evicts_least_recently_used(tmp_path):
+    ledger = UploadLedger(str(tmp_path), 1024 * 1024)
+    payload = os.urandom(4096).hex()
+    for i, digest in enumerate(['a', 'b', 'c']):
+        asyncio.run(ledger.put('courses', digest, outcome=payload))
+        os.utime(ledger.path('courses', digest), (i, i))
+    #   reading an entry makes it the most recent one
+    asyncio.run(ledger.get('courses', 'a'))
+    ledger.max_bytes = sum(os.path.getsize(ledger.path('courses', d)) for d in ['a', 'c'])
+    ledger.evict()
+    assert sorted(os.listdir(tmp_path)) == ['courses-a.json.gz', 'courses-c.json.gz']
+
+
+@pytest.mark.asyncio
+async def test_ledger_entries_are_checked_against_the_database(db, seed, api, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_ledger, 'directory', str(tmp_path / 'ledger'))
+    monkeypatch.setattr(upload_ledger, 'max_bytes', 1024 * 1024)
+    regulation = await seed.regulation()
+    await seed.division(regulation)
+    await db.commit()
+    content = courses_file('الكيمياء')
+
+    async def upload(**params):
+        response = api.post('/data/upload_courses', params={'regulation': regulation.id, **params}, files={'file': ('courses.xlsx', content)})
+        assert response.status_code == 201
+        return (await db.execute(select(func.count()).select_from(Course))).scalar()
+
+    assert await upload() == 2
+    #   the same file again returns the recorded outcome
+    assert await upload() == 2
+    #   its rows are gone (deleted, or the database restored), the entry no longer holds
+    await db.execute(delete(CourseDivisions))
+    await db.execute(delete(Course))
+    await db.commit()
+    assert await upload() == 2
+    assert await upload() == 2
+    assert await upload(force=True) == 4
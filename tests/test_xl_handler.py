@@ -0,0 +1,90 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from upload import executor, xl_handler
+
+
+def make_sheet():
+    nan = np.nan
+    return pd.DataFrame(
+        [
+            ['(مقرر اول)', nan, nan, nan, nan, nan, 'طالب اول', 1001.0],
+            ['(math 101)', nan, nan, nan, nan, nan, nan, nan],
+            ['100 - 3 ساعات', nan, nan, nan, nan, nan, nan, nan],
+            ['B', 3.0, 78.5, nan, nan, nan, nan, nan],
+            ['(مقرر اول)', nan, nan, '(مقرر ثاني)', nan, nan, 'طالب ثاني', 1002.0],
+            ['(math 101)', nan, nan, '(chem 201)', nan, nan, nan, nan],
+            ['100 - 3 ساعات', nan, nan, '50 - 2 ساعات', nan, nan, nan, nan],
+            ['F', 0.0, 'راسب', 'عذر', 0.0, 'عذر', nan, nan],
+        ]
+    )
+
+
+def test_reform_course_blocks():
+    records = xl_handler.reform(make_sheet())
+    assert records == [
+        {'seat_id': 1001, 'student': 'طالب اول', 'course': 'مقرر اول', 'code': 'MATH101', 'hours': 3, 'grade': 'B', 'points': 3.0, 'mark': 78.5, 'full_mark': 100},
+        {'seat_id': 1002, 'student': 'طالب ثاني', 'course': 'مقرر اول', 'code': 'MATH101', 'hours': 3, 'grade': 'F', 'points': 0.0, 'mark': -1.0, 'full_mark': 100},
+        {'seat_id': 1002, 'student': 'طالب ثاني', 'course': 'مقرر ثاني', 'code': 'CHEM201', 'hours': 2, 'grade': 'عذر', 'points': 0.0, 'mark': 0.0, 'full_mark': 50},
+    ]
+
+
+def test_reform_empty_sheet():
+    assert xl_handler.reform(pd.DataFrame()) == []
+
+
+def make_workbook(trailing_from=0):
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for title in ['first', 'second']:
+        sheet = workbook.create_sheet(title)
+        sheet.append(['title'])
+        sheet.append([None, 'نتيجة - 2023'])
+        sheet.append([None, 'لائحة 2020 - المستوى الاول - الفصل الدراسي الاول - يناير'])
+        sheet.append([None, 'الشعبة : الكيمياء / الكيمياءالنبات'])
+        sheet.append([None, 'x'])
+        sheet.append([])
+        for row in ['y', 'z', 'w']:
+            sheet.append([None, row])
+        #   4 label columns, an empty spacer column, the course blocks and a trailing column
+        #   filled from row trailing_from on
+        for i, row in enumerate(make_sheet().astype(object).where(make_sheet().notna(), None).values.tolist()):
+            sheet.append(['p', 'q', 'r', 't', None, *row, 'n' if i >= trailing_from else None])
+        sheet.append([None, 'note'])
+        sheet.append([None, 'signature', None, 'signature'])
+    content = BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+def test_stream_matches_final_dict():
+    content = make_workbook()
+    expected = xl_handler.final_dict(content)
+    streamed = xl_handler.stream_dict(BytesIO(content))
+    assert streamed['headers'] == expected['headers']
+    assert list(streamed['content']) == expected['content']
+    assert len(expected['content']) == 6
+
+
+def test_stream_lays_out_blocks_on_the_whole_sheet_columns():
+    #   the trailing column is empty in the first student block, it still shifts its columns
+    content = make_workbook(trailing_from=4)
+    expected = xl_handler.final_dict(content)
+    assert list(xl_handler.stream_dict(BytesIO(content))['content']) == expected['content']
+    assert len(expected['content']) == 6
+
+
+@pytest.mark.asyncio
+async def test_stream_is_read_in_batches(monkeypatch):
+    monkeypatch.setattr(executor, 'STREAM_BATCH_SIZE', 4)
+    content = make_workbook()
+    streamed = await executor.stream_dict(BytesIO(content))
+    batches = [batch async for batch in streamed['content']]
+    expected = xl_handler.final_dict(content)
+    assert streamed['headers'] == expected['headers']
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert [record for batch in batches for record in batch] == expected['content']
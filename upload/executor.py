@@ -0,0 +1,79 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from config import settings
+
+from . import xl_handler
+
+
+
+executor: ProcessPoolExecutor | None = None
+
+#	records read per thread pool call when streaming a workbook
+STREAM_BATCH_SIZE = 1000
+
+
+def get_executor():
+	global executor
+	if executor is None and settings.UPLOAD_PARSE_WORKERS > 0:
+		executor = ProcessPoolExecutor(
+			max_workers=settings.UPLOAD_PARSE_WORKERS,
+			mp_context=multiprocessing.get_context('spawn'),
+		)
+	return executor
+
+
+def shutdown_executor():
+	global executor
+	if executor is not None:
+		executor.shutdown(cancel_futures=True)
+		executor = None
+
+
+#	run a blocking parse job off the event loop
+async def run(func, *args):
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(get_executor(), partial(func, *args))
+
+
+#	parse a result workbook, the first sheet (with the headers and the names of the others) then
+#	the rest split in one run of sheets per parse process, so the workbook is sent to and opened
+#	by every process once rather than once per sheet
+async def final_dict(content: bytes):
+	sheets, headers, payload = await run(xl_handler.parse_first_sheet, content)
+	tasks = max(min(settings.UPLOAD_PARSE_WORKERS, len(sheets)), 1)
+	size = -(-len(sheets) // tasks)
+	runs = [sheets[i: i + size] for i in range(0, len(sheets), size)]
+	payloads = await asyncio.gather(*[run(xl_handler.parse_sheets, content, names) for names in runs])
+	whole = xl_handler.unpack_records(payload)
+	for run_payloads in payloads:
+		for p in run_payloads:
+			whole += xl_handler.unpack_records(p)
+	return {'headers': headers, 'content': whole}
+
+
+#	stream a result workbook from its file object, files cannot be handed to the parse processes so
+#	it is read on the default thread pool. content yields the records a batch per call, so only one
+#	batch is held at a time. a cancelled upload stops between batches, the records generator closes
+#	the workbook once dropped
+async def stream_dict(file):
+	loop = asyncio.get_running_loop()
+	data = await loop.run_in_executor(None, xl_handler.stream_dict, file)
+	return {'headers': data['headers'], 'content': stream_batches(data['content'])}
+
+
+async def stream_batches(records):
+	loop = asyncio.get_running_loop()
+	while batch := await loop.run_in_executor(None, list, islice(records, STREAM_BATCH_SIZE)):
+		yield batch
+
+
+async def extract_divisions(content: bytes):
+	return await run(xl_handler.extract_divisions, content)
+
+
+async def extract_courses(content: bytes):
+	return await run(xl_handler.extract_courses, content)
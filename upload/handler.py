@@ -1,127 +1,262 @@
+from collections import Counter
+
 from fastapi import UploadFile, BackgroundTasks
 
+from sqlalchemy import insert, func
+from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from division.models import Division
-from course.models import Course
+from course.models import Course, CourseDivisions
+from enrollment.models import NATURAL_KEY
+from regulation.models import Regulation
+from generics.invalidation import invalidation_bus
+from generics.reference import reference_store
 
-from . import xl_handler
+from . import executor, xl_handler
+from .ledger import upload_ledger
 
-from department.handler import DepartmentHandler
 from division.handler import DivisionHandler
 from student.handler import StudentHandler
+from student.aggregates import AggregateHandler
+from student.semesters import SemesterStatsHandler, term_of
+from student.cache import bump_versions
 from course.handler import CourseHandler
 from enrollment.handler import EnrollmentHandler
-from regulation.handler import RegulationHandler
-from regulation.schemas import RegulationCreate
 from user.models import User
 
-from config import logging
+from config import settings, logging
 
 
 
 class UploadHandler:
 
 
-	def __init__(self, user: User, db: AsyncSession, file: UploadFile, background_tasks: BackgroundTasks) -> None:
+	def __init__(self, user: User, db: AsyncSession, file: UploadFile, background_tasks: BackgroundTasks, progress=None) -> None:
 		self.file = file
 		self.user = user
 		self.db = db
 		self.background_tasks = background_tasks
-		self.regulation_handler = RegulationHandler(user, db)
-		self.department_handler = DepartmentHandler(user, db)
+		self.progress = progress
 		self.division_handler = DivisionHandler(user, db)
 		self.student_handler = StudentHandler(user, db)
 		self.course_handler = CourseHandler(user, db)
 		self.enrollment_handler = EnrollmentHandler(user, db)
+		self.aggregate_handler = AggregateHandler(user, db)
+		self.semester_handler = SemesterStatsHandler(user, db)
+
+
+	#	stage reporting for uploads running as jobs
+	async def report(self, stage: str, total_rows: int | None = None, processed_rows: int | None = None):
+		if self.progress:
+			await self.progress.update(stage, total_rows, processed_rows)
+
 
+	async def ingested(self, kind: str, digest: str, model, force: bool = False):
+		#	the outcome of an earlier ingestion of this very file, a second run would only duplicate
+		#	the catalog. it holds while every row it wrote is still there, rows deleted since or a
+		#	restored database mean the file is ingested again, and so does force
+		if force:
+			return None
+		entry = await upload_ledger.get(kind, digest)
+		if not entry or entry['outcome'] is None or entry.get('ids') is None:
+			return None
+		ids = entry['ids']
+		stored = (await self.db.execute(
+			select(func.count()).select_from(model).where(model.id.in_(ids))
+		)).scalar()
+		if stored != len(ids):
+			logging.info(f'file {self.file.filename} was ingested before but {len(ids) - stored} of its rows are gone')
+			return None
+		return entry['outcome']
 
-	async def division_upload(self, regulation_id: int):
+
+	async def division_upload(self, regulation_id: int, force: bool = False):
+		await self.report('parsing')
+		kind = f'divisions-{regulation_id}'
+		digest = await upload_ledger.digest(self.file.file)
+		outcome = await self.ingested(kind, digest, Division, force)
+		if outcome is not None:
+			return outcome
 		content = await self.file.read()
-		data = await xl_handler.extract_divisions(content)
+		data = await executor.extract_divisions(content)
+		await self.report('inserting', total_rows=len(data))
+		#	one fresh read of the reference tables resolves every name of the file
+		reference = await reference_store.load(self.db)
+		regulations = {name: r.id for name, r in reference.regulation_names.items()}
+		programs = {
+			f"لائحة برنامج {d['name'].strip()}" for d in data if bool(d['private'])
+		} - regulations.keys()
+		if programs:
+			created = await self.db.execute(
+				insert(Regulation).returning(Regulation.id, Regulation.name),
+				[{'name': name, 'max_gpa': 4} for name in programs]
+			)
+			regulations.update({name: id for id, name in created.all()})
+			await invalidation_bus.publish(self.db, 'regulations')
 		for d in data:
 			if bool(d['private']):
-				regulation = await self.regulation_handler.get_by_name(f"لائحة برنامج {d['name'].strip()}")
-				if not regulation:
-					regulation = await self.regulation_handler.create(
-						RegulationCreate(
-							**{'name': f"لائحة برنامج {d['name'].strip()}", 'max_gpa': 4}
-						)
-					)
-				d['regulation_id'] = regulation.id
+				d['regulation_id'] = regulations[f"لائحة برنامج {d['name'].strip()}"]
 			else:
 				d['regulation_id'] = regulation_id
-			try:
-				d1 = await self.department_handler.get_by_name(d['department_1_id'])
-				d['department_1_id'] = d1.id
-			except:
-				d['department_1_id'] = None
-			try:
-				d2 = await self.department_handler.get_by_name(d['department_2_id'])
-				d['department_2_id'] = d2.id
-			except:
-				d['department_2_id'] = None
-			division = Division(**d)
-			self.db.add(division)
+			for key in ['department_1_id', 'department_2_id']:
+				department = reference.department_names.get(d[key])
+				d[key] = department.id if department else None
+		ids = []
+		if data:
+			ids = (await self.db.execute(insert(Division).returning(Division.id), data)).scalars().all()
+		await invalidation_bus.publish(self.db, 'divisions')
 		await self.db.commit()
+		await upload_ledger.put(kind, digest, outcome=data, ids=ids)
 		return data
 
 
-	async def course_upload(self):
+	async def course_upload(self, force: bool = False):
+		await self.report('parsing')
+		digest = await upload_ledger.digest(self.file.file)
+		outcome = await self.ingested('courses', digest, Course, force)
+		if outcome is not None:
+			return outcome
 		content = await self.file.read()
-		data = await xl_handler.extract_courses(content)
-		for d in data:
-			course = Course(**{key: value for key, value in d.items() if key != 'division'})
-			self.db.add(course)
-			division = await self.division_handler.get_by_name(d['division'])
-			course.divisions.append(division)
+		data = await executor.extract_courses(content)
+		await self.report('inserting', total_rows=len(data))
+		await reference_store.load(self.db)
+		divisions = dict()
+		for name in {d['division'] for d in data}:
+			divisions[name] = await self.division_handler.get_by_name(name)
+		if not data:
+			return data
+		courses = await self.db.execute(
+			insert(Course).returning(Course.id, sort_by_parameter_order=True),
+			[{key: value for key, value in d.items() if key != 'division'} for d in data]
+		)
+		ids = courses.scalars().all()
+		await self.db.execute(
+			insert(CourseDivisions),
+			[
+				{'course_id': course_id, 'division_id': divisions[d['division']].id}
+				for course_id, d in zip(ids, data)
+			]
+		)
 		await self.db.commit()
+		await upload_ledger.put('courses', digest, outcome=data, ids=ids)
 		return data
 
 
-	async def enrollment_upload(self):
+	async def enrollment_upload(self, delta: bool = False, force: bool = False):
 
-		content = await self.file.read()
-		logging.info(f'file {self.file.filename} opened')
-
-		data = await xl_handler.final_dict(content)
-		logging.info(f'data from file {self.file.filename} extracted')
+		await self.report('parsing')
+		digest = await upload_ledger.digest(self.file.file)
+		entry = None if force else await upload_ledger.get('enrollments', digest)
+		packed = None
+		if entry:
+			#	parsed before, only the diff against the database is left to do (the entry's
+			#	records are reused, never its outcome)
+			logging.info(f'file {self.file.filename} matches a previous upload ({entry["outcome"]})')
+			packed = entry['data']
+			data = {
+				'headers': packed['headers'],
+				'content': xl_handler.unpack_records(packed['records']),
+			}
+		elif settings.UPLOAD_STREAMING_READER:
+			#	streamed records are resolved and written a batch at a time, the whole sheet is never
+			#	held so it is not kept in the ledger either
+			logging.info(f'file {self.file.filename} opened')
+			data = await executor.stream_dict(self.file.file)
+		else:
+			content = await self.file.read()
+			logging.info(f'file {self.file.filename} opened')
+			data = await executor.final_dict(content)
+			logging.info(f'data from file {self.file.filename} extracted')
+			packed = {'headers': data['headers'], 'records': xl_handler.pack_content(data['content'])}
+			await upload_ledger.put('enrollments', digest, packed)
 		
-		division = await self.division_handler.get_by_name(data['headers']['division'])
-
+		headers = data['headers']
+		division = await self.division_handler.get_by_name(headers['division'])
 		response = []
-		courses = dict()
-		student = None
-
-		for d in data['content']:
-			#	if new student
-			if not student or student.name != d['student']:
-				#	if exists execute post_add_enrollment
-				if student:
-					self.background_tasks.add_task(self.student_handler.post_add_enrollment, student)
-				#	get the new student
-				student = await self.student_handler.get_by_name_and_division(d['student'], division)
-				if not student:
-					response.append({'student': d['student'], 'course': d['course'], 'status': 'first year data does not exist'})
-					continue
-			#	get the course
+		seen = set()
+		touched = set()
+		if packed is None:
+			#	a streamed sheet arrives in batches, its row count is only known once it is read
+			await self.report('resolving')
+			async for batch in data['content']:
+				touched |= await self.enrollment_batch(batch, headers, division, delta, seen, response)
+		else:
+			await self.report('resolving', total_rows=len(data['content']))
+			touched = await self.enrollment_batch(data['content'], headers, division, delta, seen, response)
+		#	aggregates of every touched student are derived once for the whole upload
+		await self.report('recomputing')
+		await self.aggregate_handler.recompute(touched)
+		term = self.enrollment_handler.header_values(headers)
+		await self.semester_handler.refresh(touched, term_of(term['year'], term['semester']))
+		await bump_versions(self.db, touched)
+		await self.db.commit()
+		logging.info(f'data from file {self.file.filename} processed successfully')
+		if packed is not None:
+			await upload_ledger.put('enrollments', digest, packed, dict(Counter(r['status'] for r in response)))
+		return response
+
+
+	async def enrollment_batch(self, records: list, headers: dict, division: Division, delta: bool, seen: set, response: list):
+		#	resolves and writes the records of a sheet (or one batch of a streamed sheet), appending their
+		#	statuses to response. seen holds the natural keys of the earlier batches, returns the ids of
+		#	the students whose enrollments were written
+
+		#	resolve every student and course of the records up front
+		students = await self.student_handler.get_or_create_by_names(
+			[d['student'] for d in records], division
+		)
+		courses = await self.course_handler.get_by_codes_and_division(
+			[d['code'] for d in records if d['student'] in students], division.id
+		)
+		#	rows are matched on their natural key (seat_id, student_id, course_id within the sheet's term),
+		#	delta mode diffs them against the stored ones to apply corrected marks
+		if delta:
+			stored = await self.enrollment_handler.get_stored(
+				headers, [s.id for s in students.values()]
+			)
+		logging.info(f'students and courses of file {self.file.filename} resolved')
+
+		enrollments = []
+		for d in records:
+			student = students.get(d['student'])
+			if not student:
+				response.append({'student': d['student'], 'course': d['course'], 'status': 'first year data does not exist'})
+				continue
 			course = courses.get(d['code'])
 			if not course:
-				course = await self.course_handler.get_by_code_and_division_or_none(d['code'], division.id)
-				if not course:
-					response.append({'student': student.name, 'course': d['course'], 'status': 'course is not in the database'})
-					continue
-				courses[course.code] = course
-			#	create enrollment if not exists
-			enrollment = await self.enrollment_handler.get_or_create(data['headers'], d, student.id, course.id)
-			if not enrollment:
+				response.append({'student': student.name, 'course': d['course'], 'status': 'course is not in the database'})
+				continue
+			values = self.enrollment_handler.enrollment_values(headers, d, student.id, course.id)
+			#	the first row of a key in the file wins
+			key = (values['seat_id'], student.id, course.id)
+			if key in seen:
 				response.append({'student': student.name, 'course': course.name, 'status': 'enrollment already exists'})
 				continue
-			self.db.add(enrollment)
-			self.background_tasks.add_task(self.enrollment_handler.post_create, enrollment, student, course)
-			response.append({'student': student.name, 'course': course.name, 'status': 'successfully added'})
-		
-		await self.db.commit()
-		logging.info(f'data from file {self.file.filename} processed successfully')
-		return response
\ No newline at end of file
+			seen.add(key)
+			status = 'successfully added'
+			if delta and key in stored:
+				if not self.enrollment_handler.changed(stored[key], values):
+					response.append({'student': student.name, 'course': course.name, 'status': 'enrollment already exists'})
+					continue
+				status = 'successfully updated'
+			response.append({'student': student.name, 'course': course.name, 'status': status})
+			enrollments.append((response[-1], values))
+
+		await self.report('inserting', processed_rows=len(response))
+		written = await self.enrollment_handler.bulk_create(
+			[values for _, values in enrollments], update=delta, keyed=True
+		)
+		#	the unique index decides what was written, not the read made before the insert (a concurrent
+		#	upload may have stored a row since): a row written under its own id was added, one written
+		#	under the stored id was updated, the others were left as they are
+		touched = set()
+		for row, values in enrollments:
+			id = written.get(tuple(values[key] for key in NATURAL_KEY))
+			if id is None:
+				row['status'] = 'enrollment already exists'
+				continue
+			row['status'] = 'successfully added' if id == values['id'] else 'successfully updated'
+			touched.add(values['student_id'])
+		return touched
\ No newline at end of file
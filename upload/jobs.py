@@ -0,0 +1,301 @@
+import asyncio
+from datetime import datetime, timedelta
+from io import BytesIO
+from uuid import UUID
+
+from fastapi import UploadFile, BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import update, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import defer
+
+from config import settings, logging
+from database.async_client import AsyncSessionLocal
+from generics.exceptions import UploadJobNotFoundException
+from user.models import User
+from student.recompute import recompute_all
+
+from .models import UploadJob
+from .handler import UploadHandler
+
+
+
+class JobHandler:
+
+
+	def __init__(self, user: User, db: AsyncSession) -> None:
+		self.user = user
+		self.db = db
+		self.NotFoundException = UploadJobNotFoundException()
+
+
+	async def create(self, kind: str, file: UploadFile | None = None, params: dict | None = None):
+		#	jobs without a file (recompute) only have their params
+		job = UploadJob(
+			kind=kind,
+			filename=file.filename if file else None,
+			content=await file.read() if file else None,
+			params=params or {},
+			user_id=self.user.id,
+		)
+		self.db.add(job)
+		await self.db.commit()
+		await self.db.refresh(job)
+		upload_worker.notify()
+		return job
+
+
+	async def get_all(self, limit: int = 50):
+		query = await self.db.execute(
+			select(UploadJob).
+			options(defer(UploadJob.content), defer(UploadJob.report)).
+			order_by(UploadJob.created_at.desc()).
+			limit(limit)
+		)
+		return query.scalars().all()
+
+
+	async def get_one(self, id: UUID):
+		query = await self.db.execute(
+			select(UploadJob).
+			options(defer(UploadJob.content)).
+			where(UploadJob.id == id)
+		)
+		job = query.scalar()
+		if job:
+			return job
+		raise self.NotFoundException
+
+
+
+class JobProgress:
+
+	#	progress is written on its own session so pollers see it while the upload transaction is still open
+	def __init__(self, job_id: UUID, session_factory) -> None:
+		self.job_id = job_id
+		self.session_factory = session_factory
+
+
+	async def save(self, **values):
+		async with self.session_factory() as db:
+			await db.execute(
+				update(UploadJob).
+				where(UploadJob.id == self.job_id).
+				values(**values, updated_at=datetime.utcnow())
+			)
+			await db.commit()
+
+
+	async def update(self, stage: str, total_rows: int | None = None, processed_rows: int | None = None):
+		values = {'stage': stage}
+		if total_rows is not None:
+			values['total_rows'] = total_rows
+		if processed_rows is not None:
+			values['processed_rows'] = processed_rows
+		#	progress is informational, it must never fail the upload itself
+		try:
+			await self.save(**values)
+		except Exception as e:
+			logging.warning(f'failed to save progress of upload job {self.job_id}: {e}')
+
+
+	async def heartbeat(self):
+		#	keeps the job's lease while it runs, see UploadWorker.recover
+		while True:
+			await asyncio.sleep(settings.UPLOAD_JOB_LEASE_SECONDS / 3)
+			try:
+				await self.save()
+			except Exception as e:
+				logging.warning(f'failed to renew the lease of upload job {self.job_id}: {e}')
+
+
+	async def requeue(self):
+		await self.save(status='pending', stage=None, processed_rows=0, started_at=None)
+
+
+	async def finish(self, report: list | dict, processed_rows: int | None = None):
+		await self.save(
+			status='finished',
+			stage=None,
+			report=jsonable_encoder(report),
+			processed_rows=len(report) if processed_rows is None else processed_rows,
+			content=None,
+			finished_at=datetime.utcnow(),
+		)
+
+
+	async def fail(self, error: str):
+		await self.save(
+			status='failed',
+			error=error,
+			content=None,
+			finished_at=datetime.utcnow(),
+		)
+
+
+
+class UploadWorker:
+
+	#	runs queued upload jobs inside the api process, at most UPLOAD_MAX_CONCURRENT_JOBS at once
+	def __init__(self, session_factory=AsyncSessionLocal) -> None:
+		self.session_factory = session_factory
+		self.semaphore = None
+		self.wakeup = None
+		self.task = None
+		self.jobs = set()
+
+
+	def notify(self):
+		if self.wakeup:
+			self.wakeup.set()
+
+
+	async def start(self):
+		self.semaphore = asyncio.Semaphore(settings.UPLOAD_MAX_CONCURRENT_JOBS)
+		self.wakeup = asyncio.Event()
+		self.task = asyncio.create_task(self.loop())
+
+
+	async def stop(self):
+		if not self.task:
+			return
+		self.task.cancel()
+		for job in self.jobs:
+			job.cancel()
+		await asyncio.gather(self.task, *self.jobs, return_exceptions=True)
+		self.task = None
+
+
+	async def loop(self):
+		while True:
+			self.wakeup.clear()
+			try:
+				await self.recover()
+			except Exception as e:
+				logging.warning(f'upload worker failed to recover jobs: {e}')
+			await self.dispatch()
+			try:
+				await asyncio.wait_for(self.wakeup.wait(), settings.UPLOAD_JOB_POLL_SECONDS)
+			except asyncio.TimeoutError:
+				pass
+
+
+	async def dispatch(self):
+		while True:
+			await self.semaphore.acquire()
+			try:
+				job_id = await self.claim()
+			except Exception as e:
+				logging.warning(f'upload worker failed to poll jobs: {e}')
+				job_id = None
+			if not job_id:
+				self.semaphore.release()
+				return
+			job = asyncio.create_task(self.run(job_id))
+			self.jobs.add(job)
+			job.add_done_callback(self.jobs.discard)
+
+
+	async def recover(self):
+		#	running jobs whose lease ran out (their process died or was stopped mid-job) go back to the
+		#	queue, otherwise they would count against UPLOAD_MAX_CONCURRENT_JOBS forever
+		expired = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_JOB_LEASE_SECONDS)
+		async with self.session_factory() as db:
+			result = await db.execute(
+				update(UploadJob).
+				where(and_(UploadJob.status == 'running', UploadJob.updated_at < expired)).
+				values(status='pending', stage=None, processed_rows=0, started_at=None, updated_at=datetime.utcnow()).
+				returning(UploadJob.id).
+				execution_options(synchronize_session=False)
+			)
+			job_ids = result.scalars().all()
+			await db.commit()
+		for job_id in job_ids:
+			logging.warning(f'upload job {job_id} lost its worker and was queued again')
+		return job_ids
+
+
+	async def claim(self):
+		#	the running count keeps the cap across every api process sharing the table
+		running = (
+			select(func.count()).
+			select_from(UploadJob).
+			where(UploadJob.status == 'running').
+			scalar_subquery()
+		)
+		pending = (
+			select(UploadJob.id).
+			where(UploadJob.status == 'pending').
+			order_by(UploadJob.created_at).
+			limit(1).
+			scalar_subquery()
+		)
+		async with self.session_factory() as db:
+			result = await db.execute(
+				update(UploadJob).
+				where(
+					and_(
+						UploadJob.id == pending,
+						UploadJob.status == 'pending',
+						running < settings.UPLOAD_MAX_CONCURRENT_JOBS,
+					)
+				).
+				values(status='running', started_at=datetime.utcnow(), updated_at=datetime.utcnow()).
+				returning(UploadJob.id).
+				execution_options(synchronize_session=False)
+			)
+			job_id = result.scalar()
+			await db.commit()
+		return job_id
+
+
+	async def run(self, job_id: UUID):
+		progress = JobProgress(job_id, self.session_factory)
+		heartbeat = asyncio.create_task(progress.heartbeat())
+		try:
+			async with self.session_factory() as db:
+				job = await db.get(UploadJob, job_id)
+			if job.kind == 'recompute':
+				await progress.update('recomputing')
+				report = await recompute_all(
+					job.params.get('division_ids'),
+					job.params.get('dry_run', False),
+					session_factory=self.session_factory
+				)
+				await progress.finish(report, report['students'])
+				logging.info(f'recompute job {job_id} finished')
+				return
+			async with self.session_factory() as db:
+				user = await db.get(User, job.user_id)
+				background_tasks = BackgroundTasks()
+				file = UploadFile(BytesIO(job.content), filename=job.filename)
+				handler = UploadHandler(user, db, file, background_tasks, progress)
+				force = job.params.get('force', False)
+				if job.kind == 'divisions':
+					report = await handler.division_upload(job.params['regulation'], force)
+				elif job.kind == 'courses':
+					report = await handler.course_upload(force)
+				else:
+					report = await handler.enrollment_upload(job.params.get('delta', False), force)
+				await background_tasks()
+			await progress.finish(report)
+			logging.info(f'upload job {job_id} finished')
+		except asyncio.CancelledError:
+			#	stopped on shutdown. an upload commits once at its end and is recorded in the upload
+			#	ledger right after, a rerun starts over or returns the recorded outcome
+			logging.warning(f'upload job {job_id} was interrupted and queued again')
+			try:
+				await asyncio.shield(progress.requeue())
+			except Exception as e:
+				logging.warning(f'failed to requeue upload job {job_id}, it waits for its lease to expire: {e}')
+			raise
+		except Exception as e:
+			logging.error(f'upload job {job_id} failed: {e}')
+			await progress.fail(str(e) or e.__class__.__name__)
+		finally:
+			heartbeat.cancel()
+			self.semaphore.release()
+
+
+upload_worker = UploadWorker()
@@ -0,0 +1,113 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from fastapi.encoders import jsonable_encoder
+
+from config import settings, logging
+
+
+
+class UploadLedger:
+
+	#	uploads already seen, keyed by the sha256 of their content. an entry keeps the parsed
+	#	records (gzipped json), the outcome of the last ingestion of that file and the ids of the
+	#	rows it wrote, least recently used entries are evicted once the directory grows past max_bytes.
+	#	the directory is local to the instance, entries are checked against the database before use
+	def __init__(self, directory: str, max_bytes: int) -> None:
+		self.directory = directory
+		self.max_bytes = max_bytes
+
+
+	@property
+	def enabled(self) -> bool:
+		return self.max_bytes > 0
+
+
+	@staticmethod
+	def hash(file) -> str:
+		file.seek(0)
+		sha256 = hashlib.sha256()
+		for chunk in iter(lambda: file.read(1 << 20), b''):
+			sha256.update(chunk)
+		file.seek(0)
+		return sha256.hexdigest()
+
+
+	def path(self, kind: str, digest: str) -> str:
+		return os.path.join(self.directory, f'{kind}-{digest}.json.gz')
+
+
+	def read(self, path: str) -> dict | None:
+		try:
+			with gzip.open(path, 'rt', encoding='utf-8') as file:
+				entry = json.load(file)
+		except FileNotFoundError:
+			return None
+		os.utime(path)
+		return entry
+
+
+	def write(self, path: str, entry: dict):
+		os.makedirs(self.directory, exist_ok=True)
+		#	written aside and renamed so a reader never sees half an entry
+		descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		try:
+			with gzip.open(os.fdopen(descriptor, 'wb'), 'wt', encoding='utf-8') as file:
+				json.dump(entry, file, ensure_ascii=False, separators=(',', ':'))
+			os.replace(temporary, path)
+		except BaseException:
+			os.remove(temporary)
+			raise
+		self.evict()
+
+
+	def evict(self):
+		entries = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith('.json.gz'):
+				try:
+					stat = entry.stat()
+				except FileNotFoundError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, entry.path))
+		total = sum(size for _, size, _ in entries)
+		for _, size, path in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			total -= size
+
+
+	async def digest(self, file) -> str:
+		return await asyncio.to_thread(self.hash, file)
+
+
+	#	the ledger only ever saves work, a failing disk must not fail the upload itself
+	async def get(self, kind: str, digest: str) -> dict | None:
+		if not self.enabled:
+			return None
+		try:
+			return await asyncio.to_thread(self.read, self.path(kind, digest))
+		except Exception as e:
+			logging.warning(f'failed to read upload ledger entry {kind}-{digest}: {e}')
+			return None
+
+
+	async def put(self, kind: str, digest: str, data=None, outcome=None, ids=None):
+		if not self.enabled:
+			return
+		entry = {'data': data, 'outcome': jsonable_encoder(outcome), 'ids': ids}
+		try:
+			await asyncio.to_thread(self.write, self.path(kind, digest), entry)
+		except Exception as e:
+			logging.warning(f'failed to write upload ledger entry {kind}-{digest}: {e}')
+
+
+upload_ledger = UploadLedger(settings.UPLOAD_CACHE_DIR, settings.UPLOAD_CACHE_MAX_BYTES)
@@ -0,0 +1,54 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import (
+	Column,
+	Integer,
+	String,
+	Text,
+	DateTime,
+	LargeBinary,
+	JSON,
+	ForeignKey,
+)
+from sqlalchemy.dialects.postgresql import UUID
+
+from database import Base
+from generics.mixins import Timestamp
+
+
+class UploadJob(Timestamp, Base):
+	__tablename__ = 'upload_jobs'
+
+	id = Column(
+		UUID(as_uuid=True),
+		primary_key=True,
+		index=True,
+		nullable=False,
+		default=uuid.uuid4
+	)
+	kind = Column(String(20), nullable=False)
+	status = Column(String(20), nullable=False, default='pending', index=True)
+	stage = Column(String(20), nullable=True)
+	filename = Column(String(255), nullable=True)
+	content = Column(LargeBinary, nullable=True)
+	params = Column(JSON, nullable=False, default=dict)
+	total_rows = Column(Integer, nullable=True)
+	processed_rows = Column(Integer, nullable=False, default=0)
+	report = Column(JSON, nullable=True)
+	error = Column(Text, nullable=True)
+	started_at = Column(DateTime, nullable=True)
+	finished_at = Column(DateTime, nullable=True)
+	user_id = Column(
+		UUID(as_uuid=True),
+		ForeignKey('users.id', ondelete='CASCADE'),
+		nullable=False
+	)
+
+
+	@property
+	def throughput(self):
+		#	processed rows per second
+		if not self.started_at:
+			return None
+		elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+		return self.processed_rows / elapsed if elapsed > 0 else None
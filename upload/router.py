@@ -1,3 +1,4 @@
+from uuid import UUID
 from typing import Annotated, List
 
 from fastapi import (
@@ -7,7 +8,8 @@ from fastapi import (
     File, 
     UploadFile,
     status,
-    BackgroundTasks
+    BackgroundTasks,
+    Path
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_async_db
@@ -15,7 +17,14 @@ from database import get_async_db
 from generics.permissions import AdminPermission
 
 from .handler import UploadHandler
-from .schemas import DivisionUploadResponse, CourseUploadResponse, EnrollmentUploadResponse
+from .jobs import JobHandler
+from .schemas import (
+    DivisionUploadResponse,
+    CourseUploadResponse,
+    EnrollmentUploadResponse,
+    UploadJob,
+    UploadJobDetail
+)
 
 
 upload_router = APIRouter()
@@ -32,10 +41,11 @@ async def upload_divisions(
     db: Annotated[AsyncSession, Depends(get_async_db)],
     regulation: Annotated[int, Query(title='id of regulation')],
     file: Annotated[UploadFile, File(...)],
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    force: Annotated[bool, Query(title='ingest the file even if it was uploaded before')] = False
 ):
     handler = UploadHandler(permission_class.user, db, file, background_tasks)
-    return await handler.division_upload(regulation)
+    return await handler.division_upload(regulation, force)
 
 
 @upload_router.post(
@@ -48,10 +58,11 @@ async def upload_courses(
     db: Annotated[AsyncSession, Depends(get_async_db)],
     regulation: Annotated[int, Query(title='id of regulation')],
     file: Annotated[UploadFile, File(...)],
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    force: Annotated[bool, Query(title='ingest the file even if it was uploaded before')] = False
 ):
     handler = UploadHandler(permission_class.user, db, file, background_tasks)
-    return await handler.course_upload()
+    return await handler.course_upload(force)
 
 
 @upload_router.post(
@@ -63,7 +74,84 @@ async def upload_enrollments(
     permission_class: Annotated[AdminPermission, Depends(AdminPermission)], 
     db: Annotated[AsyncSession, Depends(get_async_db)],
     file: Annotated[UploadFile, File(...)],
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    delta: Annotated[bool, Query(title='apply a corrected sheet over the stored enrollments')] = False,
+    force: Annotated[bool, Query(title='ingest the file even if it was uploaded before')] = False
 ):
     handler = UploadHandler(permission_class.user, db, file, background_tasks)
-    return await handler.enrollment_upload()
\ No newline at end of file
+    return await handler.enrollment_upload(delta, force)
+
+
+#   queued uploads, the request returns as soon as the file is stored
+@upload_router.post(
+    '/jobs/upload_divisions',
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=UploadJob
+)
+async def queue_upload_divisions(
+    permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    regulation: Annotated[int, Query(title='id of regulation')],
+    file: Annotated[UploadFile, File(...)],
+    force: Annotated[bool, Query(title='ingest the file even if it was uploaded before')] = False
+):
+    handler = JobHandler(permission_class.user, db)
+    return await handler.create('divisions', file, {'regulation': regulation, 'force': force})
+
+
+@upload_router.post(
+    '/jobs/upload_courses',
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=UploadJob
+)
+async def queue_upload_courses(
+    permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    file: Annotated[UploadFile, File(...)],
+    force: Annotated[bool, Query(title='ingest the file even if it was uploaded before')] = False
+):
+    handler = JobHandler(permission_class.user, db)
+    return await handler.create('courses', file, {'force': force})
+
+
+@upload_router.post(
+    '/jobs/upload_enrollments',
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=UploadJob
+)
+async def queue_upload_enrollments(
+    permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    file: Annotated[UploadFile, File(...)],
+    delta: Annotated[bool, Query(title='apply a corrected sheet over the stored enrollments')] = False,
+    force: Annotated[bool, Query(title='ingest the file even if it was uploaded before')] = False
+):
+    handler = JobHandler(permission_class.user, db)
+    return await handler.create('enrollments', file, {'delta': delta, 'force': force})
+
+
+@upload_router.get(
+    '/jobs',
+    status_code=status.HTTP_200_OK,
+    response_model=List[UploadJob]
+)
+async def get_upload_jobs(
+    permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+):
+    handler = JobHandler(permission_class.user, db)
+    return await handler.get_all()
+
+
+@upload_router.get(
+    '/jobs/{id}',
+    status_code=status.HTTP_200_OK,
+    response_model=UploadJobDetail
+)
+async def retrieve_upload_jobs(
+    id: Annotated[UUID, Path(..., title='id of upload job to be retrieved')],
+    permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+):
+    handler = JobHandler(permission_class.user, db)
+    return await handler.get_one(id)
\ No newline at end of file
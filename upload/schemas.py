@@ -1,5 +1,7 @@
+from uuid import UUID
+from datetime import datetime
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 
 class DivisionUploadResponse(BaseModel):
@@ -26,4 +28,27 @@ class CourseUploadResponse(BaseModel):
 class EnrollmentUploadResponse(BaseModel):
     student: str
     course: str
-    status: str
\ No newline at end of file
+    status: str
+
+
+class UploadJob(BaseModel):
+    id: UUID
+    kind: str
+    status: str
+    stage: Optional[str]
+    filename: Optional[str]
+    total_rows: Optional[int]
+    processed_rows: int
+    throughput: Optional[float]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class UploadJobDetail(UploadJob):
+    #   the rows an upload wrote, or the summary of a recompute
+    report: Optional[List[dict] | dict]
\ No newline at end of file
@@ -1,5 +1,9 @@
+import numpy as np
 import pandas as pd
+from collections import deque
 from io import BytesIO
+from itertools import islice
+from openpyxl import load_workbook
 
 
 
@@ -25,29 +29,32 @@ DEPARTMENTS = {
     'الجيولوجيا': 'Geology',
     'Geology':'Geology',
 }
+FAILED_MARKS = ['راسب', 'غـ', 'حر', 'رل']
+PASSED_MARKS = ['ناجح', 'عذر']
+RECORD_COLUMNS = ['seat_id', 'student', 'course', 'code', 'hours', 'grade', 'points', 'mark', 'full_mark']
 
 #   getting actual content of the excel sheet
-async def drop_empty_axes(df: pd.DataFrame) -> pd.DataFrame:
+def drop_empty_axes(df: pd.DataFrame) -> pd.DataFrame:
     df = df.dropna(how = 'all')
     df = df.dropna(axis = 1, how = 'all')
     return df
 
 
 #   get just the cells that not null
-async def advanced_cleanup(df: pd.DataFrame) -> pd.DataFrame:
+def advanced_cleanup(df: pd.DataFrame) -> pd.DataFrame:
     return df[df.notna()]
 
 #   get header data
-async def get_header_data(df: pd.DataFrame) -> pd.DataFrame:
-    year = await advanced_cleanup(df.iloc[0])
+def get_header_data(df: pd.DataFrame) -> pd.DataFrame:
+    year = advanced_cleanup(df.iloc[0])
     year = year.iloc[0].split('-')[1]
-    cell = await advanced_cleanup(df.iloc[1])
+    cell = advanced_cleanup(df.iloc[1])
     cell = cell.iloc[0].split('-')
     regulation = cell[0].strip()
     level = LEVELS.get(cell[1].split()[1])
     semester = SEMESTERS.get(cell[2].split()[2]) if len(cell[2].split()) > 2 else None  
     month = cell[3][1:]
-    division = await advanced_cleanup(df.iloc[2])
+    division = advanced_cleanup(df.iloc[2])
     division = division.iloc[0].split(' : ')[1]
     department = None
     if '/' in division:
@@ -61,115 +68,221 @@ async def get_header_data(df: pd.DataFrame) -> pd.DataFrame:
         'semester'  : int(semester) if semester else None,
         'month'     : month,
         'department': DEPARTMENTS[department],
-        'division'  : division.replace(
-            '-', '/', 1
-            ).replace(
-            'ه', 'ة', 1
-            ).replace(
-            'الكيمياءعلم', 'الكيمياء/علم', 1
-            ).replace(
-            'الكيمياءالكيمياء', 'الكيمياء/الكيمياء', 1
-            ).replace(
-            'الكيمياءالنبات', 'الكيمياء/النبات', 1
-            ).replace(
-            'الكيمياءميكروبيولوجى', 'الكيمياء/ميكروبيولوجى', 1
-            ).replace(
-            'الكيمياءالجيولوجيا', 'الكيمياء/الجيولوجيا', 1
-            ).replace(
-            'الاحصاء', 'الإحصاء', 1
-            )
+        #   spelling variants are folded when the division is looked up by its normalized name
+        'division'  : division
     }
 
 #   initial cleanup
-async def initial_cleanup(df: pd.DataFrame) -> pd.DataFrame:
+def initial_cleanup(df: pd.DataFrame) -> pd.DataFrame:
     #df = df.dropna(thresh = 2)
-    df = df.iloc[7: -2] if len(await advanced_cleanup(df.iloc[-1])) == 2 else df.iloc[7: ]
-    dropped = await drop_empty_axes(df)
+    df = df.iloc[7: -2] if len(advanced_cleanup(df.iloc[-1])) == 2 else df.iloc[7: ]
+    dropped = drop_empty_axes(df)
     return dropped.iloc[: , 4: -1][df != ' ']
 
+#	reforming the data into one row per enrollment
+def reform_frame(df : pd.DataFrame) -> pd.DataFrame:
+    values = df.to_numpy(dtype=object)
+    rows, columns = values.shape
+    if not rows or columns < 3:
+        return pd.DataFrame(columns=RECORD_COLUMNS)
+    #   pad to whole student blocks so the frame reshapes to (students, 4, columns)
+    if rows % 4:
+        values = np.vstack([values, np.full((4 - rows % 4, columns), np.nan, dtype=object)])
+    blocks = values.reshape(-1, 4, columns)
+    #   every course occupies 3 columns, the last 2 columns are student name and seat id
+    starts = np.arange(0, columns - 2, 3)
+    taken = pd.notna(blocks[:, 0, starts])
+    student_idx, course_idx = np.nonzero(taken)
+    if not len(student_idx):
+        return pd.DataFrame(columns=RECORD_COLUMNS)
+    starts = starts[course_idx]
+    info = pd.Series(blocks[student_idx, 2, starts]).str.split()
+    mark = pd.Series(blocks[student_idx, 3, starts + 2])
+    mark = mark.mask(mark.isin(FAILED_MARKS), -1.0).mask(mark.isin(PASSED_MARKS), 0.0)
+    return pd.DataFrame(
+        {
+            'seat_id'  : pd.Series(blocks[student_idx, 0, -1]).astype(int),
+            'student'  : blocks[student_idx, 0, -2],
+            'course'   : pd.Series(blocks[student_idx, 0, starts]).str.replace(')', '', n=1, regex=False).str.replace('(', '', n=1, regex=False),
+            'code'     : pd.Series(blocks[student_idx, 1, starts]).str[1: -1].str.upper().str.replace(' ', '', regex=False),
+            'hours'    : info.str[2].astype(int),
+            'grade'    : blocks[student_idx, 3, starts],
+            'points'   : pd.Series(blocks[student_idx, 3, starts + 1]).astype(float),
+            'mark'     : mark.astype(float),
+            'full_mark': info.str[0].astype(int),
+        }
+    )
+
 #	reforming the data
-async def reform(df : pd.DataFrame) -> list:
-    reformed = []
-    r = 0
-    while r < df.shape[0]:
-        c = 0
-        while c < df.shape[1] - 2:
-            if pd.isnull(df.iloc[r, c]): 
-                c += 3
-                continue
-            reformed.append(
-                {
-                    'seat_id'  : int(df.iloc[r, -1]), 
-                    'student'  : df.iloc[r, -2], 
-                    'course'   : df.iloc[r, c].replace(')', '', 1).replace('(', '', 1),
-                    'code'     : df.iloc[r + 1, c][1: -1].upper().replace(' ', ''),
-                    'hours'    : int(df.iloc[r + 2, c].split()[2]), 
-                    'grade'    : df.iloc[r + 3, c], 
-                    'points'   : float(df.iloc[r + 3, c + 1]), 
-                    'mark'     : df.iloc[r + 3, c + 2],
-                    'full_mark': int(df.iloc[r + 2, c].split()[0])
-                }
-            )    
-            if reformed[-1]['mark'] in ['راسب', 'غـ', 'حر', 'رل']: reformed[-1]['mark'] = -1.0
-            elif reformed[-1]['mark'] in ['ناجح', 'عذر']: reformed[-1]['mark'] = 0.0
-            reformed[-1]['mark'] = float(reformed[-1]['mark'])
-            c += 3
-        r += 4
-    return reformed
+def reform(df : pd.DataFrame) -> list:
+    return reform_frame(df).to_dict('records')
+
+#   compact picklable payload of a parsed sheet, one list per record column
+def pack_records(df: pd.DataFrame) -> dict:
+    return reform_frame(df).to_dict('list')
+
+def pack_content(records: list) -> dict:
+    return {c: [r[c] for r in records] for c in RECORD_COLUMNS}
+
+def unpack_records(payload: dict) -> list:
+    return [dict(zip(RECORD_COLUMNS, row)) for row in zip(*(payload[c] for c in RECORD_COLUMNS))]
+
+#   read one sheet, the first sheet also carries the headers
+def read_sheet(xl_file: pd.ExcelFile, sheet, with_headers: bool = False):
+    df = pd.read_excel(xl_file, sheet_name=sheet)
+    df = drop_empty_axes(df)
+    headers = get_header_data(df.iloc[:5]) if with_headers else None
+    return headers, pack_records(initial_cleanup(df))
+
+#   parse some sheets of a result workbook (a single parse task), the workbook is opened once for all of them
+def parse_sheets(file, sheets):
+    xl_file = pd.ExcelFile(BytesIO(file))
+    return [read_sheet(xl_file, sheet)[1] for sheet in sheets]
+
+#   parse the first sheet and list the rest to be parsed separately
+def parse_first_sheet(file):
+    xl_file = pd.ExcelFile(BytesIO(file))
+    headers, payload = read_sheet(xl_file, xl_file.sheet_names[0], with_headers=True)
+    return xl_file.sheet_names[1:], headers, payload
 
 #   final dictionary
-async def final_dict(file):
+def final_dict(file):
     xl_file = pd.ExcelFile(BytesIO(file))
-    whole = []
-    sheets = xl_file.sheet_names
-    for sheet in sheets:
-        file = pd.read_excel(xl_file, sheet_name=sheet)
-        file = await drop_empty_axes(file)
-        file = await initial_cleanup(file)
-        whole += await reform(file)
-    file = pd.read_excel(xl_file)
-    file = await drop_empty_axes(file)
-    file = file.iloc[:5]
-    header_data = await get_header_data(file)
-    #whole = [dict(i, **header_data) for i in whole]
-    return {'headers': header_data, 'content': whole}
+    headers, payload = read_sheet(xl_file, xl_file.sheet_names[0], with_headers=True)
+    whole = unpack_records(payload)
+    for sheet in xl_file.sheet_names[1:]:
+        whole += unpack_records(read_sheet(xl_file, sheet)[1])
+    return {'headers': headers, 'content': whole}
+
+#   streaming reader, two passes per sheet over openpyxl's read only rows
+#   yielding the same records as final_dict without building any frame
+
+#   non empty rows of a sheet, the first row is skipped as read_excel takes it for the column names
+def sheet_rows(sheet):
+    rows = sheet.iter_rows(values_only=True)
+    next(rows, None)
+    for row in rows:
+        row = [None if value == '' else value for value in row]
+        if any(value is not None for value in row):
+            yield row
+
+def to_float(value):
+    return float('nan') if value is None else float(value)
+
+#   records of one 4 row student block, laid out on the columns of the sheet's body that carry a value
+#   (matching dropping the empty columns of the whole sheet)
+def block_records(block: list, columns: list):
+    columns = columns[4: -1]
+    if len(columns) < 3:
+        return
+    values = [
+        [row[c] if c < len(row) and row[c] != ' ' else None for c in columns]
+        for row in block
+    ]
+    for start in range(0, len(columns) - 2, 3):
+        if values[0][start] is None:
+            continue
+        info = values[2][start].split()
+        mark = values[3][start + 2]
+        if mark in FAILED_MARKS:
+            mark = -1.0
+        elif mark in PASSED_MARKS:
+            mark = 0.0
+        yield {
+            'seat_id'  : int(values[0][-1]),
+            'student'  : values[0][-2],
+            'course'   : values[0][start].replace(')', '', 1).replace('(', '', 1),
+            'code'     : values[1][start][1: -1].upper().replace(' ', ''),
+            'hours'    : int(info[2]),
+            'grade'    : values[3][start],
+            'points'   : to_float(values[3][start + 1]),
+            'mark'     : to_float(mark),
+            'full_mark': int(info[0]),
+        }
+
+#   the rows of a sheet following the leading 7, two rows are held back since a last row
+#   with exactly two values marks a trailer of two rows to skip
+def body_rows(sheet):
+    pending = deque()
+    for row in islice(sheet_rows(sheet), 7, None):
+        pending.append(row)
+        if len(pending) > 2:
+            yield pending.popleft()
+    if pending and sum(value is not None for value in pending[-1]) != 2:
+        yield from pending
+
+#   records of a sheet in two passes over its rows, the first finds the occupied columns and the
+#   second reads the blocks. final_dict drops the columns empty over the whole sheet before laying out
+#   any block and a column may first get a value in the last block, so a single pass would have to hold
+#   the sheet's rows. each pass reads the rows back from the workbook holding only the column set
+def sheet_records(sheet):
+    occupied = set()
+    for row in body_rows(sheet):
+        occupied.update(c for c, value in enumerate(row) if value is not None)
+    columns = sorted(occupied)
+    block = []
+    for row in body_rows(sheet):
+        block.append(row)
+        if len(block) == 4:
+            yield from block_records(block, columns)
+            block = []
+    if block:
+        yield from block_records(block + [[]] * (4 - len(block)), columns)
+
+#   streaming final dictionary, file is any binary file object (the upload's spooled file)
+#   and content a generator that closes the workbook once exhausted
+def stream_dict(file):
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    leading = list(islice(sheet_rows(workbook.worksheets[0]), 5))
+    return {
+        'headers': get_header_data(pd.DataFrame(leading)),
+        'content': stream_content(workbook),
+    }
+
+def stream_content(workbook):
+    try:
+        for sheet in workbook.worksheets:
+            yield from sheet_records(sheet)
+    finally:
+        workbook.close()
 
 #   divisions file handling
-async def extract_divisions(file):
-    data = []
-    file = pd.read_excel(file)
-    for r in file.iterrows():
-        departments = [v.strip() for v in r[1][0].split('+')]
-        data.append(
-            {
-                'department_1_id': DEPARTMENTS[departments[0]],
-                'department_2_id': DEPARTMENTS[departments[1]] if len(departments) > 1 else None,
-                'name': r[1][1].strip(),
-                'hours': int(r[1][2]),
-                'private': bool(r[1][3]),
-                'group': False
-            }
-        )
-    return data
+def extract_divisions(file):
+    file = pd.read_excel(BytesIO(file))
+    departments = file.iloc[:, 0].str.split('+')
+    department_1 = departments.str[0].str.strip()
+    department_2 = departments.str[1].str.strip()
+    #   unknown departments fail the same way the dictionary lookup does
+    names = pd.concat([department_1, department_2.dropna()])
+    unknown = names[~names.isin([d for d in DEPARTMENTS if d])]
+    if len(unknown):
+        raise KeyError(unknown.iloc[0])
+    data = pd.DataFrame(
+        {
+            'department_1_id': department_1.map(DEPARTMENTS),
+            'department_2_id': department_2.map(DEPARTMENTS, na_action='ignore'),
+            'name': file.iloc[:, 1].str.strip(),
+            'hours': file.iloc[:, 2].astype(int),
+            'private': file.iloc[:, 3].astype(bool),
+            'group': False
+        }
+    )
+    return data.astype(object).where(data.notna(), None).to_dict('records')
 
 #   courses file handling
-async def extract_courses(file):
-    data = []
-    file = pd.ExcelFile(file)
-    file = pd.read_excel(file, sheet_name='ساعات معتمدة')
-    for r in file.iterrows():
-        data.append(
-            {
-                'level': int(r[1][0]),
-                'semester': int(r[1][1]),
-                'division': r[1][2].strip(),
-                'code': str(r[1][3]).strip(),
-                'required': True if r[1][5] == 1 else False,
-                'name': r[1][6].strip(),
-                'lecture_hours': r[1][7],
-                'practical_hours': r[1][8],
-                'credit_hours': r[1][9],
-            }
-        )
-    return data
-        
+def extract_courses(file):
+    file = pd.read_excel(BytesIO(file), sheet_name='ساعات معتمدة')
+    data = pd.DataFrame(
+        {
+            'level': file.iloc[:, 0].astype(int),
+            'semester': file.iloc[:, 1].astype(int),
+            'division': file.iloc[:, 2].str.strip(),
+            'code': file.iloc[:, 3].astype(str).str.strip(),
+            'required': file.iloc[:, 5] == 1,
+            'name': file.iloc[:, 6].str.strip(),
+            'lecture_hours': file.iloc[:, 7],
+            'practical_hours': file.iloc[:, 8],
+            'credit_hours': file.iloc[:, 9],
+        }
+    )
+    return data.to_dict('records')
\ No newline at end of file
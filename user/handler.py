@@ -1,19 +1,19 @@
-from typing import Any
+from typing import Any, List
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
-from sqlalchemy.orm import selectinload
+from sqlalchemy import insert, delete
 
 from authentication.oauth2 import TokenHandler
+from generics.invalidation import invalidation_bus
 from generics.exceptions import UserNotFoundException, ForbiddenException
-
-
-from division.models import Division
+from generics.pagination import Pagination
+from generics.reference import reference_store
+from generics.bulk import chunked
 
 from .schemas import UserCreate
-from .models import User
+from .models import User, UserDivisions
 
 
 
@@ -24,17 +24,8 @@ class UserHandler:
 		self.token_handler = TokenHandler(db)
 		self.NotFoundException = UserNotFoundException()
 		self.UniqueConstraintsException = ForbiddenException("user with this email already exists")
-		self.retrieve_query = (
-				select(User).
-				options(
-					selectinload(User.divisions).
-					options(
-						selectinload(Division.regulation),
-						selectinload(Division.department_1),
-						selectinload(Division.department_2),
-					)
-				)
-			)
+		#	divisions of the rows are hydrated from the reference store, see user_values
+		self.retrieve_query = select(User)
 
 
 	async def check_email_uniqueness(self, email: str) -> bool:
@@ -47,9 +38,49 @@ class UserHandler:
 		return True
 
 
-	async def get_all(self):
-		query = await self.db.execute(self.retrieve_query)
-		return query.scalars().all()
+	sort_keys = {
+		'id': [User.id],
+		'first_name': [User.first_name, User.last_name, User.id],
+		'last_name': [User.last_name, User.first_name, User.id],
+	}
+
+
+	async def get_all(self, page: Pagination | None = None):
+		if page:
+			users = await page.fetch(self.db, self.retrieve_query, self.sort_keys, 'first_name')
+		else:
+			users = (await self.db.execute(self.retrieve_query)).scalars().all()
+		return await self.user_values(users)
+
+
+	async def user_values(self, users: List[User]):
+		division_ids = dict()
+		for chunk in chunked([u.id for u in users]):
+			query = await self.db.execute(
+				select(UserDivisions.c.user_id, UserDivisions.c.division_id).
+				where(UserDivisions.c.user_id.in_(chunk))
+			)
+			for user_id, division_id in query.all():
+				division_ids.setdefault(user_id, []).append(division_id)
+		data = await reference_store.get(self.db)
+		return [
+			{
+				**{column.key: getattr(user, column.key) for column in User.__table__.columns},
+				'divisions': data.divisions_of(division_ids.get(user.id, [])),
+			}
+			for user in users
+		]
+
+
+	async def set_divisions(self, id: UUID, division_ids: List[int]):
+		data = await reference_store.get(self.db)
+		rows = [
+			{'user_id': id, 'division_id': division_id}
+			for division_id in dict.fromkeys(division_ids) if data.division(division_id)
+		]
+		await self.db.execute(delete(UserDivisions).where(UserDivisions.c.user_id == id))
+		if rows:
+			await self.db.execute(insert(UserDivisions), rows)
 
 
 	async def create(self, user: UserCreate):
@@ -58,10 +89,9 @@ class UserHandler:
 			raise self.UniqueConstraintsException
 		new_user = User(**user.dict(exclude={'divisions'}))
 		self.db.add(new_user)
+		await self.db.flush()
 		if user.divisions:
-			for d in user.divisions:
-				division = await self.db.get(Division, d)
-				new_user.divisions.append(division)
+			await self.set_divisions(new_user.id, user.divisions)
 		await self.db.commit()
 		await self.db.refresh(new_user)
 		await self.token_handler.create(new_user)
@@ -73,7 +103,7 @@ class UserHandler:
 		query = await self.db.execute(query)
 		user = query.scalar()
 		if user:
-			return user
+			return (await self.user_values([user]))[0]
 		raise self.NotFoundException
 
 
@@ -81,15 +111,14 @@ class UserHandler:
 		check = await self.check_email_uniqueness(user.email)
 		if not check:
 			raise self.UniqueConstraintsException
-		existing_user = await self.get_one(id)
+		existing_user = await self.db.get(User, id)
+		if not existing_user:
+			raise self.NotFoundException
 		for key, value in user.dict(exclude={"divisions"}).items():
 			setattr(existing_user, key, value)
 		if user.divisions is not None:
-			existing_user.divisions.clear()
-			for division_id in user.divisions:
-				division = await self.db.get(Division, division_id)
-				if division:
-					existing_user.divisions.append(division)
+			await self.set_divisions(id, user.divisions)
+		await invalidation_bus.publish(self.db, 'tokens', id)
 		await self.db.commit()
 		return await self.get_one(id)
 
@@ -99,6 +128,7 @@ class UserHandler:
 			delete(User).
 			where(User.id == id)
 		)
+		await invalidation_bus.publish(self.db, 'tokens', id)
 		await self.db.commit()
 		return
 
@@ -13,6 +13,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_async_db
 
 from generics.permissions import AdminPermission
+from generics.pagination import Pagination
 
 from .schemas import UserCreate, User
 from .handler import UserHandler
@@ -29,10 +30,11 @@ user_router = APIRouter()
 )
 async def get_users(
 	permission_class: Annotated[AdminPermission, Depends(AdminPermission)],
-	db: Annotated[AsyncSession, Depends(get_async_db)]
+	db: Annotated[AsyncSession, Depends(get_async_db)],
+	page: Annotated[Pagination, Depends(Pagination)]
 ):
 	handler = UserHandler(db)
-	return await handler.get_all()
+	return await handler.get_all(page)
 
 
 #	create user